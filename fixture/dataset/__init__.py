@@ -1,4 +1,5 @@
 
-__all__ = ['DataSet']
+__all__ = ['DataSet', 'ColumnarDataSet', 'StreamingDataSet', 'FactoryDataSet']
 
-from fixture.dataset.dataset import *
\ No newline at end of file
+from fixture.dataset.dataset import *
+from fixture.dataset.factory import *
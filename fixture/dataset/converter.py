@@ -93,8 +93,9 @@ def dataset_to_json(dataset, fp=None, default=default_json_converter, wrap=None)
         except TypeError:
             continue
         row_dict = {}
-        for col, val in _obj_items(row):
-            if col=='_reserved_attr' or callable(val):
+        for col in row.columns():
+            val = getattr(row, col)
+            if callable(val):
                 continue
             row_dict[col] = val
         objects.append(row_dict)
@@ -2,12 +2,14 @@
 """Representations of Data
 
 The main class you will work with is :class:`DataSet` but there are a 
-few variations on it: :class:`SuperSet` and :class:`MergedSuperSet`
+few variations on it: :class:`ColumnarDataSet`, :class:`StreamingDataSet`, 
+:class:`SuperSet` and :class:`MergedSuperSet`
 
 """
 
 import sys, types
 from fixture.util import ObjRegistry
+from fixture.exc import CircularReferenceError
 
 class DataContainer(object):
     """
@@ -16,6 +18,7 @@ class DataContainer(object):
     for all internally used attributes, use the inner class Meta.
     On instances, use self.meta instead.
     """
+    __slots__ = ('meta',)
     _reserved_attr = ('meta', 'Meta', 'ref', 'get')
     class Meta:
         data = None
@@ -41,11 +44,12 @@ class DataContainer(object):
     def __getattribute__(self, name):
         """Attributes are always fetched first from self.meta.data[name] if possible"""
         # it is necessary to completely override __getattr__
-        # so that class attributes don't interfer
-        if name.startswith('_') or name in self._reserved_attr:
-            return object.__getattribute__(self, name)
+        # so that class attributes don't interfer.  Since this runs for 
+        # every attribute, nothing here comes back to it :
+        if name[:1] == '_' or name in type(self)._reserved_attr:
+            return _getattribute(self, name)
         try:
-            return self.meta.data[name]
+            return _getmeta(self).data[name]
         except KeyError:
             raise AttributeError("%s has no attribute '%s'" % (self, name))
 
@@ -68,6 +72,9 @@ class DataContainer(object):
             self.meta.keys.append(key)
         self.meta.data[key] = value
 
+_getattribute = object.__getattribute__
+_getmeta = DataContainer.__dict__['meta'].__get__
+
 class RefValue(object):
     """A reference to a value in a row of a DataSet class."""
     def __init__(self, ref, attr_name):
@@ -262,7 +269,11 @@ def is_rowlike(candidate):
 class DataRow(object):
     """
     a DataSet row, values accessible by attibute or key.
+    
+    The object stored for the row is looked up the first time it is needed 
+    and kept as ``_stored``.
     """
+    __slots__ = ('_dataset', '_key', '_stored')
     _reserved_attr = ('columns', 'stored_object')
 
     def __init__(self, dataset):
@@ -280,24 +291,97 @@ class DataRow(object):
         # let's look for it in the stored object.
         # an example of this would be an ID, which was
         # created only after load
-        if name.startswith('_'):
+        if name[:1] == '_':
             return object.__getattribute__(self, name)
-
-        obj = self._dataset.meta._stored_objects.get_object(self._key)
+        try:
+            obj = self._stored
+        except AttributeError:
+            obj = self.stored_object()
         return getattr(obj, name)
 
     def stored_object(self):
-        return self._dataset.meta._stored_objects.get_object(self._key)
+        try:
+            return self._stored
+        except AttributeError:
+            obj = self._dataset.meta._stored_objects.get_object(self._key)
+            object.__setattr__(self, '_stored', obj)
+            return obj
 
     @classmethod
     def columns(self):
-        """Classmethod that yields all attribute names (except reserved attributes) 
-        in alphabetical order
+        """Classmethod that returns a tuple of all attribute names (except 
+        reserved attributes) in alphabetical order
+        
+        See :func:`row_columns`
         """
-        for k in dir(self):
-            if k.startswith('_') or k in self._reserved_attr:
-                continue
-            yield k
+        return row_columns(self)
+
+def row_columns(row_class):
+    """Returns a tuple of the public attribute names of a row class, except 
+    its reserved attributes, in alphabetical order.
+    
+    Inherited attributes are included.  The names are looked up with dir() 
+    the first time and kept on the class as ``_columns``, so attributes 
+    added to the class after that are not seen.
+    """
+    try:
+        return row_class.__dict__['_columns']
+    except KeyError:
+        pass
+    reserved = getattr(row_class, '_reserved_attr', ())
+    columns = tuple([name for name in dir(row_class) 
+                        if not name.startswith('_') and name not in reserved])
+    row_class._columns = columns
+    return columns
+
+def row_references(row_class):
+    """Returns a tuple of (name, kind) pairs for the columns of a row class
+    that refer to other rows, in the order of :func:`row_columns`.
+
+    kind is one of:
+
+    - ``'row'`` for a row, i.e. ``category = python``
+    - ``'rows'`` for a list or tuple with rows or ``Ref.Value`` objects in it,
+      i.e. ``categories = [python, ruby]``
+    - ``'ref'`` for a ``Ref.Value``, i.e. ``category_id = python.ref('id')``
+
+    All other columns are scalars.  Like the columns themselves, the
+    references are looked up the first time and kept on the class as
+    ``_references``.
+    """
+    try:
+        return row_class.__dict__['_references']
+    except KeyError:
+        pass
+    references = []
+    for name in row_columns(row_class):
+        # read from the class so that RefValue descriptors are not resolved
+        kind, ds_classes = _reference(getattr(row_class, name))
+        if kind:
+            references.append((name, kind))
+    references = tuple(references)
+    row_class._references = references
+    return references
+
+def _reference(value):
+    """Returns the kind of reference that a column value is, as in 
+    :func:`row_references`, and the DataSet classes it refers to, or 
+    (None, ()) for a scalar.
+    """
+    if type(value) in (types.ListType, types.TupleType):
+        ds_classes = []
+        for item in value:
+            if is_rowlike(item):
+                ds_classes.append(item._dataset)
+            elif isinstance(item, RefValue):
+                ds_classes.append(item.ref.dataset_class)
+        if ds_classes:
+            return 'rows', ds_classes
+    elif is_rowlike(value):
+        return 'row', (value._dataset,)
+    elif isinstance(value, RefValue):
+        return 'ref', (value.ref.dataset_class,)
+    return None, ()
 
 class DataSetStore(list):
     """keeps track of actual objects stored in a dataset."""
@@ -332,6 +416,8 @@ class DataSetStore(list):
         self._ds_key_map[key] = pos
 
 dataset_registry = ObjRegistry()
+# DataSet classes whose shared instance is being created :
+_shared_instances_in_progress = []
 
 class DataSetMeta(DataContainer.Meta):
     """
@@ -354,6 +440,13 @@ class DataSetMeta(DataContainer.Meta):
     ``primary_key``
         this is a list of names that should be acknowledged as primary keys 
         in a ``DataSet``.  The default is simply ``['id']``.
+    
+    ``teardown``
+        how the loader should remove the stored data.  The default, None, 
+        leaves it up to the loader, which normally deletes each stored 
+        object.  Set this to ``'truncate'`` to wipe everything in the 
+        storable object at once (only do this if no other data is stored 
+        there) or to ``'delete'`` to always delete each stored object.
         
     Here is an example of using an inner ``Meta`` class to specify a custom 
     storable object to be used when storing a :class:`DataSet`::
@@ -378,6 +471,7 @@ class DataSetMeta(DataContainer.Meta):
     storage_medium = None
     primary_key = [k for k in DataType.default_primary_key]
     references = []
+    teardown = None
     _stored_objects = None
     _built = False
 
@@ -433,7 +527,8 @@ class DataSet(DataContainer):
     
     """
     __metaclass__ = DataType
-    _reserved_attr = DataContainer._reserved_attr + ('data', 'shared_instance', 'post_load')
+    _reserved_attr = DataContainer._reserved_attr + (
+                        'data', 'shared_instance', 'post_load', 'forget_data')
     ref = None
     Meta = DataSetMeta
 
@@ -479,6 +574,34 @@ class DataSet(DataContainer):
         if len(self.meta.references) > 0:
             self.ref = mkref()
 
+        self._setrows()
+
+        if not self.ref:
+            # type style classes, since refs were discovered above
+            self.ref = mkref()
+
+    def _setdata(self, key, value):
+        """Adds value to self.meta.data[key].
+        
+        A row instance looks up its stored object again, i.e. after it 
+        was loaded.
+        """
+        if isinstance(value, DataRow):
+            try:
+                object.__delattr__(value, '_stored')
+            except AttributeError:
+                pass
+        DataContainer._setdata(self, key, value)
+
+    def _setrows(self):
+        """Adds the (key, data) pairs returned by data()"""
+        plans = None
+        if type(self).data.im_func is DataSet.data.im_func:
+            # rows declared as classes have the same columns for every 
+            # instance, see forget_data() :
+            plans = type(self).__dict__.get('_row_plans')
+            if plans is None:
+                plans = type(self)._row_plans = {}
         for key, data in self.data():
             if key in self:
                 raise ValueError(
@@ -489,12 +612,24 @@ class DataSet(DataContainer):
                 # make a new class object for the row data
                 # so that a loaded dataset can instantiate this...
                 data = type(key, (self.meta.row,), data)
+                if plans is not None and key in plans:
+                    data._columns, data._references = plans[key]
+                else:
+                    # ...knowing its columns without looking at dir() :
+                    reserved = self.meta.row._reserved_attr
+                    columns = set(row_columns(self.meta.row))
+                    columns.update([name for name in data.__dict__ 
+                                    if not name.startswith('_') and 
+                                       name not in reserved])
+                    columns = list(columns)
+                    columns.sort()
+                    data._columns = tuple(columns)
+                    # ...and which of them refer to other rows :
+                    references = row_references(data)
+                    if plans is not None:
+                        plans[key] = (data._columns, references)
             self._setdata(key, data)
 
-        if not self.ref:
-            # type style classes, since refs were discovered above
-            self.ref = mkref()
-
     def __iter__(self):
         """yields keys of self.meta"""
         for key in self.meta.keys:
@@ -530,15 +665,33 @@ class DataSet(DataContainer):
             for k, v in self:
                 yield (k, v)
 
+        compiled = type(self).__dict__.get('_compiled_data')
+        if compiled is not None:
+            rows, references = compiled
+            for ds in references:
+                if ds not in self.meta.references:
+                    self.meta.references.append(ds)
+            for key, row in rows:
+                yield (key, dict(row))
+            self.meta._built = True
+            return
+
         def public_dir(obj):
             for name in dir(obj):
                 if name.startswith("_"):
                     continue
                 yield name
 
+        rows = []
+        references = []
+        def add_reference(ds):
+            if ds not in references:
+                references.append(ds)
+            if ds not in self.meta.references:
+                self.meta.references.append(ds)
+
         def add_ref_from_rowlike(rowlike):
-            if rowlike._dataset not in self.meta.references:
-                self.meta.references.append(rowlike._dataset)
+            add_reference(rowlike._dataset)
 
         empty = True
         for name in public_dir(self.__class__):
@@ -551,7 +704,7 @@ class DataSet(DataContainer):
             row_class = val
             row = {}
 
-            for col_name in public_dir(row_class):
+            for col_name in row_columns(row_class):
                 col_val = getattr(row_class, col_name)
 
                 if isinstance(col_val, Ref):
@@ -566,18 +719,40 @@ class DataSet(DataContainer):
                 elif is_rowlike(col_val):
                     add_ref_from_rowlike(col_val)
                 elif isinstance(col_val, Ref.Value):
-                    ref = col_val.ref
-                    if ref.dataset_class not in self.meta.references:
-                        # store the reference:
-                        self.meta.references.append(ref.dataset_class)
+                    # store the reference:
+                    add_reference(col_val.ref.dataset_class)
 
                 row[col_name] = col_val
-            yield (key, row)
+            rows.append((key, row))
+            yield (key, dict(row))
 
         if empty:
             raise ValueError("cannot create an empty DataSet")
+        type(self)._compiled_data = (tuple(rows), tuple(references))
         self.meta._built = True
 
+    @classmethod
+    def forget_data(cls):
+        """Forgets the rows found by :meth:`data` so that they are found 
+        again the next time an instance is created.
+        
+        The rows declared as classes, their columns and the DataSet classes 
+        they refer to are only looked up for the first instance of a 
+        DataSet class, so call this after changing the class or its rows, 
+        i.e. after adding a row or a column to a row.  Subclasses forget 
+        their rows too.
+        """
+        for name, val in cls.__dict__.items():
+            if is_row_class(val):
+                for cached in ('_columns', '_references'):
+                    if cached in val.__dict__:
+                        delattr(val, cached)
+        for cached in ('_compiled_data', '_row_plans'):
+            if cached in cls.__dict__:
+                delattr(cls, cached)
+        for subclass in cls.__subclasses__():
+            subclass.forget_data()
+
     @classmethod
     def shared_instance(cls, **kw):
         """Returns or creates the singleton instance for this :class:`DataSet` class"""
@@ -586,13 +761,544 @@ class DataSet(DataContainer):
         if cls in dataset_registry:
             dataset = dataset_registry[cls]
         else:
-            dataset = cls(**kw)
+            if cls in _shared_instances_in_progress:
+                path = _shared_instances_in_progress[
+                            _shared_instances_in_progress.index(cls):] + [cls]
+                raise CircularReferenceError(
+                    "DataSet classes reference each other in a cycle: %s" % (
+                                " -> ".join([c.__name__ for c in path])))
+            _shared_instances_in_progress.append(cls)
+            try:
+                dataset = cls(**kw)
+            finally:
+                _shared_instances_in_progress.remove(cls)
             dataset_registry.register(dataset)
         return dataset
 
     def post_load(self):
         """Hook point to run after all rows of this dataset are loaded."""
 
+class ColumnValue(object):
+    """The value of a column in a :class:`ColumnarRow`, read from and written 
+    to the column list of its :class:`ColumnarDataSet` (or to the values of 
+    a :class:`StreamedRow`).
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.name)
+
+    def __get__(self, row, type=None):
+        if row is None:
+            return self
+        val = row._declared(self.name)
+        if isinstance(val, RefValue):
+            # as if it were declared on a row class
+            return val.__get__(row, type)
+        return val
+
+    def __set__(self, row, value):
+        row._declare(self.name, value)
+
+class ColumnarRow(DataRow):
+    """A row of a :class:`ColumnarDataSet`, made on access.
+    
+    Its columns are :class:`ColumnValue` descriptors so nothing is copied.
+    """
+    __slots__ = ('_index',)
+
+    def __init__(self, dataset, key, index):
+        object.__setattr__(self, '_dataset', dataset)
+        object.__setattr__(self, '_key', key)
+        object.__setattr__(self, '_index', index)
+
+    def __repr__(self):
+        return "<%s %s of %s>" % (self.__class__.__name__, self._key, 
+                                  self._dataset.__class__.__name__)
+
+    def _declared(self, name):
+        """Returns the value of column name as declared, i.e. a Ref.Value 
+        isn't resolved.
+        """
+        return self._dataset.meta.columns[name][self._index]
+
+    def _declare(self, name, value):
+        self._dataset.meta.columns[name][self._index] = value
+
+class ColumnarRows(object):
+    """The rows of a :class:`ColumnarDataSet` by key, i.e. its ``meta.data``"""
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __contains__(self, key):
+        return key in self.dataset.meta.key_index
+
+    def __len__(self):
+        return len(self.dataset.meta.key_index)
+
+    def __getitem__(self, key):
+        meta = self.dataset.meta
+        return meta.row_view(self.dataset, key, meta.key_index[key])
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+class ColumnarDataSetMeta(DataSetMeta):
+    """
+    Configures a :class:`ColumnarDataSet` class.
+    
+    Accepts the same attributes as :class:`DataSetMeta`.  The following are 
+    set when the rows are built:
+    
+    ``columns``
+        a dict of column name -> list of values, one per row
+    
+    ``column_names``
+        the column names in alphabetical order
+    
+    ``key_index``
+        a dict of row key -> position of the row in each column list
+    
+    ``row_view``
+        the :class:`ColumnarRow` subclass that rows are accessed with
+    
+    """
+    columns = None
+    column_names = None
+    key_index = None
+    row_view = None
+
+class ColumnarDataSet(DataSet):
+    """
+    A :class:`DataSet` that keeps its rows as one list of values per column.
+    
+    Use this for very large DataSets.  Rows are declared as for a DataSet, 
+    usually by returning key/dict pairs from ``data()``, but no class is 
+    made for each of them.  Instead, a :class:`ColumnarRow` is made whenever 
+    a row is accessed::
+    
+        >>> class Events(ColumnarDataSet):
+        ...     def data(self):
+        ...         for i in range(1, 4):
+        ...             yield ('event_%s' % i, dict(name='Event %s' % i))
+        ... 
+        >>> events = Events()
+        >>> events.event_2.name
+        'Event 2'
+        >>> events.meta.columns['name']
+        ['Event 1', 'Event 2', 'Event 3']
+    
+    All rows must have the same columns, although a column that 
+    ``Meta.row`` declares can be left out to use its value.  A column can 
+    hold references to other rows or Ref.Value objects but not both.  Values 
+    set on a row, like the references a loader resolves, are written to the 
+    column.
+    
+    See :class:`ColumnarDataSetMeta` for what is kept in ``meta``.
+    
+    """
+    Meta = ColumnarDataSetMeta
+
+    def __init__(self, default_refclass=None, default_meta=None):
+        if not default_meta:
+            default_meta = ColumnarDataSet.Meta
+        DataSet.__init__(self, default_refclass=default_refclass, 
+                         default_meta=default_meta)
+
+    def __contains__(self, name):
+        """True if name is a known key"""
+        key_index = self.meta.key_index
+        return key_index is not None and name in key_index
+
+    def __iter__(self):
+        """yields keys of self.meta and their rows"""
+        row_view = self.meta.row_view
+        index = 0
+        for key in self.meta.keys:
+            yield (key, row_view(self, key, index))
+            index += 1
+
+    def _setcolumns(self, names):
+        meta = self.meta
+        names = list(names)
+        names.sort()
+        meta.column_names = tuple(names)
+        meta.columns = dict([(name, []) for name in names])
+        meta.key_index = {}
+        meta.data = ColumnarRows(self)
+        attrs = dict([(name, ColumnValue(name)) for name in names])
+        attrs['_columns'] = meta.column_names
+        attrs['__slots__'] = ()
+        meta.row_view = type("%sRow" % self.__class__.__name__, 
+                             (ColumnarRow, meta.row), attrs)
+
+    def _setrows(self):
+        """Adds the (key, data) pairs returned by data() to the columns"""
+        meta = self.meta
+        defaults = dict([(name, getattr(meta.row, name)) 
+                                        for name in row_columns(meta.row)])
+        columns = None
+        for key, data in self.data():
+            if key in self:
+                raise ValueError(
+                    "data() cannot redeclare key '%s' "
+                    "(this is already an attribute)" % key)
+            if not isinstance(data, dict):
+                # a row class
+                data = dict([(name, getattr(data, name)) 
+                                            for name in row_columns(data)])
+            if columns is None:
+                names = set(defaults)
+                names.update(data)
+                self._setcolumns(names)
+                columns = [(name, meta.columns[name]) 
+                                            for name in meta.column_names]
+            found = 0
+            for name, values in columns:
+                if name in data:
+                    values.append(data[name])
+                    found += 1
+                elif name in defaults:
+                    values.append(defaults[name])
+                else:
+                    raise ValueError(
+                        "row '%s' of %s has no value for column '%s'" % (
+                                        key, self.__class__.__name__, name))
+            if found < len(data):
+                raise ValueError(
+                    "row '%s' of %s has columns that other rows don't have: "
+                    "%s" % (key, self.__class__.__name__, ", ".join(sorted(
+                                [n for n in data if n not in meta.columns]))))
+            meta.key_index[key] = len(meta.keys)
+            meta.keys.append(key)
+        if columns is None:
+            # no rows
+            self._setcolumns(defaults)
+        meta.row_view._references = self._find_references()
+
+    def _find_references(self):
+        """Returns the (name, kind) pairs of the columns that refer to 
+        other rows and adds the DataSet classes they refer to to 
+        ``meta.references``.
+        
+        See :func:`row_references`
+        """
+        meta = self.meta
+        references = []
+        for name in meta.column_names:
+            kinds = set()
+            for val in meta.columns[name]:
+                kind, ds_classes = _reference(val)
+                if kind:
+                    kinds.add(kind)
+                    for ds_class in ds_classes:
+                        if ds_class not in meta.references:
+                            meta.references.append(ds_class)
+            if len(kinds) > 1:
+                raise ValueError(
+                    "column '%s' of %s mixes references of kinds %s" % (
+                        name, self.__class__.__name__, ", ".join(sorted(kinds))))
+            if kinds:
+                references.append((name, kinds.pop()))
+        return tuple(references)
+
+    def _setdata(self, key, value):
+        """Rows live in the columns, so only this dataset's own rows, 
+        which are already there, can be set.
+        """
+        if not (isinstance(value, ColumnarRow) and value._dataset is self and 
+                                                        key in self):
+            raise TypeError(
+                "cannot set row '%s' of %s to %r, rows of a %s are "
+                "declared by data()" % (
+                        key, self.__class__.__name__, value, 
+                        ColumnarDataSet.__name__))
+
+class StreamedRow(ColumnarRow):
+    """A row of a :class:`StreamingDataSet`, which keeps the values read 
+    from ``data()`` until it has been saved.
+    
+    Rows of a loaded StreamingDataSet have no values of their own, all 
+    attributes are read from the stored object.
+    """
+    __slots__ = ('_values',)
+
+    def __init__(self, dataset, key, values=None):
+        object.__setattr__(self, '_dataset', dataset)
+        object.__setattr__(self, '_key', key)
+        object.__setattr__(self, '_values', values)
+
+    def _declared(self, name):
+        return self._values[name]
+
+    def _declare(self, name, value):
+        self._values[name] = value
+
+class StreamedRows(object):
+    """The loaded rows of a :class:`StreamingDataSet` by key, i.e. its 
+    ``meta.data``
+    """
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __contains__(self, key):
+        return key in self.dataset.meta._stored_objects
+
+    def __len__(self):
+        return len(self.dataset.meta._stored_objects)
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return StreamedRow(self.dataset, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+class StreamedObject(object):
+    """Stands in for an object stored for a row of a :class:`StreamingDataSet`.
+    
+    The primary key columns named in ``Meta.primary_key`` are known, any 
+    other attribute is read from the object that the storage medium finds 
+    by its primary key.
+    """
+    def __init__(self, dataset, primary_key):
+        self._dataset = dataset
+        self._primary_key = primary_key
+        self._obj = None
+
+    def __repr__(self):
+        return "<%s of %s with primary key %s>" % (
+                self.__class__.__name__, self._dataset.__class__.__name__, 
+                list(self._primary_key))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        names = list(self._dataset.meta.primary_key)
+        if name in names and len(names) == len(self._primary_key):
+            return self._primary_key[names.index(name)]
+        if self._obj is None:
+            medium = self._dataset.meta.storage_medium
+            self._obj = medium.find_many([list(self._primary_key)])[0]
+        return getattr(self._obj, name)
+
+class StreamedObjectStore(object):
+    """Keeps the primary key of each object stored for a 
+    :class:`StreamingDataSet`, by row key, instead of the object itself.
+    
+    The storage medium tells the primary key of an object and finds objects 
+    by their primary keys, see 
+    :meth:`StorageMediumAdapter.primary_key <fixture.loadable.loadable.StorageMediumAdapter.primary_key>`
+    """
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.primary_keys = {}
+
+    def __repr__(self):
+        return "<%s with %s primary keys>" % (
+                self.__class__.__name__, len(self.primary_keys))
+
+    def __contains__(self, key):
+        return key in self.primary_keys
+
+    def __len__(self):
+        return len(self.primary_keys)
+
+    def __iter__(self):
+        for objects in self.chunks(self.dataset.meta.chunk_size):
+            for obj in objects:
+                yield obj
+
+    def chunks(self, size):
+        """Yields lists of at most size stored objects, as found by their 
+        primary keys.
+        """
+        medium = self.dataset.meta.storage_medium
+        keys = self.primary_keys.values()
+        for start in range(0, len(keys), size):
+            yield medium.find_many(
+                        [list(pk) for pk in keys[start:start + size]])
+
+    def get_object(self, key):
+        """returns a :class:`StreamedObject` for the object stored at this key"""
+        try:
+            primary_key = self.primary_keys[key]
+        except KeyError:
+            raise KeyError("row '%s' hasn't been loaded for %s" % (
+                                        key, self.dataset.__class__.__name__))
+        return StreamedObject(self.dataset, primary_key)
+
+    def store(self, key, obj):
+        if key in self.primary_keys:
+            raise ValueError(
+                "data() of %s returned key '%s' more than once" % (
+                                        self.dataset.__class__.__name__, key))
+        medium = self.dataset.meta.storage_medium
+        self.primary_keys[key] = tuple(medium.primary_key(obj))
+
+class StreamingDataSetMeta(DataSetMeta):
+    """
+    Configures a :class:`StreamingDataSet` class.
+    
+    Accepts the same attributes as :class:`DataSetMeta` and:
+    
+    ``chunk_size``
+        how many rows a loader saves at once if it doesn't have a 
+        ``batch_size`` of its own, 1000 by default.  Rows are deleted in 
+        chunks of this size as well.
+    
+    ``row_view``
+        the :class:`StreamedRow` subclass that rows are read with, made 
+        when the first row is read
+    
+    """
+    chunk_size = 1000
+    row_view = None
+
+class StreamingDataSet(DataSet):
+    """
+    A :class:`DataSet` that reads its rows from ``data()`` each time it is 
+    iterated, i.e. when it is loaded, instead of keeping them.
+    
+    ``data()`` can return any iterable of key/dict pairs, like a generator 
+    that reads a file or a database cursor::
+    
+        >>> class Visits(StreamingDataSet):
+        ...     def data(self):
+        ...         for i in range(1, 4):
+        ...             yield ('visit_%s' % i, dict(page='/page/%s' % i))
+        ... 
+        >>> visits = Visits()
+        >>> [(key, row.page) for key, row in visits]
+        [('visit_1', '/page/1'), ('visit_2', '/page/2'), ('visit_3', '/page/3')]
+    
+    A loader saves the rows in chunks (see :class:`StreamingDataSetMeta`) 
+    and lets go of them.  Only the primary key of each stored row is kept, 
+    so ``visits.visit_2.id`` still works once loaded, and any other 
+    attribute is read from the stored object.  This needs a storage medium 
+    that implements ``primary_key()`` and ``find_many()``.
+    
+    As with :class:`ColumnarDataSet`, all rows must have the same columns.  
+    Since rows are not read in advance, the DataSet classes they refer to 
+    must be declared in ``Meta.references``.  Other rows can refer to a 
+    streamed row with :meth:`row_ref`.
+    
+    """
+    Meta = StreamingDataSetMeta
+    _reserved_attr = DataSet._reserved_attr + ('row_ref',)
+
+    def __init__(self, default_refclass=None, default_meta=None):
+        if not default_meta:
+            default_meta = StreamingDataSet.Meta
+        DataSet.__init__(self, default_refclass=default_refclass, 
+                         default_meta=default_meta)
+        self.meta._stored_objects = StreamedObjectStore(self)
+        self.meta.data = StreamedRows(self)
+
+    @classmethod
+    def row_ref(cls, key):
+        """Returns a :class:`Ref` to the row at this key, i.e. 
+        ``Visits.row_ref('visit_1')('id')`` for its id once it is loaded.
+        """
+        return Ref(cls, type(key, (object,), {}))
+
+    def __contains__(self, name):
+        """True if name is the key of a loaded row"""
+        return name in self.meta._stored_objects
+
+    def __iter__(self):
+        """yields the keys and rows returned by data(), which is called 
+        again each time
+        """
+        for key, data in self.data():
+            yield (key, self._row(key, data))
+
+    def _row(self, key, data):
+        meta = self.meta
+        if not isinstance(data, dict):
+            # a row class
+            data = dict([(name, getattr(data, name)) 
+                                        for name in row_columns(data)])
+        row_view = meta.row_view
+        if row_view is None:
+            row_view = self._set_row_view(data)
+        columns = row_view._columns
+        if len(data) < len(columns):
+            values = dict(row_view._defaults)
+            values.update(data)
+        else:
+            values = data
+        for name in columns:
+            if name not in values:
+                raise ValueError(
+                    "row '%s' of %s has no value for column '%s'" % (
+                                        key, self.__class__.__name__, name))
+        if len(values) > len(columns):
+            raise ValueError(
+                "row '%s' of %s has columns that other rows don't have: "
+                "%s" % (key, self.__class__.__name__, ", ".join(sorted(
+                            [n for n in values if n not in columns]))))
+        self._add_references(row_view, values)
+        return row_view(self, key, values)
+
+    def _set_row_view(self, data):
+        meta = self.meta
+        defaults = dict([(name, getattr(meta.row, name)) 
+                                        for name in row_columns(meta.row)])
+        names = set(defaults)
+        names.update(data)
+        names = list(names)
+        names.sort()
+        attrs = dict([(name, ColumnValue(name)) for name in names])
+        attrs['_columns'] = tuple(names)
+        attrs['_defaults'] = defaults
+        attrs['_references'] = ()
+        attrs['__slots__'] = ()
+        meta.row_view = type("%sRow" % self.__class__.__name__, 
+                             (StreamedRow, meta.row), attrs)
+        return meta.row_view
+
+    def _add_references(self, row_view, values):
+        """Adds the columns of values that refer to other rows to the 
+        references of row_view, see :func:`row_references`
+        """
+        known = dict(row_view._references)
+        for name, val in values.iteritems():
+            kind, ds_classes = _reference(val)
+            if not kind:
+                continue
+            for ds_class in ds_classes:
+                if (ds_class is not type(self) and 
+                                ds_class not in self.meta.references):
+                    raise ValueError(
+                        "column '%s' of %s refers to %s, which must be "
+                        "declared in Meta.references" % (
+                            name, self.__class__.__name__, ds_class.__name__))
+            if name not in known:
+                known[name] = kind
+                row_view._references = tuple([
+                        (n, known[n]) for n in row_view._columns 
+                                                        if n in known])
+            elif known[name] != kind:
+                raise ValueError(
+                    "column '%s' of %s mixes references of kinds %s" % (
+                        name, self.__class__.__name__, 
+                        ", ".join(sorted([kind, known[name]]))))
+
+    def _setrows(self):
+        """Rows are read from data() when the DataSet is iterated"""
+
+    def _setdata(self, key, value):
+        """Rows are not kept once they are saved"""
+
 class DataSetContainer(object):
     """
     A ``DataSet`` of :class:`DataSet` classes
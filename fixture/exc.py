@@ -49,6 +49,14 @@ class UnloadError(DataSetActionException):
     """
     pass
 
+class CircularReferenceError(ValueError):
+    """
+    DataSet classes reference each other in a cycle and cannot be loaded.
+    
+    used by :mod:`fixture.dataset` and :mod:`fixture.loadable` classes
+    """
+    pass
+
 class StorageMediaNotFound(LookupError):
     """
     Looking up a storable object failed.
@@ -2,7 +2,7 @@
 """Loadable fixture components"""
 
 __all__ = ['SQLAlchemyFixture', 'SQLObjectFixture', 'GoogleDatastoreFixture',
-           'DjangoFixture', 'StormFixture']
+           'DjangoFixture', 'StormFixture', 'InMemoryFixture']
 import loadable
 __doc__ = loadable.__doc__
 from loadable import *
@@ -11,4 +11,5 @@ from sqlobject_loadable import SQLObjectFixture
 from google_datastore_loadable import GoogleDatastoreFixture
 from django_loadable import DjangoFixture
 from storm_loadable import StormFixture
+from inmemory_loadable import InMemoryFixture
 
@@ -31,9 +31,157 @@ def field_is_required(field):
               getattr(field, 'auto_now_add', False)]
     return not any(fields)
 
+def annotate_invalid_schema_exception(model, key):
+    """Try and add more context to any error message"""
+    info = ""
+    related_field_names =  set([ro.field.related_query_name() for ro in
+                            model._meta.get_all_related_many_to_many_objects() \
+                            + model._meta.get_all_related_objects()])
+    try: # Provide a nicer error message
+        if key in related_field_names:
+            # get a dict like {reverse_related_name: RelatedObject}
+            fld_lookup = dict([(ro.field.related_query_name(), ro) \
+                                    for ro in
+                        model._meta.get_all_related_many_to_many_objects() \
+                        + model._meta.get_all_related_objects()])
+            other_model = fld_lookup[key].model
+            fld_name = fld_lookup[key].field.name
+            info = ("\n**********************\n"
+                    "This is a reverse relation of %s, you "
+                    "should specifiy it there, i.e:\n"
+                    "    %sData(DataSet):\n"
+                    "        class ...:\n"
+                    "            %s = [...]\n"
+                    "**********************\n" % \
+                    ("%s.%s" % (pretty_model_name(other_model), fld_name),
+                     other_model.__name__,
+                     fld_name))
+    except:
+        pass
+    return info
+
+_model_schemas = {}
+
+def model_schema(model):
+    """Returns the :class:`ModelSchema` of this model.
+    
+    Schemas are built once and thrown away whenever a model class is 
+    prepared, since that may change relations of models already seen.
+    """
+    try:
+        return _model_schemas[model]
+    except KeyError:
+        _connect_schema_invalidation()
+        schema = _model_schemas[model] = ModelSchema(model)
+        return schema
+
+def clear_model_schemas(**kw):
+    """Forget every :class:`ModelSchema` built so far"""
+    _model_schemas.clear()
+
+def _connect_schema_invalidation():
+    from django.db.models.signals import class_prepared
+    # weak=False since this is a module function, dispatch_uid 
+    # keeps it from being connected twice :
+    class_prepared.connect(clear_model_schemas, weak=False, 
+                           dispatch_uid='fixture.clear_model_schemas')
+
+class ModelSchema(object):
+    """What :class:`DjangoMedium` needs to know about the fields of a model.
+    
+    Everything is read from ``model._meta`` once, rows are validated 
+    by a :class:`ColumnValidator` built for each set of column names.
+    """
+    def __init__(self, model):
+        from django.db.models.fields.related import ManyToManyField
+        self.model = model
+        # This will be only localy defined fields (excluding many_to_many)
+        self.own_field_names = frozenset([f.name for f in model._meta.fields])
+        # All locally defined fields which are required and not auto fields (id)
+        self.required_field_names = frozenset(
+                [f.name for f in model._meta.fields if field_is_required(f)])
+        self.m2m_field_names = frozenset(
+                [f.name for f in model._meta.many_to_many])
+        self.fields = {}
+        for name in self.own_field_names.union(self.m2m_field_names):
+            self.fields[name] = model._meta.get_field(name)
+        # {field name: related model} of many to many fields that 
+        # don't take NULL :
+        self.m2m_targets = {}
+        for name in self.m2m_field_names:
+            field = self.fields[name]
+            if isinstance(field, ManyToManyField) and not field.null:
+                self.m2m_targets[name] = field.rel.to
+        self.validators = {}
+
+    def validator(self, column_names):
+        """Returns the :class:`ColumnValidator` for this tuple of names"""
+        try:
+            return self.validators[column_names]
+        except KeyError:
+            v = self.validators[column_names] = ColumnValidator(
+                                                        self, column_names)
+            return v
+
+class ColumnValidator(object):
+    """Checks rows that have the same column names against a schema.
+    
+    Unknown columns are reported when the validator is created, which 
+    leaves checking values of many to many fields for each row.
+    """
+    def __init__(self, schema, column_names):
+        model = schema.model
+        for key in column_names:
+            # Valid field?
+            if not key in schema.fields:
+                msg = "Model %r doesn't have field named %s." % \
+                                    (pretty_model_name(model), key)
+               
+                raise ValueError(msg + \
+                            annotate_invalid_schema_exception(model, key))
+        self.missing_field_names = set(schema.required_field_names).difference(
+                                                                column_names)
+        self.m2m_columns = [(n, key, key in schema.m2m_targets and 
+                                     schema.m2m_targets[key]) 
+                            for n, key in enumerate(column_names) 
+                            if key in schema.m2m_field_names]
+
+    def check(self, column_vals):
+        """Returns column_vals with single many to many values in a list
+        
+        :raises: ValueError
+        """
+        if self.m2m_columns:
+            column_vals = list(column_vals)
+            for n, key, rel_to in self.m2m_columns:
+                val = column_vals[n][1]
+                try:
+                    len(val)
+                except TypeError:
+                    val = [val]
+                if rel_to:
+                    for v in val:
+                        if not isinstance(v, rel_to):
+                            raise ValueError(
+                                    "Values for field %s must be of type %s, "
+                                    "got %s" % (key, pretty_model_name(rel_to), 
+                                                val))
+                column_vals[n] = (key, val)
+        if self.missing_field_names:
+            raise ValueError(
+                    "Requred fields %s not found" % self.missing_field_names)
+        return column_vals
+
 class DjangoMedium(DBLoadableFixture.StorageMediumAdapter):
     """Adapter for storing data using django models
     """
+    bulk = False
+    # bound parameters per DELETE statement, SQLite allows no more than 999
+    delete_chunk_size = 900
+
+    def __init__(self, *a, **kw):
+        DBLoadableFixture.StorageMediumAdapter.__init__(self, *a, **kw)
+        self.batch_size = None
     
     def clear(self, obj):
         """Delete this object from the DB
@@ -43,34 +191,22 @@ class DjangoMedium(DBLoadableFixture.StorageMediumAdapter):
         """
         obj.delete()
 
+    def clear_many(self, objs):
+        """Delete all of these objects from the DB with one query for every 
+        ``delete_chunk_size`` objects
+        
+        :param objs: The objects to delete
+        :type objs: A list of django models
+        """
+        manager = self.medium._default_manager
+        pks = [obj.pk for obj in objs]
+        for start in range(0, len(pks), self.delete_chunk_size):
+            chunk = pks[start:start + self.delete_chunk_size]
+            manager.filter(pk__in=chunk).delete()
+
     def _annotate_invalid_schema_exception(self, model, key):
         """Try and add more context to any error message"""
-        info = ""
-        related_field_names =  set([ro.field.related_query_name() for ro in
-                                model._meta.get_all_related_many_to_many_objects() \
-                                + model._meta.get_all_related_objects()])
-        try: # Provide a nicer error message
-            if key in related_field_names:
-                # get a dict like {reverse_related_name: RelatedObject}
-                fld_lookup = dict([(ro.field.related_query_name(), ro) \
-                                        for ro in
-                            model._meta.get_all_related_many_to_many_objects() \
-                            + model._meta.get_all_related_objects()])
-                other_model = fld_lookup[key].model
-                fld_name = fld_lookup[key].field.name
-                info = ("\n**********************\n"
-                        "This is a reverse relation of %s, you "
-                        "should specifiy it there, i.e:\n"
-                        "    %sData(DataSet):\n"
-                        "        class ...:\n"
-                        "            %s = [...]\n"
-                        "**********************\n" % \
-                        ("%s.%s" % (pretty_model_name(other_model), fld_name),
-                         other_model.__name__,
-                         fld_name))
-        except:
-            pass
-        return info
+        return annotate_invalid_schema_exception(model, key)
         
     def _check_schema(self, column_vals):
         """Check that the column_vals given match up to this model's schema
@@ -79,84 +215,245 @@ class DjangoMedium(DBLoadableFixture.StorageMediumAdapter):
         :type column_vals: tuple of field_name, field_value
         :raises: ValueError
         """
-                    
-        model = self.medium
-        # This will be only localy defined fields (excluding many_to_many)
-        own_field_names = set([f.name for f in model._meta.fields])
-        # All locally defined fields which are required and not auto fields (id)
-        required_field_names = set([f.name for f in model._meta.fields
-                                    if field_is_required(f)])
-        m2m_field_names = set([f.name for f in model._meta.many_to_many])
-        
-        
-        processed_column_values = []
-        for key, val in column_vals:
-            # Valid field?
-            if not key in own_field_names.union(m2m_field_names):
-                msg = "Model %r doesn't have field named %s." % \
-                                    (pretty_model_name(model), key)
-               
-                raise ValueError(msg + \
-                            self._annotate_invalid_schema_exception(model, key))
-                
-            # Keep a track of required fields
-            try:
-                required_field_names.remove(key)
-            except KeyError:
-                pass
-            
-            # If the field is a relation check the related type
-            field = model._meta.get_field(key)
-            from django.db.models.fields.related import ManyToManyField
-            if isinstance(field, ManyToManyField):
-                try:
-                    len(val)
-                except TypeError:
-                    val = [val]
-                rel_types = [isinstance(v, field.rel.to) for v in val]
-                if not field.null and False in rel_types:
-                    raise ValueError("Values for field %s must be of type %s, "
-                                     "got %s" % \
-                                     (key,
-                                      pretty_model_name(field.rel.to),
-                                      val))
-            processed_column_values.append((key, val))
-        if len(required_field_names):
-            raise ValueError("Requred fields %s not found" % required_field_names)
-        return m2m_field_names, processed_column_values
-    
-    def save(self, row, column_vals):
-        """Save this row to the DB"""
-        model = self.medium
-        manager = self.medium._default_manager
-        field_names = [f.name for f in model._meta.fields]
-        #column_vals = list(column_vals)
+        schema = model_schema(self.medium)
+        column_vals = list(column_vals)
+        validator = schema.validator(tuple([key for key, val in column_vals]))
+        return schema.m2m_field_names, validator.check(column_vals)
+
+    def _db_values(self, column_vals):
+        field_names = model_schema(self.medium).own_field_names
         m2m_field_names, column_vals = self._check_schema(column_vals)
         # This will take care of foreignkeys too
         dbvals = {}
         for key, val in column_vals:
             if key in field_names:
                 dbvals[key] = val
-        new_obj = manager.get_or_create(**dbvals)[0]
         columns = dict(column_vals)
+        m2m_vals = {}
         for m2m in m2m_field_names:
             if m2m in columns:
-                getattr(new_obj, m2m).add(*columns[m2m])
+                m2m_vals[m2m] = columns[m2m]
+        return dbvals, m2m_vals
+
+    def save(self, row, column_vals):
+        """Save this row to the DB"""
+        manager = self.medium._default_manager
+        dbvals, m2m_vals = self._db_values(column_vals)
+        new_obj = manager.get_or_create(**dbvals)[0]
+        for m2m, related in m2m_vals.items():
+            getattr(new_obj, m2m).add(*related)
         return new_obj
+
+    def can_save_many(self):
+        """True in bulk mode, see :meth:`save_many`"""
+        return self.bulk
+
+    def save_many(self, rows):
+        """Save a list of (row, column_vals) pairs to the DB
+        
+        Unless the loader is in bulk mode each row is saved with 
+        :meth:`save`.  In bulk mode new objects are inserted without first 
+        looking for an existing one: with ``bulk_create()`` where Django has 
+        it, otherwise one INSERT per object.  Missing primary keys are 
+        allocated beforehand when :meth:`allocate_primary_keys` knows how, 
+        and the rows of each many-to-many table are inserted all at once.
+        """
+        if not self.bulk:
+            return DBLoadableFixture.StorageMediumAdapter.save_many(self, rows)
+        model = self.medium
+        objs = []
+        m2m_rows = []
+        for row, column_vals in rows:
+            dbvals, m2m_vals = self._db_values(column_vals)
+            objs.append(model(**dbvals))
+            m2m_rows.append(m2m_vals)
+        
+        missing = [obj for obj in objs if obj.pk is None]
+        if missing:
+            keys = self.allocate_primary_keys(len(missing), 
+                        reserved=[obj.pk for obj in objs if obj.pk is not None])
+            if keys is not None:
+                for obj, key in zip(missing, keys):
+                    obj.pk = key
+                missing = []
+        
+        manager = model._default_manager
+        if hasattr(manager, 'bulk_create') and (
+                        not missing or self._bulk_insert_returns_keys()):
+            objs = self._bulk_create(manager, objs)
+        else:
+            for obj in objs:
+                obj.save(force_insert=True)
+        
+        self.save_m2m(zip(objs, m2m_rows))
+        return objs
+
+    def _bulk_create(self, manager, objs):
+        """bulk_create() these objects, ``batch_size`` at a time"""
+        import inspect
+        from django.db.models.query import QuerySet
+        if not self.batch_size:
+            return manager.bulk_create(objs) or objs
+        if 'batch_size' in inspect.getargspec(QuerySet.bulk_create)[0]:
+            return manager.bulk_create(objs, batch_size=self.batch_size) or objs
+        # Django 1.4 has no batch_size argument :
+        created = []
+        for start in range(0, len(objs), self.batch_size):
+            chunk = objs[start:start + self.batch_size]
+            created.extend(manager.bulk_create(chunk) or chunk)
+        return created
+
+    def save_m2m(self, objs_and_values):
+        """Insert the many-to-many rows of these objects
         
+        objs_and_values is a list of (object, {field_name: related_objects}) 
+        pairs.  The rows of each many-to-many table are created all at once 
+        through its intermediary model on the database the model is written 
+        to.  Django before 1.2 has no such model for automatic tables, their 
+        rows are inserted with one ``executemany()`` instead.
+        """
+        using, connection = self._database()
+        for field in self.medium._meta.many_to_many:
+            through = getattr(field.rel, 'through', None)
+            if isinstance(through, basestring):
+                through = None
+            if through is not None and \
+                        not getattr(through._meta, 'auto_created', True):
+                # only automatic tables, Django can't add() to the others :
+                for obj, m2m_vals in objs_and_values:
+                    if field.name in m2m_vals:
+                        getattr(obj, field.name).add(*m2m_vals[field.name])
+                continue
+            pairs = []
+            for obj, m2m_vals in objs_and_values:
+                for related in m2m_vals.get(field.name, []):
+                    pairs.append((obj.pk, related.pk))
+            if not pairs:
+                continue
+            if through is not None:
+                get_field = through._meta.get_field
+                source = get_field(field.m2m_field_name()).attname
+                target = get_field(field.m2m_reverse_field_name()).attname
+                links = [through(**{source: pk, target: related_pk})
+                         for pk, related_pk in pairs]
+                manager = through._default_manager.db_manager(using)
+                if hasattr(manager, 'bulk_create'):
+                    self._bulk_create(manager, links)
+                else:
+                    for link in links:
+                        link.save(using=using, force_insert=True)
+                continue
+            qn = connection.ops.quote_name
+            stmt = "INSERT INTO %s (%s, %s) VALUES (%%s, %%s)" % (
+                            qn(field.m2m_db_table()), 
+                            qn(field.m2m_column_name()), 
+                            qn(field.m2m_reverse_name()))
+            connection.cursor().executemany(stmt, pairs)
+
+    def allocate_primary_keys(self, count, reserved=()):
+        """Returns a list of count new primary key values or None.
+        
+        This only works for an auto-incrementing primary key.  On SQLite 
+        the values follow the highest stored (or reserved) key and, if the 
+        table is in ``sqlite_sequence``, the highest key it ever handed 
+        out.  On PostgreSQL they are fetched from the sequence that 
+        ``pg_get_serial_sequence()`` finds for the column.  For anything 
+        else None is returned.
+        """
+        from django.db.models import AutoField, Max
+        pk = self.medium._meta.pk
+        if not isinstance(pk, AutoField):
+            return None
+        using, connection = self._database()
+        vendor = database_vendor(connection)
+        if vendor == 'sqlite':
+            cursor = connection.cursor()
+            manager = self.medium._default_manager
+            if using is not None:
+                manager = manager.db_manager(using)
+            last = manager.aggregate(last=Max(pk.attname))['last']
+            last = max([last or 0] + list(reserved))
+            cursor.execute("SELECT name FROM sqlite_master "
+                           "WHERE type = 'table' AND name = 'sqlite_sequence'")
+            if cursor.fetchall():
+                cursor.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = %s", 
+                    [self.medium._meta.db_table])
+                last = max([last] + [r[0] for r in cursor.fetchall()])
+            return range(last + 1, last + 1 + count)
+        elif vendor == 'postgresql':
+            cursor = connection.cursor()
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", 
+                [connection.ops.quote_name(self.medium._meta.db_table), 
+                 pk.column])
+            seq_name = cursor.fetchone()[0]
+            if seq_name is None:
+                # not a serial column, don't guess :
+                return None
+            cursor.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)", 
+                [seq_name, count])
+            return [r[0] for r in cursor.fetchall()]
+        return None
+
+    def _bulk_insert_returns_keys(self):
+        using, connection = self._database()
+        features = connection.features
+        return bool(getattr(features, 'can_return_rows_from_bulk_insert', 
+                    getattr(features, 'can_return_ids_from_bulk_insert', False)))
+
+    def _database(self):
+        """Returns the alias of the database the model is written to and 
+        its connection, the alias is None before Django 1.2"""
+        try:
+            from django.db import connections, router
+        except ImportError:
+            from django.db import connection
+            return None, connection
+        using = router.db_for_write(self.medium)
+        return using, connections[using]
     
     def visit_loader(self, loader):
         """Visit the loader and store a reference to the transaction connection"""
         self.transaction = loader.transaction
+        self.bulk = getattr(loader, 'bulk', self.bulk)
+        self.batch_size = loader.batch_size
+
+def database_vendor(connection):
+    """Returns 'sqlite', 'postgresql', 'mysql', etc for this connection"""
+    vendor = getattr(connection, 'vendor', None)
+    if vendor:
+        return vendor
+    # Django before 1.3 :
+    from django.conf import settings
+    engine = settings.DATABASE_ENGINE
+    for vendor in ('sqlite', 'postgresql', 'mysql', 'oracle'):
+        if vendor in engine:
+            return vendor
+    return engine
 
 class DjangoFixture(DBLoadableFixture):
     """A fixture that knows how to load DataSet objects via `Django Model <http://docs.djangoproject.com/en/dev/topics/db/models/#topics-db-models>`_ classes.
+    
+    Keyword Arguments:
+    
+    bulk
+        If True, the rows of each dataset are inserted as new objects in 
+        as few queries as possible instead of one ``get_or_create()`` at a 
+        time.  Use ``batch_size`` to limit how many rows go into one batch.  
+        See :meth:`DjangoMedium.save_many`
+    
+    See :class:`fixture.loadable.loadable.DBLoadableFixture` for other 
+    keyword arguments
     """
+    bulk = False
             
-    def __init__(self, **kw):
+    def __init__(self, bulk=None, **kw):
         if not kw.get('env', None):
             kw['env'] = DjangoEnv
         DBLoadableFixture.__init__(self, **kw)
+        if bulk is not None:
+            self.bulk = bulk
     
     DjangoMedium = DjangoMedium
     Medium = DjangoMedium
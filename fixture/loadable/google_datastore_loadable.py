@@ -14,6 +14,10 @@ class EntityMedium(EnvLoadableFixture.StorageMediumAdapter):
     Adapts google.appengine.api.datastore.Entity objects and any 
     other object that is an instance of Entity
     """        
+    # entities per db.put() or db.delete() call, the Datastore 
+    # refuses batches of more than 500
+    batch_limit = 500
+
     def _entities_to_keys(self, mylist):
         """Converts an array of datastore objects to an array of keys.
         
@@ -30,6 +34,13 @@ class EntityMedium(EnvLoadableFixture.StorageMediumAdapter):
     def clear(self, obj):
         """Delete this entity from the Datastore"""
         obj.delete()
+
+    def clear_many(self, objs):
+        """Delete all of these entities from the Datastore in as few 
+        batches as possible"""
+        from google.appengine.ext import db
+        for start in range(0, len(objs), self.batch_limit):
+            db.delete(objs[start:start + self.batch_limit])
         
     def save(self, row, column_vals):
         """Save this entity to the Datastore"""
@@ -39,6 +50,30 @@ class EntityMedium(EnvLoadableFixture.StorageMediumAdapter):
         )
         entity.put()
         return entity
+
+    def save_many(self, rows):
+        """Save a list of (row, column_vals) pairs to the Datastore 
+        with as few ``db.put()`` calls as possible.
+        
+        Rows that refer to other rows of the same DataSet need those 
+        entities to have keys already; the loader takes care of that by 
+        saving the rows before them in an earlier call.
+        """
+        from google.appengine.ext import db
+        entities = []
+        for row, column_vals in rows:
+            gen=[(k,self._entities_to_keys(v)) for k,v in column_vals]
+            entities.append(self.medium(
+                **dict(gen)
+            ))
+        for start in range(0, len(entities), self.batch_limit):
+            db.put(entities[start:start + self.batch_limit])
+        return entities
+
+    def visit_loader(self, loader):
+        """Keeps the loader's ``batch_size``, rows are only put in batches 
+        when it is set"""
+        self.batch_size = loader.batch_size
     
 class GoogleDatastoreFixture(EnvLoadableFixture):
     """
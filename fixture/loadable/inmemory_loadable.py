@@ -0,0 +1,345 @@
+"""Components for loading and unloading data as plain Python objects kept in memory.
+
+Nothing is written to a database, which makes this the fastest way to
+materialize DataSet objects for tests that only need the objects themselves::
+
+    >>> from fixture import DataSet, InMemoryFixture
+    >>> class AuthorData(DataSet):
+    ...     class Meta:
+    ...         indexes = ('last_name',)
+    ...     class frank_herbert:
+    ...         first_name = "Frank"
+    ...         last_name = "Herbert"
+    ...
+    >>> class BookData(DataSet):
+    ...     class dune:
+    ...         title = "Dune"
+    ...         author = AuthorData.frank_herbert
+    ...
+    >>> db = InMemoryFixture()
+    >>> data = db.data(BookData)
+    >>> data.setup()
+    >>> data.BookData.dune.author.id
+    1
+    >>> authors = db.store.table('Author')
+    >>> [a.first_name for a in authors.find(last_name='Herbert')]
+    ['Frank']
+    >>> data.teardown()
+    >>> len(authors)
+    0
+
+"""
+
+from fixture.loadable import EnvLoadableFixture
+from fixture.style import NamedDataStyle
+from fixture.util import _mklog
+
+memlog = _mklog('fixture.loadable.inmemory')
+
+__all__ = ('InMemoryFixture', 'InMemoryMedium', 'InMemoryStore',
+           'InMemoryTable', 'Record')
+
+class Record(object):
+    """A plain object that stores the columns of a row as attributes.
+
+    This is what rows are stored as when a DataSet doesn't map to a class.
+    """
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__,
+                            " ".join(["%s=%r" % (k, v) for k, v in
+                                                sorted(self.__dict__.items())]))
+
+class InMemoryTable(object):
+    """The stored objects of one storable, by id.
+
+    Objects stored without an ``id`` get the next one of an auto-incrementing
+    counter.  Columns can be indexed with :meth:`add_index` so that
+    :meth:`find` doesn't need to look at every object; values of indexed
+    columns must be hashable.  An index keeps the value each object had
+    when it was indexed, even if the object was changed since.
+    """
+    def __init__(self, name, indexes=()):
+        self.name = name
+        self.rows = {}
+        self.next_id = 1
+        # column -> {value -> {id -> object}}
+        self.indexes = {}
+        # id -> {column -> indexed value}
+        self.indexed = {}
+        for column in indexes:
+            self.add_index(column)
+
+    def __repr__(self):
+        return "<%s %s with %s rows>" % (
+                self.__class__.__name__, self.name, len(self.rows))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        ids = self.rows.keys()
+        ids.sort()
+        for id in ids:
+            yield self.rows[id]
+
+    def add_index(self, column):
+        """Index the values of this column"""
+        if column in self.indexes:
+            return
+        index = self.indexes[column] = {}
+        for id, obj in self.rows.iteritems():
+            value = self.indexed[id][column] = getattr(obj, column, None)
+            index.setdefault(value, {})[id] = obj
+
+    def insert(self, obj):
+        """Store this object, giving it an id if it doesn't have one"""
+        id = getattr(obj, 'id', None)
+        if id is None:
+            id = self.next_id
+            obj.id = id
+        elif id in self.rows:
+            raise ValueError(
+                "%s already has an object with id %r: %r" % (
+                                                self, id, self.rows[id]))
+        if isinstance(id, (int, long)) and id >= self.next_id:
+            self.next_id = id + 1
+        self.rows[id] = obj
+        values = self.indexed[id] = {}
+        for column, index in self.indexes.iteritems():
+            value = values[column] = getattr(obj, column, None)
+            index.setdefault(value, {})[id] = obj
+        return id
+
+    def delete(self, obj):
+        """Remove this object"""
+        id = obj.id
+        del self.rows[id]
+        for column, value in self.indexed.pop(id).iteritems():
+            index = self.indexes[column]
+            matches = index[value]
+            del matches[id]
+            if not matches:
+                del index[value]
+
+    def delete_many(self, objs):
+        """Remove all of these objects.
+
+        If they are all the objects of the table, it is emptied at once
+        without going through its indexes.
+        """
+        if len(objs) == len(self.rows):
+            for obj in objs:
+                if obj.id not in self.rows:
+                    break
+            else:
+                self._empty()
+                return
+        for obj in objs:
+            self.delete(obj)
+
+    def clear(self):
+        """Remove all objects and start counting ids from 1 again"""
+        self._empty()
+        self.next_id = 1
+
+    def _empty(self):
+        self.rows.clear()
+        self.indexed.clear()
+        for index in self.indexes.itervalues():
+            index.clear()
+
+    def get(self, id, default=None):
+        """Returns the object with this id"""
+        return self.rows.get(id, default)
+
+    def find(self, **columns):
+        """Returns a list of the objects having all of these column values.
+
+        Indexed columns are looked up first, the others are compared one
+        object at a time.
+        """
+        candidates = None
+        rest = []
+        for column, value in columns.items():
+            if column in self.indexes:
+                matches = self.indexes[column].get(value, {})
+                if candidates is None or len(matches) < len(candidates):
+                    if candidates is not None:
+                        rest.append((column, value))
+                    candidates = matches
+                else:
+                    rest.append((column, value))
+            else:
+                rest.append((column, value))
+        if candidates is None:
+            candidates = self.rows
+        ids = [id for id, obj in candidates.iteritems()
+                    if [getattr(obj, c, None) for c, v in rest] ==
+                                                        [v for c, v in rest]]
+        ids.sort()
+        return [candidates[id] for id in ids]
+
+class InMemoryStore(object):
+    """A collection of :class:`InMemoryTable` objects, one per storable.
+
+    While loading, the ids of inserted objects are remembered so that
+    :meth:`rollback` can remove them again.
+    """
+    def __init__(self):
+        self.tables = {}
+        self.inserted = None
+
+    def __repr__(self):
+        return "<%s at %s with %s tables>" % (
+                self.__class__.__name__, hex(id(self)), len(self.tables))
+
+    def table(self, storable, indexes=()):
+        """Returns the :class:`InMemoryTable` of this storable, which is
+        created on first use.
+        """
+        try:
+            table = self.tables[storable]
+        except KeyError:
+            name = getattr(storable, '__name__', storable)
+            table = self.tables[storable] = InMemoryTable(name)
+        for column in indexes:
+            table.add_index(column)
+        return table
+
+    def begin(self):
+        self.inserted = []
+
+    def insert(self, table, obj):
+        id = table.insert(obj)
+        if self.inserted is not None:
+            self.inserted.append((table, obj))
+        return id
+
+    def commit(self):
+        self.inserted = None
+
+    def rollback(self):
+        """Remove everything inserted since :meth:`begin`"""
+        inserted, self.inserted = self.inserted or [], None
+        inserted.reverse()
+        for table, obj in inserted:
+            table.delete(obj)
+
+class InMemoryMedium(EnvLoadableFixture.StorageMediumAdapter):
+    """Adapter for storing rows as objects in an :class:`InMemoryStore`.
+
+    A storable that is a class is instantiated without arguments and
+    given each column as an attribute, any other storable (i.e. a name)
+    is stored as a :class:`Record`.  Columns named in the DataSet's
+    ``Meta.indexes`` are indexed.
+    """
+    def __init__(self, *a, **kw):
+        EnvLoadableFixture.StorageMediumAdapter.__init__(self, *a, **kw)
+        self.table = None
+
+    def visit_loader(self, loader):
+        """Visit the loader and find the table to store objects in"""
+        self.transaction = loader.store
+        self.table = loader.store.table(
+                    self.medium, indexes=getattr(self.dataset.meta, 'indexes', ()))
+
+    def clear(self, obj):
+        """Remove this object from its table"""
+        self.table.delete(obj)
+
+    def clear_many(self, objs):
+        """Remove all of these objects from their table at once"""
+        self.table.delete_many(list(objs))
+
+    def find_many(self, keys):
+        """Returns the stored objects having these ids"""
+        objects = []
+        for key in keys:
+            obj = self.table.get(key[0])
+            if obj is None:
+                raise LookupError(
+                    "%s with id %s does not exist" % (self.table.name, key[0]))
+            objects.append(obj)
+        return objects
+
+    def primary_key(self, obj):
+        """Returns the id of this object"""
+        return [obj.id]
+
+    def save(self, row, column_vals):
+        """Store this row as a new object"""
+        if isinstance(self.medium, basestring):
+            obj = Record()
+        else:
+            obj = self.medium()
+        for c, val in column_vals:
+            setattr(obj, c, val)
+        self.transaction.insert(self.table, obj)
+        memlog.info("%s %s", self.table.name, obj)
+        return obj
+
+    def truncate(self):
+        """Remove all objects of this storable"""
+        self.table.clear()
+
+class InMemoryFixture(EnvLoadableFixture):
+    """A fixture that stores DataSet objects in memory.
+
+    >>> from fixture import InMemoryFixture
+
+    Keyword Arguments:
+
+    ``store``
+        The :class:`InMemoryStore` to keep objects in, a new one by default.
+
+    ``env``
+        An optional dict or module that contains classes to instantiate for
+        each DataSet, looked up as with any other :class:`EnvLoadableFixture <fixture.loadable.loadable.EnvLoadableFixture>`.
+        Without an ``env``, rows are stored as :class:`Record` objects in a
+        table named after the storable name that the style guesses, i.e.
+        ``'Author'`` for ``AuthorData``.
+
+    ``style``
+        A :class:`Style <fixture.style.Style>` object to translate names with,
+        :class:`NamedDataStyle <fixture.style.NamedDataStyle>` by default.
+
+    ``dataclass``, ``medium``, ``batch_size``, ``teardown``
+        See :class:`LoadableFixture <fixture.loadable.loadable.LoadableFixture>`
+
+    """
+    Medium = InMemoryMedium
+    style = NamedDataStyle()
+
+    def __init__(self, store=None, **kw):
+        EnvLoadableFixture.__init__(self, **kw)
+        if store is None:
+            store = InMemoryStore()
+        self.store = store
+
+    def attach_storage_medium(self, ds):
+        """Attach a storage medium, which is just the storable name when
+        there is no ``env``.
+        """
+        if (self.env is None and ds.meta.storage_medium is None
+                                        and ds.meta.storable is None):
+            if not ds.meta.storable_name:
+                ds.meta.storable_name = self.style.guess_storable_name(
+                                                        ds.__class__.__name__)
+            ds.meta.storage_medium = self.Medium(ds.meta.storable_name, ds)
+            return
+        EnvLoadableFixture.attach_storage_medium(self, ds)
+
+    def begin(self, unloading=False):
+        EnvLoadableFixture.begin(self, unloading=unloading)
+        if not unloading:
+            self.store.begin()
+
+    def commit(self):
+        self.store.commit()
+
+    def rollback(self):
+        """Remove the objects stored so far"""
+        self.store.rollback()
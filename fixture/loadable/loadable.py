@@ -10,8 +10,12 @@ import sys, types
 from fixture.base import Fixture
 from fixture.util import ObjRegistry, _mklog
 from fixture.style import OriginalStyle
-from fixture.dataset import Ref, dataset_registry, DataRow, is_rowlike
-from fixture.exc import UninitializedError, LoadError, UnloadError, StorageMediaNotFound
+from fixture.dataset import (
+    Ref, dataset_registry, DataRow, ColumnarRow, StreamedObjectStore, 
+    is_rowlike, row_references)
+from fixture.exc import (
+    UninitializedError, LoadError, UnloadError, StorageMediaNotFound, 
+    CircularReferenceError)
 import logging
 
 log = _mklog("fixture.loadable")
@@ -20,6 +24,10 @@ treelog = _mklog("fixture.loadable.tree")
 class StorageMediumAdapter(object):
     """common interface for working with storable objects.
     """
+    # the batch_size of the loader, for subclasses that save many rows at 
+    # once to keep in visit_loader() :
+    batch_size = None
+
     def __init__(self, medium, dataset):
         self.medium = medium
         self.dataset = dataset
@@ -37,11 +45,13 @@ class StorageMediumAdapter(object):
         """
         raise NotImplementedError
 
-    def clearall(self):
-        """Must clear all stored objects.
+    def clear_many(self, objs):
+        """Clear all of these stored objects.
+        
+        By default this calls :meth:`clear` for each object.  Subclasses can 
+        override it to clear many objects in fewer round trips.
         """
-        log.info("CLEARING stored objects for %s", self.dataset)
-        for obj in self.dataset.meta._stored_objects:
+        for obj in objs:
             try:
                 self.clear(obj)
             except Exception, e:
@@ -49,6 +59,46 @@ class StorageMediumAdapter(object):
                 raise UnloadError(etype, val, self.dataset,
                                      stored_object=obj), None, tb
 
+    def clearall(self):
+        """Must clear all stored objects.
+        
+        The objects of a :class:`StreamingDataSet <fixture.dataset.StreamingDataSet>` 
+        are found with :meth:`find_many` and cleared a chunk at a time.
+        """
+        log.info("CLEARING stored objects for %s", self.dataset)
+        stored = self.dataset.meta._stored_objects
+        try:
+            if isinstance(stored, StreamedObjectStore):
+                for objs in stored.chunks(self.dataset.meta.chunk_size):
+                    self.clear_many(objs)
+            else:
+                self.clear_many(list(stored))
+        except UnloadError:
+            raise
+        except Exception, e:
+            etype, val, tb = sys.exc_info()
+            raise UnloadError(etype, val, self.dataset), None, tb
+
+    def find_many(self, keys):
+        """Must return the stored objects having these primary keys, in order.
+        
+        keys is a list of primary keys as returned by :meth:`primary_key`.  
+        This is only needed for :class:`DBLoadableFixture` in 
+        ``cache_loads`` mode.
+        """
+        raise NotImplementedError(
+            "%s cannot find stored objects of %s" % (
+                                    self.__class__.__name__, self.medium))
+
+    def primary_key(self, obj):
+        """Must return the primary key of a stored object as a list of values.
+        
+        See :meth:`find_many`
+        """
+        raise NotImplementedError(
+            "%s cannot tell the primary key of %s objects" % (
+                                    self.__class__.__name__, self.medium))
+
     def save(self, row, column_vals):
         """Given a DataRow, must save it somehow.
         
@@ -56,6 +106,43 @@ class StorageMediumAdapter(object):
         """
         raise NotImplementedError
 
+    def can_save_many(self):
+        """True if the loader should collect rows into batches for 
+        :meth:`save_many` instead of saving each one with :meth:`save` as 
+        soon as it is read.
+        
+        Batching is opt-in.  By default this is only True if a subclass 
+        overrides :meth:`save_many` and either keeps a ``batch_size`` that 
+        the loader was given in :meth:`visit_loader` or stores a 
+        :class:`StreamingDataSet <fixture.dataset.StreamingDataSet>`.  It 
+        is asked after :meth:`visit_loader`.
+        """
+        if (type(self).save_many.im_func is 
+                                StorageMediumAdapter.save_many.im_func):
+            return False
+        return bool(self.batch_size or 
+                    getattr(self.dataset.meta, 'chunk_size', None))
+
+    def save_many(self, rows):
+        """Save a list of (row, column_vals) pairs and return a list of stored objects.
+        
+        The stored objects must be returned in the same order as the rows.  
+        By default this calls :meth:`save` for each row.  Subclasses can 
+        override it to save many rows in fewer round trips, see 
+        :meth:`can_save_many`.
+        """
+        return [self.save(row, column_vals) for row, column_vals in rows]
+
+    def truncate(self):
+        """Must remove everything stored in the medium, not just the 
+        objects stored for this dataset.
+        
+        This is used instead of :meth:`clearall` when the dataset's 
+        teardown strategy is ``'truncate'``.
+        """
+        raise NotImplementedError(
+            "%s cannot truncate %s" % (self.__class__.__name__, self.medium))
+
     def visit_loader(self, loader):
         """A chance to visit the LoadableFixture object.
         
@@ -136,6 +223,234 @@ class LoadQueue(ObjRegistry):
 
             treelog.info("%s. %s", level, verbose_obj)
 
+class LoadPlan(object):
+    """The order in which to load DataSet objects and all datasets they reference.
+    
+    The reference graph is walked once, without recursion, and each DataSet 
+    class is visited only once no matter how many paths lead to it.  
+    Iterating over a plan yields (dataset, level) pairs in load order; 
+    referenced datasets always come before the datasets that reference them.
+    
+    The level of a dataset is the length of the longest chain of references 
+    leading to it, starting at 1 for the datasets passed in.  This is the 
+    same level that :class:`LoadQueue` would end up with after a recursive 
+    walk, so datasets are unloaded in the same order.
+    
+    A :class:`CircularReferenceError <fixture.exc.CircularReferenceError>` 
+    is raised if datasets reference each other in a cycle.
+    
+    A plan can be used again for new instances of the same DataSet classes 
+    by calling :meth:`bind`.  It then also remembers the storage medium of 
+    each DataSet class and the columns of each row.
+    """
+    def __init__(self, datasets, default_refclass=None):
+        self.default_refclass = default_refclass
+        # (DataSet class, level) in load order :
+        self.steps = []
+        self.instances = {}
+        # DataSet class -> (StorageMediumAdapter class, storable) :
+        self.storables = {}
+        # (DataSet class, row key) -> column names :
+        self.columns = {}
+        # DataSet class -> DataSet classes it references :
+        self.references = {}
+        # DataSet class -> True if its rows refer to each other :
+        self.self_references = {}
+        self._compile(datasets)
+
+    def __iter__(self):
+        # since children come first, creating the shared instances 
+        # in this order never recurses :
+        for ds_class, level in self.steps:
+            yield (self._instance(ds_class), level)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return "<%s at %s %s>" % (
+                self.__class__.__name__, hex(id(self)), 
+                [(c.__name__, level) for c, level in self.steps])
+
+    def bind(self, datasets):
+        """Use these new instances of the planned DataSet classes.
+        
+        Instances of referenced DataSet classes are created (or looked up) 
+        as the plan is iterated over.
+        """
+        self.instances = {}
+        for ds in datasets:
+            self.instances.setdefault(type(ds), ds)
+
+    def release(self):
+        """Forget all DataSet instances but keep everything else."""
+        self.instances = {}
+
+    def attach_storage_medium(self, loader, ds):
+        """Attach the storage medium used the last time this plan was loaded.
+        
+        The first time around, the loader looks it up with 
+        :meth:`attach_storage_medium <LoadableFixture.attach_storage_medium>`
+        """
+        if ds.meta.storage_medium is not None:
+            return
+        ds_class = type(ds)
+        if ds_class in self.storables:
+            medium_class, storable = self.storables[ds_class]
+            ds.meta.storage_medium = medium_class(storable, ds)
+            return
+        loader.attach_storage_medium(ds)
+        medium = ds.meta.storage_medium
+        self.storables[ds_class] = (type(medium), medium.medium)
+
+    def row_columns(self, ds, key, row):
+        """Returns a tuple of the column names of this row.
+        
+        Only the columns of rows declared as classes are remembered.  Rows 
+        of a ColumnarDataSet share their columns and the rows of a 
+        StreamingDataSet are read anew each time, so keeping an entry for 
+        each of them would only grow the plan.
+        """
+        if not isinstance(row, (type, types.ClassType)):
+            return row.columns()
+        try:
+            return self.columns[(type(ds), key)]
+        except KeyError:
+            columns = self.columns[(type(ds), key)] = tuple(row.columns())
+            return columns
+
+    def refers_to_itself(self, ds):
+        """True if rows of this dataset refer to other rows of it.
+        
+        This is found out once for each DataSet class.  The rows of a 
+        StreamingDataSet aren't read in advance, so it is taken to refer 
+        to itself.
+        """
+        ds_class = type(ds)
+        if ds_class not in self.self_references:
+            if isinstance(ds.meta._stored_objects, StreamedObjectStore):
+                refers = True
+            else:
+                refers = False
+                for key, row in ds:
+                    if refers_to_dataset(row, ds):
+                        refers = True
+                        break
+            self.self_references[ds_class] = refers
+        return self.self_references[ds_class]
+
+    def content_hash(self):
+        """Returns a hex digest of the rows of all planned DataSet classes.
+        
+        The digest covers the name of each DataSet class, the keys of its 
+        rows and the value of each column, so it changes whenever a DataSet 
+        is edited.  References to other rows are hashed by name, not by 
+        what they resolve to.
+        """
+        import hashlib
+        digest = hashlib.md5()
+        for ds, level in self:
+            self._hash_rows(digest, ds)
+        return digest.hexdigest()
+
+    def dataset_hashes(self):
+        """Returns a dict of a hex digest for each planned DataSet class.
+        
+        The digest of a DataSet covers its own rows like :meth:`content_hash` 
+        does, and the digests of the DataSet classes it references, so it 
+        changes whenever anything it depends on is edited.
+        """
+        import hashlib
+        hashes = {}
+        # referenced datasets come first :
+        for ds, level in self:
+            ds_class = type(ds)
+            digest = hashlib.md5()
+            self._hash_rows(digest, ds)
+            referenced = [hashes[c] for c in self.references[ds_class]]
+            referenced.sort()
+            for ref_hash in referenced:
+                digest.update("  -> %s\n" % ref_hash)
+            hashes[ds_class] = digest.hexdigest()
+        return hashes
+
+    def _hash_rows(self, digest, ds):
+        ds_class = type(ds)
+        digest.update("%s.%s\n" % (ds_class.__module__, ds_class.__name__))
+        for key, row in ds:
+            if isinstance(row, DataRow) and not isinstance(row, ColumnarRow):
+                # read columns from the class, they are resolved 
+                # on a loaded row :
+                row = row.__class__
+            digest.update("  %s\n" % key)
+            for name in row.columns():
+                digest.update("    %s = %s\n" % (
+                            name, canonical_repr(declared_value(row, name))))
+
+    def _instance(self, ds_class):
+        if ds_class not in self.instances:
+            self.instances[ds_class] = ds_class.shared_instance(
+                                    default_refclass=self.default_refclass)
+        return self.instances[ds_class]
+
+    def _references(self, ds_class):
+        refs = []
+        for ref_class in self._instance(ds_class).meta.references:
+            if ref_class is ds_class or ref_class in refs:
+                continue
+            refs.append(ref_class)
+        return refs
+
+    def _compile(self, datasets):
+        visiting, done = 1, 2
+        state = {}
+        edges = self.references
+        order = []
+        for ds in datasets:
+            ds_class = type(ds)
+            self.instances.setdefault(ds_class, ds)
+            if ds_class in state:
+                continue
+            # depth first, children before parents, just like the 
+            # recursive walk that this replaces :
+            edges[ds_class] = self._references(ds_class)
+            state[ds_class] = visiting
+            stack = [(ds_class, iter(edges[ds_class]))]
+            while stack:
+                current, refs = stack[-1]
+                for ref_class in refs:
+                    ref_state = state.get(ref_class)
+                    if ref_state == done:
+                        continue
+                    elif ref_state == visiting:
+                        path = [c for c, r in stack]
+                        path = path[path.index(ref_class):] + [ref_class]
+                        raise CircularReferenceError(
+                            "DataSet classes reference each other in a "
+                            "cycle: %s" % " -> ".join(
+                                                [c.__name__ for c in path]))
+                    edges[ref_class] = self._references(ref_class)
+                    state[ref_class] = visiting
+                    stack.append((ref_class, iter(edges[ref_class])))
+                    break
+                else:
+                    stack.pop()
+                    state[current] = done
+                    order.append(current)
+
+        # parents come after children in order so walking it backwards 
+        # pushes each level down the graph exactly once :
+        levels = dict([(ds_class, 1) for ds_class in order])
+        for ds_class in reversed(order):
+            for ref_class in edges[ds_class]:
+                levels[ref_class] = max(levels[ref_class], 
+                                        levels[ds_class] + 1)
+
+        treelog.info("*** load order ***")
+        for ds_class in order:
+            treelog.info("%s. %s", levels[ds_class], ds_class.__name__)
+            self.steps.append((ds_class, levels[ds_class]))
+
 class LoadableFixture(Fixture):
     """
     knows how to load data into something useful.
@@ -154,23 +469,58 @@ class LoadableFixture(Fixture):
     medium
         optional LoadableFixture.StorageMediumAdapter to store DataSet 
         objects with
+    batch_size
+        the number of rows to hand to the storage medium's ``save_many()`` 
+        method at once.  Defaults to None, which saves one row at a time 
+        with ``save()`` unless the storage medium was told otherwise, like 
+        DjangoFixture's ``bulk`` mode which then hands over all rows of a 
+        dataset at once.  See :meth:`StorageMediumAdapter.can_save_many`
+    cache_plans
+        if True (the default) the :class:`LoadPlan` for a combination of 
+        DataSet classes is compiled once and used again every time the same 
+        classes are loaded, along with their storage media and row columns.  
+        Set this to False if DataSet classes or the storage media they map 
+        to change between loads.
+    teardown
+        how to unload datasets that don't declare ``teardown`` in their 
+        Meta class.  The default, ``'delete'``, deletes each stored object 
+        and ``'truncate'`` wipes each storage medium at once.  See 
+        :meth:`unload_dataset`
     
     """
     style = OriginalStyle()
     dataclass = Fixture.dataclass
+    batch_size = None
+    cache_plans = True
+    teardown = 'delete'
+    teardown_strategies = ('delete', 'truncate')
 
-    def __init__(self, style=None, medium=None, **kw):
+    def __init__(self, style=None, medium=None, batch_size=None, 
+                        cache_plans=None, teardown=None, **kw):
         Fixture.__init__(self, loader=self, **kw)
         if style:
             self.style = style
         if medium:
             self.Medium = medium
+        if batch_size:
+            self.batch_size = batch_size
+        if cache_plans is not None:
+            self.cache_plans = cache_plans
+        if teardown:
+            if teardown not in self.teardown_strategies:
+                raise ValueError(
+                    "teardown must be one of %s, not %r" % (
+                            ", ".join(self.teardown_strategies), teardown))
+            self.teardown = teardown
         self.loaded = None
+        # tuple of DataSet classes -> LoadPlan :
+        self.plans = {}
 
     StorageMediumAdapter = StorageMediumAdapter
     Medium = StorageMediumAdapter
     StorageMediaNotFound = StorageMediaNotFound
     LoadQueue = LoadQueue
+    LoadPlan = LoadPlan
 
     def attach_storage_medium(self, ds):
         """attach a :class:`StorageMediumAdapter` to DataSet"""
@@ -188,8 +538,9 @@ class LoadableFixture(Fixture):
     def load(self, data):
         """load data"""
         def loader():
-            for ds in data:
-                self.load_dataset(ds)
+            plan = self.plan([ds for ds in data])
+            for ds, level in plan:
+                self.load_planned_dataset(ds, level, plan=plan)
         self.wrap_in_transaction(loader, unloading=False)
 
     def load_dataset(self, ds, level=1):
@@ -202,19 +553,20 @@ class LoadableFixture(Fixture):
         objects unloaded
         
         """
-        is_parent = level == 1
-
-        levsep = is_parent and "/--------" or "|__.."
-        treelog.info(
-            "%s%s%s (%s)", level * '  ', levsep, ds.__class__.__name__,
-                                            (is_parent and "parent" or level))
+        plan = self.plan([ds])
+        for dataset, planned_level in plan:
+            self.load_planned_dataset(
+                            dataset, planned_level + level - 1, plan=plan)
 
-        for ref_ds in ds.meta.references:
-            r = ref_ds.shared_instance(default_refclass=self.dataclass)
-            new_level = level + 1
-            self.load_dataset(r, level=new_level)
-
-        self.attach_storage_medium(ds)
+    def load_planned_dataset(self, ds, level, plan=None):
+        """load the rows of this dataset at the level given by a :class:`LoadPlan`.
+        
+        All datasets that ds depends on must already be loaded.
+        """
+        if plan is None:
+            # an empty plan that doesn't remember anything for long :
+            plan = self.LoadPlan([], default_refclass=self.dataclass)
+        plan.attach_storage_medium(self, ds)
 
         if ds in self.loaded:
             # keep track of its order but don't actually load it...
@@ -223,14 +575,19 @@ class LoadableFixture(Fixture):
 
         log.info("LOADING rows in %s", ds)
         ds.meta.storage_medium.visit_loader(self)
+        if ds.meta.storage_medium.can_save_many():
+            self.load_rows_in_batches(ds, level, plan=plan)
+            ds.post_load()
+            return
         registered = False
         for key, row in ds:
             try:
-                self.resolve_row_references(ds, row)
+                columns = plan.row_columns(ds, key, row)
+                self.resolve_row_references(ds, row, columns=columns)
                 if not isinstance(row, DataRow):
                     row = row(ds)
                 def column_vals():
-                    for c in row.columns():
+                    for c in columns:
                         yield (c, self.resolve_stored_object(getattr(row, c)))
                 obj = ds.meta.storage_medium.save(row, column_vals())
                 ds.meta._stored_objects.store(key, obj)
@@ -246,8 +603,105 @@ class LoadableFixture(Fixture):
 
         ds.post_load()
 
-    def resolve_row_references(self, current_dataset, row):
+    def load_rows_in_batches(self, ds, level, plan=None):
+        """load the rows of this dataset in chunks of ``batch_size``.
+        
+        Each chunk is passed to the storage medium's ``save_many()`` as a 
+        list of (row, column_vals) pairs.  A row that references a row of 
+        the same dataset which is still in the pending chunk forces that 
+        chunk to be saved first so that the referenced object exists when 
+        it is resolved.  If 
+        ``batch_size`` is None, all rows are saved in one chunk, except for 
+        a :class:`StreamingDataSet <fixture.dataset.StreamingDataSet>`, which 
+        is saved in chunks of its ``Meta.chunk_size``.
+        """
+        if plan is None:
+            # an empty plan that doesn't remember anything for long :
+            plan = self.LoadPlan([], default_refclass=self.dataclass)
+        medium = ds.meta.storage_medium
+        batch_size = self.batch_size or getattr(ds.meta, 'chunk_size', None)
+        pending = []
+        class ns:
+            registered = False
+
+        def column_vals(row, columns):
+            for c in columns:
+                yield (c, self.resolve_stored_object(getattr(row, c)))
+
+        def save_pending():
+            if not pending:
+                return
+            try:
+                objects = medium.save_many(
+                            [(row, column_vals) for key, row, column_vals 
+                                                            in pending])
+            except Exception, e:
+                etype, val, tb = sys.exc_info()
+                raise LoadError(etype, val, ds, 
+                                key=[key for key, r, c in pending]), None, tb
+            for (key, row, column_vals), obj in zip(pending, objects):
+                ds.meta._stored_objects.store(key, obj)
+                # save the instance in place of the class...
+                ds._setdata(key, row)
+            if not ns.registered:
+                self.loaded.register(ds, level)
+                ns.registered = True
+            del pending[:]
+
+        for key, row in ds:
+            refs = pending and referenced_keys(row, ds)
+            if refs and refs.intersection([k for k, r, c in pending]):
+                # the referenced row must be stored before 
+                # it can be resolved :
+                save_pending()
+            try:
+                columns = plan.row_columns(ds, key, row)
+                self.resolve_row_references(ds, row, columns=columns)
+                if not isinstance(row, DataRow):
+                    row = row(ds)
+            except Exception, e:
+                etype, val, tb = sys.exc_info()
+                raise LoadError(etype, val, ds, key=key, row=row), None, tb
+            pending.append((key, row, column_vals(row, columns)))
+            if batch_size and len(pending) >= batch_size:
+                save_pending()
+        save_pending()
+
+    def content_hash(self, datasets):
+        """Returns a hex digest of the contents of these DataSet classes 
+        and of all the DataSet classes they reference.
+        
+        See :meth:`LoadPlan.content_hash`
+        """
+        plan = self.LoadPlan(
+                    [ds.shared_instance(default_refclass=self.dataclass) 
+                                                        for ds in datasets], 
+                    default_refclass=self.dataclass)
+        return plan.content_hash()
+
+    def plan(self, datasets):
+        """Returns a :class:`LoadPlan` for these DataSet instances.
+        
+        If ``cache_plans`` is True, a plan already compiled for the same 
+        DataSet classes is bound to these instances and returned instead.
+        """
+        if not self.cache_plans:
+            return self.LoadPlan(datasets, default_refclass=self.dataclass)
+        key = tuple([type(ds) for ds in datasets])
+        plan = self.plans.get(key)
+        if plan is None:
+            plan = self.LoadPlan(datasets, default_refclass=self.dataclass)
+            self.plans[key] = plan
+        else:
+            plan.bind(datasets)
+        return plan
+
+    def resolve_row_references(self, current_dataset, row, columns=None):
         """resolve this DataRow object's referenced values.
+        
+        Only the columns that :func:`row_references <fixture.dataset.row_references>` 
+        found in the row class are looked at.  columns is an optional sequence 
+        of the row's column names and is not needed for that anymore.
         """
         def resolved_rowlike(rowlike):
             key = rowlike.__name__
@@ -264,14 +718,22 @@ class LoadableFixture(Fixture):
                 # parent organization)
                 return candidate
 
-        for name in row.columns():
-            val = getattr(row, name)
-            if type(val) in (types.ListType, types.TupleType):
-                # i.e. categories = [python, ruby]
-                setattr(row, name, map(resolve_stored_object, val))
-            elif is_rowlike(val):
-                # i.e. category = python
-                setattr(row, name, resolved_rowlike(val))
+        if isinstance(row, DataRow):
+            row_class = row.__class__
+        else:
+            row_class = row
+        for name, kind in row_references(row_class):
+            val = declared_value(row, name)
+            # a row that was loaded before already has its 
+            # references resolved
+            if kind == 'rows':
+                if type(val) in (types.ListType, types.TupleType):
+                    # i.e. categories = [python, ruby]
+                    setattr(row, name, map(resolve_stored_object, val))
+            elif kind == 'row':
+                if is_rowlike(val):
+                    # i.e. category = python
+                    setattr(row, name, resolved_rowlike(val))
             elif isinstance(val, Ref.Value):
                 # i.e. category_id = python.id.
                 ref = val.ref
@@ -296,13 +758,41 @@ class LoadableFixture(Fixture):
         def unloader():
             for dataset in self.loaded.to_unload():
                 self.unload_dataset(dataset)
-            self.loaded.clear()
-            dataset_registry.clear()
+            self.forget_loaded()
         self.wrap_in_transaction(unloader, unloading=True)
 
+    def forget_loaded(self):
+        """forget all loaded datasets once their data is gone"""
+        self.loaded.clear()
+        dataset_registry.clear()
+        for plan in self.plans.values():
+            plan.release()
+
     def unload_dataset(self, dataset):
-        """unload data stored for this dataset"""
-        dataset.meta.storage_medium.clearall()
+        """unload data stored for this dataset
+        
+        The teardown strategy declared in the dataset's Meta class, or else 
+        the one of this fixture, decides whether each stored object is 
+        deleted with :meth:`StorageMediumAdapter.clearall` or the storage 
+        medium is wiped with :meth:`StorageMediumAdapter.truncate`.  
+        Datasets are unloaded in the order of :meth:`LoadQueue.to_unload` 
+        either way.
+        """
+        teardown = dataset.meta.teardown or self.teardown
+        if teardown == 'truncate':
+            medium = dataset.meta.storage_medium
+            log.info("TRUNCATING %s for %s", medium, dataset)
+            try:
+                medium.truncate()
+            except Exception, e:
+                etype, val, tb = sys.exc_info()
+                raise UnloadError(etype, val, dataset), None, tb
+        elif teardown == 'delete':
+            dataset.meta.storage_medium.clearall()
+        else:
+            raise ValueError(
+                "teardown of %s must be one of %s, not %r" % (
+                    dataset, ", ".join(self.teardown_strategies), teardown))
 
     def wrap_in_transaction(self, routine, unloading=False):
         """call routine in a load transaction"""
@@ -395,15 +885,65 @@ class DBLoadableFixture(EnvLoadableFixture):
     
     More specifically, one that forces its implementation to run atomically 
     (within a begin / commit / rollback block).
+    
+    Keyword Arguments:
+    
+    dsn
+        a connection string for the database
+    workers
+        if greater than 1, datasets that don't depend on each other are 
+        loaded in parallel by this many threads.  See :meth:`load_in_parallel`
+    transactional
+        if True, data is loaded once inside a savepoint and unloading rolls 
+        back to another savepoint opened right after each load, instead of 
+        deleting each stored object.  See :meth:`load_once`
+    cache_loads
+        if True, a content hash of each loaded DataSet is recorded in the 
+        database along with the primary keys of its rows.  When the same 
+        DataSets are loaded again, i.e. by the next setup or the next test 
+        run against a long-lived database, the rows of datasets that didn't 
+        change are looked up instead of inserted.  Unloading keeps the rows 
+        for that reason.  See :meth:`load_or_reuse`
+    
     """
-    def __init__(self, dsn=None, **kw):
+    workers = 1
+    transactional = False
+    cache_loads = False
+
+    def __init__(self, dsn=None, workers=None, transactional=None, 
+                        cache_loads=None, **kw):
         EnvLoadableFixture.__init__(self, **kw)
         self.dsn = dsn
+        if workers:
+            self.workers = workers
+        if transactional is not None:
+            self.transactional = transactional
+        if cache_loads is not None:
+            self.cache_loads = cache_loads
+        if self.transactional and self.workers > 1:
+            raise ValueError(
+                "data cannot be loaded by workers in transactional mode "
+                "since each worker commits on its own connection")
+        if self.cache_loads and (self.transactional or self.workers > 1):
+            raise ValueError(
+                "loads can only be cached when they are committed "
+                "by a single worker, not in transactional mode")
         self.transaction = None
+        self.savepoint = None
+        # (DataSet classes and content hash, savepoint, stored keys) of the 
+        # data kept loaded in transactional mode :
+        self.kept_load = None
 
     def begin(self, unloading=False):
-        """begin loading data"""
+        """begin loading data
+        
+        In transactional mode, a savepoint is created first that the load 
+        transaction takes place in, unless the data is already loaded.  
+        See :meth:`load_once`
+        """
         EnvLoadableFixture.begin(self, unloading=unloading)
+        if self.transactional and not unloading and self.kept_load is None:
+            self.savepoint = self.create_savepoint()
         self.transaction = self.create_transaction()
 
     def commit(self):
@@ -418,9 +958,424 @@ class DBLoadableFixture(EnvLoadableFixture):
         """
         raise NotImplementedError
 
+    def create_savepoint(self):
+        """must return a savepoint object that implements rollback()
+        
+        This is only called in transactional mode.  The savepoint stays 
+        open after the data is loaded and committed, so that anything 
+        stored while the data is in use can be discarded by 
+        :meth:`rollback_savepoint`.  Whatever encloses the savepoint (usually 
+        an outer transaction) must never be committed.
+        """
+        raise NotImplementedError(
+            "%s does not support transactional mode" % self.__class__.__name__)
+
+    def create_worker(self):
+        """Returns a copy of this fixture for loading datasets in a thread.
+        
+        Subclasses that support parallel loading must give the copy its 
+        own connection to the database, such that it can be passed to 
+        :meth:`create_transaction`.  The copy is released with 
+        :meth:`release_worker` when the thread is done.
+        """
+        raise NotImplementedError(
+            "%s cannot load datasets in parallel" % self.__class__.__name__)
+
+    def delete_load_markers(self, names):
+        """must forget the content hashes recorded for these DataSet names
+        
+        See :meth:`read_load_markers`
+        """
+        raise NotImplementedError(
+            "%s cannot cache loads" % self.__class__.__name__)
+
+    def discard_kept_load(self):
+        """roll back the data kept loaded in transactional mode, if any
+        
+        See :meth:`load_once`
+        """
+        self.rollback_savepoint()
+        kept, self.kept_load = self.kept_load, None
+        if kept is not None:
+            kept[1].rollback()
+
+    def load(self, data):
+        """load data, in parallel if there is more than one worker"""
+        if self.workers > 1:
+            self.load_in_parallel(data)
+        elif self.cache_loads:
+            self.wrap_in_transaction(
+                    lambda: self.load_or_reuse(data), unloading=False)
+        elif self.transactional:
+            self.load_once(data)
+        else:
+            EnvLoadableFixture.load(self, data)
+
+    def load_in_parallel(self, data):
+        """load data using up to ``workers`` threads at once.
+        
+        Datasets are loaded level by level, starting with the datasets that 
+        are referenced the most (see :class:`LoadPlan`).  Datasets at the 
+        same level cannot reference each other so they are handed out to 
+        the workers, each loading and committing a dataset in its own 
+        transaction.  All datasets of a level must be loaded before the next 
+        level is started.
+        
+        If any dataset fails to load then the data already committed is 
+        unloaded again before the error is raised, so that nothing is left 
+        behind.  This is not all-or-nothing: until then, other connections 
+        can see the datasets that were committed.  If the data cannot be 
+        unloaded, that error is raised instead and the load error is 
+        logged.
+        """
+        self.loaded = self.LoadQueue()
+        levels = {}
+        plan = self.plan([ds for ds in data])
+        for ds, level in plan:
+            levels.setdefault(level, []).append(ds)
+        level_nums = levels.keys()
+        level_nums.sort()
+        level_nums.reverse()
+        done = []
+        for level in level_nums:
+            loaded, failures = self.load_level(
+                                        levels[level], level, done, plan)
+            for ds in loaded:
+                self.loaded.register(ds, level)
+                done.append((ds, level))
+            if failures:
+                etype, val, tb = failures[0]
+                try:
+                    self.unload()
+                except:
+                    # data is left behind, which is worse than the failed 
+                    # load itself :
+                    log.error("could not unload data after this failed load", 
+                                                    exc_info=(etype, val, tb))
+                    raise
+                raise etype, val, tb
+
+    def load_level(self, datasets, level, done, plan):
+        """load datasets of the same level with up to ``workers`` threads.
+        
+        done is a list of (dataset, level) pairs that are already committed 
+        and plan is the :class:`LoadPlan` they all came from.  
+        Returns a list of the datasets that were committed and a list of 
+        sys.exc_info() tuples for each dataset that failed to load.
+        """
+        import threading, Queue
+        todo = Queue.Queue()
+        for ds in datasets:
+            todo.put(ds)
+        loaded = []
+        failures = []
+
+        def work():
+            try:
+                worker = self.create_worker()
+            except:
+                failures.append(sys.exc_info())
+                return
+            try:
+                worker.loaded = self.LoadQueue()
+                for ds, lvl in done:
+                    worker.loaded.register(ds, lvl)
+                while not failures:
+                    try:
+                        ds = todo.get_nowait()
+                    except Queue.Empty:
+                        break
+                    try:
+                        worker.transaction = worker.create_transaction()
+                        try:
+                            worker.load_planned_dataset(ds, level, plan=plan)
+                            worker.commit()
+                        except:
+                            worker.rollback()
+                            raise
+                    except:
+                        failures.append(sys.exc_info())
+                    else:
+                        loaded.append(ds)
+            finally:
+                self.release_worker(worker)
+
+        threads = [threading.Thread(target=work) 
+                            for i in range(min(self.workers, len(datasets)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return loaded, failures
+
+    def load_marker_name(self, ds):
+        """the name that the content hash of this DataSet is recorded by"""
+        ds_class = type(ds)
+        return "%s.%s" % (ds_class.__module__, ds_class.__name__)
+
+    def load_once(self, data):
+        """load data in transactional mode, unless it is still loaded
+        
+        Data is loaded in a savepoint that :meth:`unload` leaves alone.  Each 
+        load then opens another savepoint inside it, which unloading rolls 
+        back, so that only what was stored in the meantime is discarded.  
+        When the same DataSet classes are loaded again and their 
+        :meth:`content_hash <LoadableFixture.content_hash>` didn't change, 
+        the stored objects are found again by primary key with 
+        :meth:`reuse_planned_dataset` and nothing is inserted.  Loading other 
+        DataSets rolls back the data loaded before, like 
+        :meth:`discard_kept_load` does, and so does a load that fails.
+        """
+        datasets = [ds for ds in data]
+        plan = self.plan(datasets)
+        key = (tuple([type(ds) for ds in datasets]), plan.content_hash())
+        if self.kept_load is not None and self.kept_load[0] != key:
+            self.discard_kept_load()
+        if self.kept_load is None:
+            stored_keys = {}
+            def loader():
+                for ds, level in plan:
+                    self.load_planned_dataset(ds, level, plan=plan)
+                for ds, level in plan:
+                    medium = ds.meta.storage_medium
+                    stored = ds.meta._stored_objects
+                    stored_keys[type(ds)] = [
+                            (k, medium.primary_key(stored.get_object(k))) 
+                                                        for k, row in ds]
+        else:
+            stored_keys = self.kept_load[2]
+            def loader():
+                for ds, level in plan:
+                    self.reuse_planned_dataset(
+                            ds, level, stored_keys[type(ds)], plan=plan)
+        try:
+            self.wrap_in_transaction(loader, unloading=False)
+        except:
+            etype, val, tb = sys.exc_info()
+            # the rollback may have taken the kept savepoint with it :
+            self.discard_kept_load()
+            raise etype, val, tb
+        if self.kept_load is None:
+            self.kept_load = (key, self.savepoint, stored_keys)
+        self.savepoint = self.create_savepoint()
+
+    def load_or_reuse(self, data):
+        """load data, reusing rows stored by a previous load if nothing changed
+        
+        Each dataset is looked up in the markers written by 
+        :meth:`write_load_marker`.  If its content hash (see 
+        :meth:`LoadPlan.dataset_hashes`) matches, the stored objects are 
+        found again by primary key with the storage medium's ``find_many()`` 
+        and nothing is inserted.  Otherwise the rows stored by the previous 
+        load, if any, are deleted and the dataset is loaded as usual.  
+        Since a hash covers the referenced datasets, everything that 
+        depends on a changed dataset is loaded again as well.
+        
+        The stored rows must not have been changed since, this is not checked.
+        """
+        plan = self.plan([ds for ds in data])
+        hashes = plan.dataset_hashes()
+        names = {}
+        for ds, level in plan:
+            names[type(ds)] = self.load_marker_name(ds)
+        markers = self.read_load_markers(names.values())
+
+        stale = []
+        for ds, level in plan:
+            marker = markers.get(names[type(ds)])
+            if marker is not None and marker[0] != hashes[type(ds)]:
+                stale.append(ds)
+        # what references the stale rows has to be deleted first :
+        stale.reverse()
+        for ds in stale:
+            plan.attach_storage_medium(self, ds)
+            medium = ds.meta.storage_medium
+            medium.visit_loader(self)
+            log.info("DELETING rows of %s stored by a previous load", ds)
+            try:
+                medium.clear_many(medium.find_many(
+                            [pk for key, pk in markers[names[type(ds)]][1]]))
+            except UnloadError:
+                raise
+            except Exception, e:
+                etype, val, tb = sys.exc_info()
+                raise UnloadError(etype, val, ds), None, tb
+        if stale:
+            self.delete_load_markers([names[type(ds)] for ds in stale])
+
+        for ds, level in plan:
+            name = names[type(ds)]
+            marker = markers.get(name)
+            if marker is not None and marker[0] == hashes[type(ds)]:
+                self.reuse_planned_dataset(ds, level, marker[1], plan=plan)
+                continue
+            self.load_planned_dataset(ds, level, plan=plan)
+            medium = ds.meta.storage_medium
+            stored = ds.meta._stored_objects
+            self.write_load_marker(name, hashes[type(ds)], 
+                    [(key, medium.primary_key(stored.get_object(key))) 
+                                                        for key, row in ds])
+
+    def read_load_markers(self, names):
+        """must return the content hashes recorded for these DataSet names
+        
+        The return value is a dict of (content_hash, keys) for each name 
+        found, where keys is a list of (row key, primary key) pairs as they 
+        were passed to :meth:`write_load_marker`.  Primary keys are lists 
+        of values.  This is only called in ``cache_loads`` mode.
+        """
+        raise NotImplementedError(
+            "%s cannot cache loads" % self.__class__.__name__)
+
+    def release_worker(self, worker):
+        """called when a worker created by :meth:`create_worker` is done"""
+        pass
+
+    def reuse_planned_dataset(self, ds, level, keys, plan):
+        """use the rows of this dataset stored by a previous load
+        
+        keys is a list of (row key, primary key) pairs, see 
+        :meth:`load_or_reuse`
+        """
+        plan.attach_storage_medium(self, ds)
+        medium = ds.meta.storage_medium
+        medium.visit_loader(self)
+        log.info("REUSING rows in %s", ds)
+        try:
+            objects = medium.find_many([pk for key, pk in keys])
+        except Exception, e:
+            etype, val, tb = sys.exc_info()
+            raise LoadError(etype, val, ds, key=[k for k, pk in keys]), None, tb
+        found = dict(zip([k for k, pk in keys], objects))
+        for key, row in ds:
+            try:
+                columns = plan.row_columns(ds, key, row)
+                self.resolve_row_references(ds, row, columns=columns)
+                if not isinstance(row, DataRow):
+                    row = row(ds)
+                ds.meta._stored_objects.store(key, found[key])
+                # save the instance in place of the class...
+                ds._setdata(key, row)
+            except Exception, e:
+                etype, val, tb = sys.exc_info()
+                raise LoadError(etype, val, ds, key=key, row=row), None, tb
+        self.loaded.register(ds, level)
+        ds.post_load()
+
     def rollback(self):
-        """call transaction.rollback() on transaction returned by :meth:`DBLoadableFixture.create_transaction`"""
+        """call transaction.rollback() on transaction returned by :meth:`DBLoadableFixture.create_transaction`
+        
+        In transactional mode, this also rolls back the savepoint.
+        """
         self.transaction.rollback()
+        if self.transactional:
+            self.rollback_savepoint()
+
+    def rollback_savepoint(self):
+        """call savepoint.rollback() on savepoint returned by :meth:`DBLoadableFixture.create_savepoint`"""
+        savepoint, self.savepoint = self.savepoint, None
+        if savepoint is not None:
+            savepoint.rollback()
+
+    def unload(self):
+        """unload data
+        
+        In transactional mode, this rolls back to the savepoint opened after 
+        the data was loaded instead of deleting objects one by one, the data 
+        itself stays loaded, see :meth:`load_once`.  In ``cache_loads`` 
+        mode, the stored objects and their content hashes are kept so that 
+        the next load can reuse them, only the loaded datasets are 
+        forgotten.  A dataset's rows are deleted once its content hash 
+        changes, see :meth:`load_or_reuse`.
+        """
+        if self.transactional and self.loaded is not None:
+            try:
+                self.rollback_savepoint()
+            finally:
+                self.forget_loaded()
+        elif self.cache_loads and self.loaded is not None:
+            self.forget_loaded()
+        else:
+            EnvLoadableFixture.unload(self)
+
+    def unload_dataset(self, dataset):
+        """unload data stored for this dataset
+        
+        In ``cache_loads`` mode, its content hash is forgotten as well, 
+        though :meth:`unload` doesn't delete anything in that mode.
+        """
+        if self.workers > 1:
+            # it was stored by a worker that is gone now
+            dataset.meta.storage_medium.visit_loader(self)
+        EnvLoadableFixture.unload_dataset(self, dataset)
+        if self.cache_loads:
+            self.delete_load_markers([self.load_marker_name(dataset)])
+
+    def write_load_marker(self, name, content_hash, keys):
+        """must record the content hash of a loaded DataSet
+        
+        keys is a list of (row key, primary key) pairs for each of its rows.  
+        See :meth:`read_load_markers`
+        """
+        raise NotImplementedError(
+            "%s cannot cache loads" % self.__class__.__name__)
+
+def canonical_repr(value):
+    """A repr of a column value that stays the same from one process to 
+    the next, as far as the value's own repr does.
+    """
+    if type(value) in (types.ListType, types.TupleType):
+        return "[%s]" % ", ".join([canonical_repr(v) for v in value])
+    elif is_rowlike(value):
+        return "<row %s.%s>" % (value._dataset.__name__, value.__name__)
+    elif isinstance(value, Ref.Value):
+        return "<ref %s.%s.%s>" % (value.ref.dataset_class.__name__, 
+                                   value.ref.key, value.attr_name)
+    return repr(value)
+
+def declared_value(row, name):
+    """Returns the value of a column of row, except that a 
+    :class:`Ref.Value <fixture.dataset.RefValue>` is returned as is when 
+    row is a :class:`ColumnarRow <fixture.dataset.ColumnarRow>`.
+    """
+    if isinstance(row, ColumnarRow):
+        return row._declared(name)
+    return getattr(row, name)
+
+def refers_to_dataset(row, dataset):
+    """True if any column of row refers to another row of dataset.
+    
+    Columns are read from the row class so that :class:`Ref.Value <fixture.dataset.RefValue>` 
+    descriptors are not resolved.
+    """
+    return bool(referenced_keys(row, dataset))
+
+def referenced_keys(row, dataset):
+    """Returns the set of keys of the rows of dataset that row refers to.
+    
+    See :func:`refers_to_dataset`
+    """
+    keys = set()
+    if isinstance(row, DataRow):
+        row_class = row.__class__
+        if not isinstance(row, ColumnarRow):
+            row = row_class
+    else:
+        row_class = row
+    ds_class = type(dataset)
+    for name, kind in row_references(row_class):
+        val = declared_value(row, name)
+        if kind == 'rows':
+            candidates = val
+        else:
+            candidates = [val]
+        for candidate in candidates:
+            if is_rowlike(candidate) and candidate._dataset is ds_class:
+                keys.add(candidate.__name__)
+            elif (isinstance(candidate, Ref.Value) and 
+                            candidate.ref.dataset_class is ds_class):
+                keys.add(candidate.ref.key)
+    return keys
 
 class DeferredStoredObject(object):
     """A stored representation of a row in a DataSet, deferred.
@@ -7,13 +7,23 @@ See :ref:`Using LoadableFixture<using-loadable-fixture>` for examples.
 
 """
 
-import sys
+import os, sys, copy, weakref
 from fixture.loadable import DBLoadableFixture
 from fixture.exc import UninitializedError
 import logging
 
 log = logging.getLogger('fixture.loadable.sqlalchemy_loadable')
 
+json = None
+try:
+    # 2.6
+    import json
+except ImportError:
+    try:
+        import simplejson as json
+    except ImportError:
+        pass
+
 try:
     from sqlalchemy.orm import sessionmaker, scoped_session
 except ImportError:
@@ -100,20 +110,85 @@ class SQLAlchemyFixture(DBLoadableFixture):
         SQLAlchemy object so you should only set this if you know what you 
         doing.
     
+    ``workers``
+        The number of threads to load datasets with.  When greater than 1, 
+        datasets that don't reference each other are loaded in parallel, 
+        each worker using its own connection from the ``engine``'s pool 
+        and its own session.  An engine is required for this.  See 
+        :meth:`DBLoadableFixture.load_in_parallel <fixture.loadable.loadable.DBLoadableFixture.load_in_parallel>`
+    
+    ``hydration``
+        When the columns of rows inserted into Table objects in batches, 
+        i.e. with a ``batch_size``, are fetched, all rows of a dataset in 
+        one go.  ``'lazy'`` (the default) waits 
+        until a column of any of the rows is read and ``'eager'`` fetches 
+        them right after they are inserted.  See :class:`TableRowHydrator`
+    
+    ``transactional``
+        If True, data is loaded once in a SAVEPOINT within an outer 
+        transaction on the fixture's connection.  Each setup opens another 
+        SAVEPOINT that teardown rolls back to instead of deleting rows, so 
+        the next setup of the same DataSets inserts nothing.  The outer 
+        transaction is never committed so the Application Under Test must 
+        use the same ``connection`` to see the data.  An engine or 
+        connection is required for this.  See 
+        :meth:`DBLoadableFixture.load_once <fixture.loadable.loadable.DBLoadableFixture.load_once>`
+    
+    ``cache_loads``
+        If True, the content hash of each loaded DataSet and the primary 
+        keys of its rows are kept in a table named by ``load_marker_table``, 
+        which is created when needed.  DataSets that didn't change since they 
+        were loaded, i.e. by the previous setup or test run, are not inserted 
+        again and teardown leaves their rows in place.  Needs the json or 
+        simplejson module.  See 
+        :meth:`DBLoadableFixture.load_or_reuse <fixture.loadable.loadable.DBLoadableFixture.load_or_reuse>`
+    
+    ``replay``
+        If True, the INSERT statements of the first load of a combination of 
+        DataSet classes are captured in a :class:`LoadScript` and every 
+        later load of the same classes executes that script instead.  
+        Only DataSets stored in Table objects can be replayed and an engine 
+        or connection is required.  Rows without a primary key are only 
+        replayable if they were inserted in batches, i.e. with a 
+        ``batch_size``, which gives them one up front.  See 
+        :meth:`load_or_replay`
+    
     """
     Medium = staticmethod(negotiated_medium)
+    hydration = 'lazy'
+    load_marker_table = 'fixture_load_marker'
+    replay = False
 
-    def __init__(self, engine=None, connection=None, session=None, scoped_session=None, **kw):
+    def __init__(self, engine=None, connection=None, session=None, scoped_session=None, 
+                        hydration=None, replay=None, **kw):
         # ensure import error by simulating what would happen in the global module :
         from sqlalchemy.orm import sessionmaker, scoped_session as sa_scoped_session
 
         DBLoadableFixture.__init__(self, **kw)
+        if hydration:
+            if hydration not in ('lazy', 'eager'):
+                raise ValueError(
+                    "hydration must be 'lazy' or 'eager', not %r" % hydration)
+            self.hydration = hydration
+        if replay is not None:
+            self.replay = replay
+        if self.replay and (self.cache_loads or self.workers > 1):
+            raise ValueError(
+                "loads cannot be replayed by workers or in cache_loads mode")
         self.engine = engine
         self.connection = connection
         self.session = session
         if scoped_session is None:
             scoped_session = Session
         self.Session = scoped_session
+        self.outer_transaction = None
+        # (DataSet classes, content hash) -> SQLiteSnapshot
+        self.snapshots = {}
+        self.load_markers = None
+        # tuple of DataSet classes -> LoadScript
+        self.load_scripts = {}
+        # the LoadScript being captured, if any :
+        self.load_script = None
 
     def begin(self, unloading=False):
         """Begin loading data
@@ -154,6 +229,120 @@ class SQLAlchemyFixture(DBLoadableFixture):
         log.debug("transaction.commit() <- %s", self.transaction)
         DBLoadableFixture.commit(self)
 
+    def create_savepoint(self):
+        """Begins a nested transaction (a SAVEPOINT) on the connection
+        
+        The first time around, an outer transaction is begun on the 
+        connection.  It is rolled back by :meth:`dispose`.
+        
+        .. note:: the pysqlite driver interferes with SAVEPOINT statements 
+           unless its own transaction handling is turned off with 
+           ``create_engine(dsn, connect_args={'isolation_level': None})``
+        
+        """
+        if self.connection is None:
+            raise ValueError(
+                "%s needs an engine or connection in transactional mode" % (
+                                                    self.__class__.__name__))
+        if (self.outer_transaction is None or 
+                                    not self.outer_transaction.is_active):
+            log.debug("connection.begin() <- outer transaction")
+            self.outer_transaction = self.connection.begin()
+        log.debug("connection.begin_nested()")
+        return self.connection.begin_nested()
+
+    def create_worker(self):
+        """Returns a copy of this fixture with its own connection and session.
+        
+        The connection is checked out of the engine's pool.  Objects are not 
+        expired when the session commits since they are used after the 
+        worker is gone, to resolve references and to unload them.
+        """
+        engine = self.engine
+        if engine is None and self.session is not None:
+            engine = self.session.bind
+        if engine is None or not hasattr(engine, 'pool'):
+            raise ValueError(
+                "%s needs an engine to load data with %s workers (got %r)" % (
+                            self.__class__.__name__, self.workers, engine))
+        worker = copy.copy(self)
+        worker.engine = engine
+        worker.connection = engine.connect()
+        if sa_major < 0.5:
+            make_session = sessionmaker(autoflush=False, transactional=True)
+        else:
+            make_session = sessionmaker(autoflush=False, autocommit=False, 
+                                        expire_on_commit=False)
+        worker.session = make_session(bind=worker.connection)
+        worker.transaction = None
+        return worker
+
+    def load(self, data):
+        """Load data, replaying the statements of a previous load if possible"""
+        if self.replay:
+            self.wrap_in_transaction(
+                    lambda: self.load_or_replay(data), unloading=False)
+        else:
+            DBLoadableFixture.load(self, data)
+
+    def load_or_replay(self, data):
+        """Execute the :class:`LoadScript` captured by a previous load of 
+        these DataSet classes, or load them and capture one
+        
+        When a script is replayed, each stored object is a 
+        :class:`LoadedTableRow` made from the captured primary key, like 
+        :meth:`DBLoadableFixture.reuse_planned_dataset <fixture.loadable.loadable.DBLoadableFixture.reuse_planned_dataset>` 
+        does.  A script is only kept if all datasets were stored in Table 
+        objects by INSERT statements that included their primary key.  
+        Replaying expects the database to be in the same state as when the 
+        script was captured, usually empty.
+        """
+        datasets = [ds for ds in data]
+        plan = self.plan(datasets)
+        classes = tuple([type(ds) for ds in datasets])
+        script = self.load_scripts.get(classes)
+        if script is not None:
+            log.info("REPLAYING %s", script)
+            script.replay(self.connection)
+            for ds, level in plan:
+                self.reuse_planned_dataset(
+                            ds, level, script.keys[type(ds)], plan=plan)
+            return
+
+        script = LoadScript()
+        if self.connection is None:
+            # statements can't be captured without one :
+            script.replayable = False
+        self.load_script = script
+        try:
+            for ds, level in plan:
+                self.load_planned_dataset(ds, level, plan=plan)
+        finally:
+            self.load_script = None
+        for ds, level in plan:
+            medium = ds.meta.storage_medium
+            if not isinstance(medium, TableMedium):
+                script.replayable = False
+            if not script.replayable:
+                break
+            stored = ds.meta._stored_objects
+            script.keys[type(ds)] = [
+                    (key, medium.primary_key(stored.get_object(key))) 
+                                                        for key, row in ds]
+        if script.replayable:
+            self.load_scripts[classes] = script
+
+    def load_in_parallel(self, data):
+        """Load data with workers, see :meth:`create_worker`"""
+        # lazily clean up after a previous setup/teardown like begin() does :
+        Session.remove()
+        DBLoadableFixture.load_in_parallel(self, data)
+
+    def release_worker(self, worker):
+        """Closes the worker's session and returns its connection to the pool"""
+        worker.session.close()
+        worker.connection.close()
+
     def create_transaction(self):
         """Create a session transaction or a connection transaction
         
@@ -169,6 +358,13 @@ class SQLAlchemyFixture(DBLoadableFixture):
         log.debug("create_transaction() <- %s", transaction)
         return transaction
 
+    def delete_load_markers(self, names):
+        """Deletes the rows of these DataSet names from the load marker table"""
+        if not names:
+            return
+        markers, bind = self._load_markers()
+        bind.execute(markers.delete(markers.c.dataset.in_(list(names))))
+
     def dispose(self):
         """Dispose of this fixture instance entirely
         
@@ -182,6 +378,10 @@ class SQLAlchemyFixture(DBLoadableFixture):
         """
         from fixture.dataset import dataset_registry
         dataset_registry.clear()
+        self.snapshots.clear()
+        self.kept_load = None
+        if self.outer_transaction:
+            self.outer_transaction.rollback()
         if self.connection:
             self.connection.close()
         if self.session:
@@ -191,10 +391,114 @@ class SQLAlchemyFixture(DBLoadableFixture):
         if self.engine:
             self.engine.dispose()
 
+    def snapshot(self, *datasets, **kw):
+        """Load these DataSet classes once and return a :class:`SQLiteSnapshot` 
+        of the database to restore before each test.
+        
+        Snapshots are kept by DataSet classes and by the 
+        :meth:`content hash <fixture.loadable.loadable.LoadableFixture.content_hash>` 
+        of their rows, so the data is loaded again if any DataSet changed.  
+        The data is loaded on top of whatever the database contains, which 
+        should usually be nothing.  For example::
+            
+            snapshot = db.snapshot(CategoryData, ProductData)
+            
+            class TestProducts(unittest.TestCase):
+                def setUp(self):
+                    self.data = snapshot.restore()
+        
+        The data stays loaded until :meth:`dispose` is called.
+        
+        Keyword Arguments:
+        
+        ``template``
+            The path of a SQLite file to keep the snapshot in instead of 
+            keeping its rows in memory.
+        
+        """
+        template = kw.pop('template', None)
+        if kw:
+            raise TypeError("unexpected keyword arguments: %s" % kw.keys())
+        self._snapshot_bind()
+        key = (datasets, self.content_hash(datasets))
+        snapshot = self.snapshots.get(key)
+        if snapshot is None:
+            data = self.data(*datasets)
+            data.setup()
+            # setup() may have connected the engine :
+            snapshot = SQLiteSnapshot(self._snapshot_bind(), template=template, 
+                                      data=data, session=self.session)
+            snapshot.take()
+            self.snapshots[key] = snapshot
+        return snapshot
+
+    def _snapshot_bind(self):
+        bind = self.connection or self.engine
+        if bind is None and self.session is not None:
+            bind = self.session.bind
+        if bind is None:
+            raise ValueError(
+                "snapshots need an engine or a connection to a SQLite database")
+        if bind.dialect.name != 'sqlite':
+            raise ValueError(
+                "snapshots only work with SQLite, not %s" % bind.dialect.name)
+        return bind
+
+    def _load_markers(self):
+        """Returns the load marker table, creating it if it doesn't exist, 
+        and the connection to use it with
+        """
+        from sqlalchemy import MetaData, Table, Column, String, Text
+        assert json, (
+            "You must have the simplejson or json module installed to "
+            "cache loads.  Neither could be imported")
+        if self.connection is not None:
+            bind = self.connection
+        else:
+            bind = self.session.connection()
+        if self.load_markers is None:
+            markers = Table(self.load_marker_table, MetaData(),
+                Column('dataset', String(255), primary_key=True),
+                Column('content_hash', String(32), nullable=False),
+                Column('stored_keys', Text, nullable=False))
+            markers.create(bind=bind, checkfirst=True)
+            self.load_markers = markers
+        return self.load_markers, bind
+
+    def read_load_markers(self, names):
+        """Selects the rows of these DataSet names from the load marker table"""
+        markers, bind = self._load_markers()
+        found = {}
+        if not names:
+            return found
+        for row in bind.execute(markers.select(
+                            markers.c.dataset.in_(list(names)))).fetchall():
+            found[row['dataset']] = (row['content_hash'], 
+                                     json.loads(row['stored_keys']))
+        return found
+
     def rollback(self):
         """Rollback load transaction"""
         DBLoadableFixture.rollback(self)
 
+    def rollback_savepoint(self):
+        """Rollback to the savepoint and remove all objects from the session"""
+        DBLoadableFixture.rollback_savepoint(self)
+        if self.session is not None:
+            if hasattr(self.session, 'expunge_all'):
+                self.session.expunge_all()
+            else:
+                # sqlalchemy < 0.5
+                self.session.clear()
+
+    def write_load_marker(self, name, content_hash, keys):
+        """Inserts a row for this DataSet name into the load marker table"""
+        markers, bind = self._load_markers()
+        bind.execute(markers.insert(), {
+                        'dataset': name, 'content_hash': content_hash, 
+                        'stored_keys': json.dumps([[key, list(pk)] 
+                                                        for key, pk in keys])})
+
 ## this was used in an if branch of clear() ... but I think this is no longer necessary with scoped sessions
 ## does it need to exist for 0.4 ?  not sure
 # def object_was_deleted(session, obj):
@@ -220,6 +524,11 @@ class MappedClassMedium(DBLoadableFixture.StorageMediumAdapter):
     .. _Elixir: http://elixir.ematia.de/
     
     """
+    # bound parameters per DELETE statement, SQLite allows no more than 999
+    delete_chunk_size = 900
+    # bound parameters per SELECT statement of find_many()
+    find_chunk_size = 900
+
     def __init__(self, *a, **kw):
         DBLoadableFixture.StorageMediumAdapter.__init__(self, *a, **kw)
 
@@ -232,12 +541,102 @@ class MappedClassMedium(DBLoadableFixture.StorageMediumAdapter):
         if has_identity(obj):
             self.session.delete(obj)
 
+    def clear_many(self, objs):
+        """Deletes all stored objects with as few ``DELETE ... WHERE pk IN (...)`` 
+        statements as possible
+        
+        The ORM has to delete each object itself with :meth:`clear` if the 
+        class is mapped with inheritance or with relations that cascade 
+        deletes or use a secondary table, or if an object was never 
+        persisted.  Note that unlike session.delete(), this won't set 
+        foreign keys of related child objects to NULL.  Those are expected 
+        to have been unloaded first.
+        """
+        from sqlalchemy.orm import object_mapper
+        from sqlalchemy.orm.util import has_identity
+        if not objs:
+            return
+        mapper = object_mapper(objs[0])
+        if not can_bulk_delete(mapper):
+            return DBLoadableFixture.StorageMediumAdapter.clear_many(
+                                                                self, objs)
+        keys = []
+        for obj in objs:
+            if object_mapper(obj) is not mapper or not has_identity(obj):
+                return DBLoadableFixture.StorageMediumAdapter.clear_many(
+                                                                self, objs)
+            keys.append(mapper.primary_key_from_instance(obj))
+        # deletes still pending in the session have to come first :
+        self.session.flush()
+        bind = self.session.get_bind(mapper)
+        for stmt in bulk_delete_statements(
+                        mapper.local_table, mapper.primary_key, keys,
+                        chunk_size=self.delete_chunk_size,
+                        tuple_in=supports_tuple_in(bind.dialect.name)):
+            self.session.execute(stmt, mapper=mapper)
+        for obj in objs:
+            if obj in self.session:
+                self.session.expunge(obj)
+
+    def find_many(self, keys):
+        """Queries the objects having these primary keys with as few 
+        ``SELECT ... WHERE pk IN (...)`` statements as possible
+        """
+        from sqlalchemy.orm import class_mapper
+        mapper = class_mapper(self.medium)
+        bind = self.session.get_bind(mapper)
+        query = self.session.query(self.medium)
+        found = {}
+        for where in primary_key_clauses(
+                        mapper.primary_key, keys, 
+                        chunk_size=self.find_chunk_size,
+                        tuple_in=supports_tuple_in(bind.dialect.name)):
+            for obj in query.filter(where):
+                found[tuple(mapper.primary_key_from_instance(obj))] = obj
+        objects = []
+        for key in keys:
+            try:
+                objects.append(found[tuple(key)])
+            except KeyError:
+                raise LookupError(
+                    "%s with primary key %s does not exist" % (
+                                                self.medium.__name__, key))
+        return objects
+
+    def primary_key(self, obj):
+        """Returns the primary key of this object, flushing it if necessary"""
+        from sqlalchemy.orm import object_mapper
+        from sqlalchemy.orm.util import has_identity
+        if not has_identity(obj):
+            self.session.flush()
+        return list(object_mapper(obj).primary_key_from_instance(obj))
+
+    def truncate(self):
+        """Wipes the mapped table, see :func:`truncate_statements`
+        
+        This is not supported for classes mapped with inheritance.
+        """
+        from sqlalchemy.orm import object_mapper
+        stored = list(self.dataset.meta._stored_objects)
+        if not stored:
+            return
+        mapper = object_mapper(stored[0])
+        if not can_bulk_delete(mapper):
+            return DBLoadableFixture.StorageMediumAdapter.truncate(self)
+        self.session.flush()
+        bind = self.session.get_bind(mapper)
+        for stmt in truncate_statements(mapper.local_table, bind.dialect):
+            self.session.execute(stmt, mapper=mapper)
+        for obj in stored:
+            if obj in self.session:
+                self.session.expunge(obj)
+
     def visit_loader(self, loader):
         """Visits the :class:`SQLAlchemyFixture` loader and stores a reference to its session"""
         self.session = loader.session
+        self.batch_size = loader.batch_size
 
-    def save(self, row, column_vals):
-        """Save a new object to the session if it doesn't already exist in the session."""
+    def _build(self, column_vals):
         column_vals = dict(column_vals)
         try:
             obj = self.medium(**column_vals)
@@ -245,7 +644,11 @@ class MappedClassMedium(DBLoadableFixture.StorageMediumAdapter):
              obj = self.medium()
              for c, val in column_vals.iteritems():
                  setattr(obj, c, val)
+        return obj
 
+    def save(self, row, column_vals):
+        """Save a new object to the session if it doesn't already exist in the session."""
+        obj = self._build(column_vals)
         if obj not in self.session.new:
             if hasattr(self.session, 'add'):
                 # sqlalchemy 0.5.2+
@@ -254,16 +657,130 @@ class MappedClassMedium(DBLoadableFixture.StorageMediumAdapter):
                 self.session.save(obj)
         return obj
 
+    def save_many(self, rows):
+        """Save new objects for all rows to the session with a single ``add_all()``"""
+        if not hasattr(self.session, 'add_all'):
+            return DBLoadableFixture.StorageMediumAdapter.save_many(self, rows)
+        objects = [self._build(column_vals) for row, column_vals in rows]
+        self.session.add_all([obj for obj in objects 
+                                    if obj not in self.session.new])
+        return objects
+
+
+def usable_connection(conn):
+    """Returns conn or, if it was closed, its engine"""
+    if conn is not None and conn.closed:
+        # i.e. the connection of a worker that is gone now
+        return conn.engine
+    return conn
+
+class LoadScript(object):
+    """The INSERT statements of a load, as they were sent to the DB-API.
+    
+    Each statement is kept as compiled SQL with its processed parameters, 
+    and consecutive runs of the same statement are merged so that 
+    :meth:`replay` needs one ``executemany()`` per run.  Values that 
+    Python-side column defaults came up with are replayed as they were.
+    """
+    def __init__(self):
+        # [(sql, [parameters, ...])] in the order executed :
+        self.statements = []
+        # DataSet class -> [(row key, primary key)] :
+        self.keys = {}
+        self.replayable = True
+
+    def __repr__(self):
+        return "<%s at %s with %s statements>" % (
+                self.__class__.__name__, hex(id(self)), len(self.statements))
+
+    def add(self, sql, parameters):
+        """Add a statement and a list of DB-API parameters to execute it with"""
+        if self.statements and self.statements[-1][0] == sql:
+            self.statements[-1][1].extend(parameters)
+        else:
+            self.statements.append((sql, list(parameters)))
+
+    def replay(self, connection):
+        """Execute all statements on the DB-API connection of this connection"""
+        cursor = connection.connection.cursor()
+        try:
+            for sql, parameters in self.statements:
+                cursor.executemany(sql, parameters)
+        finally:
+            cursor.close()
+
+class TableRowHydrator(object):
+    """Fetches the rows of many :class:`LoadedTableRow` objects at once.
+    
+    All loaded rows of a table that were added to the hydrator and have not 
+    been fetched yet are selected by primary key in as few statements as 
+    possible.  Rows are only weakly referenced so that the ones nobody 
+    keeps, like those of a :class:`StreamingDataSet <fixture.dataset.StreamingDataSet>`, 
+    can be freed.
+    """
+    # bound parameters per SELECT statement, SQLite allows no more than 999
+    chunk_size = 900
+
+    def __init__(self, table, conn):
+        self.table = table
+        self.conn = conn
+        self.pending = []
+        # when to drop the rows that are gone from pending :
+        self.purge_at = self.chunk_size
+
+    def add(self, loaded_row):
+        """Fetch this :class:`LoadedTableRow` the next time around"""
+        self.pending.append(weakref.ref(loaded_row))
+        if len(self.pending) >= self.purge_at:
+            self.pending = [ref for ref in self.pending if ref() is not None]
+            self.purge_at = max(self.chunk_size, len(self.pending) * 2)
+
+    def hydrate(self):
+        """Fetch all pending rows"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        conn = usable_connection(self.conn)
+        if conn is not None:
+            bind = conn
+        else:
+            bind = self.table.bind
+        key_columns = [k for k in self.table.primary_key]
+        by_key = {}
+        for ref in pending:
+            loaded_row = ref()
+            if loaded_row is not None:
+                by_key[tuple(loaded_row.inserted_key)] = loaded_row
+        if not by_key:
+            return
+        for where in primary_key_clauses(
+                        key_columns, by_key.keys(), chunk_size=self.chunk_size,
+                        tuple_in=supports_tuple_in(
+                                        bind is not None and bind.dialect.name)):
+            stmt = self.table.select(where)
+            if conn is not None:
+                c = conn.execute(stmt)
+            else:
+                c = stmt.execute()
+            for row in c.fetchall():
+                key = tuple([row[k] for k in key_columns])
+                if key in by_key:
+                    by_key[key].row = row
+        # anything that didn't match (i.e. a key of another type) is 
+        # fetched by itself when accessed.
 
 class LoadedTableRow(object):
-    def __init__(self, table, inserted_key, conn):
+    def __init__(self, table, inserted_key, conn, hydrator=None):
         self.table = table
         self.conn = conn
         self.inserted_key = [k for k in inserted_key]
         self.row = None
+        self.hydrator = hydrator
 
     def __getattr__(self, col):
-        if not self.row:
+        if self.row is None and self.hydrator is not None:
+            self.hydrator.hydrate()
+        if self.row is None:
             if len(self.inserted_key) > 1:
                 raise NotImplementedError(
                     "%s does not support making a select statement with a "
@@ -274,6 +791,7 @@ class LoadedTableRow(object):
             first_pk = [k for k in self.table.primary_key][0]
             id = getattr(self.table.c, first_pk.key)
             stmt = self.table.select(id == self.inserted_key[0])
+            self.conn = usable_connection(self.conn)
             if self.conn:
                 c = self.conn.execute(stmt)
             else:
@@ -295,9 +813,15 @@ class TableMedium(DBLoadableFixture.StorageMediumAdapter):
     
     """
 
+    # bound parameters per DELETE statement, SQLite allows no more than 999
+    delete_chunk_size = 900
+    hydration = 'lazy'
+
     def __init__(self, *a, **kw):
         DBLoadableFixture.StorageMediumAdapter.__init__(self, *a, **kw)
         self.conn = None
+        self.hydrator = None
+        self.script = None
 
     def clear(self, obj):
         """Constructs a delete statement per each primary key and 
@@ -313,6 +837,47 @@ class TableMedium(DBLoadableFixture.StorageMediumAdapter):
                 c = stmt.execute()
             i += 1
 
+    def clear_many(self, objs):
+        """Deletes all stored rows with as few ``DELETE ... WHERE pk IN (...)`` 
+        statements as possible
+        
+        See :func:`bulk_delete_statements`
+        """
+        if not objs:
+            return
+        table_keys = [k for k in self.medium.primary_key]
+        for stmt in bulk_delete_statements(
+                        self.medium, table_keys, 
+                        [obj.inserted_key for obj in objs],
+                        chunk_size=self.delete_chunk_size,
+                        tuple_in=supports_tuple_in(self._dialect_name())):
+            self._execute(stmt, {})
+
+    def find_many(self, keys):
+        """Returns a :class:`LoadedTableRow` for each primary key
+        
+        Nothing is selected until a column of any of them is read, see 
+        :class:`TableRowHydrator`
+        """
+        self._check_table()
+        return [self._loaded_row(list(key)) for key in keys]
+
+    def primary_key(self, obj):
+        """Returns the inserted primary key of this :class:`LoadedTableRow`"""
+        return list(obj.inserted_key)
+
+    def truncate(self):
+        """Wipes the table, see :func:`truncate_statements`"""
+        self._check_table()
+        if self.conn:
+            dialect = self.conn.dialect
+        elif self.medium.bind is not None:
+            dialect = self.medium.bind.dialect
+        else:
+            dialect = None
+        for stmt in truncate_statements(self.medium, dialect):
+            self._execute(stmt, {})
+
     def visit_loader(self, loader):
         """Visits the :class:`SQLAlchemyFixture` loader and stores a reference 
         to its connection if there is one.
@@ -321,22 +886,139 @@ class TableMedium(DBLoadableFixture.StorageMediumAdapter):
             self.conn = loader.connection
         else:
             self.conn = None
+        self.hydration = getattr(loader, 'hydration', self.hydration)
+        self.script = getattr(loader, 'load_script', None)
+        self.batch_size = loader.batch_size
 
-    def save(self, row, column_vals):
-        """Constructs an insert statement with the given values and 
-        executes it either explicitly or implicitly
-        """
+    def _check_table(self):
         from sqlalchemy.schema import Table
         if not isinstance(self.medium, Table):
             raise ValueError(
                 "medium %s must be a Table instance" % self.medium)
 
-        stmt = self.medium.insert()
-        params = dict(list(column_vals))
+    def _execute(self, stmt, params):
+        if self.conn:
+            result = self.conn.execute(stmt, params)
+        else:
+            result = stmt.execute(params)
+        if self.script is not None:
+            self._capture(stmt, params, result)
+        return result
+
+    def _capture(self, stmt, params, result):
+        from sqlalchemy.sql.expression import Insert
+        if not isinstance(stmt, Insert):
+            return
+        if isinstance(params, dict):
+            params = [params]
+        key_names = [k.key for k in self.medium.primary_key]
+        for p in params:
+            for name in key_names:
+                if p.get(name, None) is None:
+                    # the database chooses the key, maybe not the same one 
+                    # next time :
+                    self.script.replayable = False
+        if getattr(stmt, '_returning', None):
+            self.script.replayable = False
+        if self.script.replayable:
+            self.script.add(result.context.statement, 
+                            result.context.parameters)
+
+    def _dialect(self):
         if self.conn:
-            c = self.conn.execute(stmt, params)
+            bind = self.conn
         else:
-            c = stmt.execute(params)
+            bind = self.medium.bind
+        if bind is None:
+            return None
+        return bind.dialect
+
+    def _dialect_name(self):
+        dialect = self._dialect()
+        return dialect and dialect.name
+
+    def _loaded_row(self, primary_key, row=None):
+        if self.hydrator is None:
+            self.hydrator = TableRowHydrator(self.medium, self.conn)
+        loaded_row = LoadedTableRow(self.medium, primary_key, self.conn, 
+                                    hydrator=self.hydrator)
+        if row is None:
+            self.hydrator.add(loaded_row)
+        else:
+            loaded_row.row = row
+        return loaded_row
+
+    def allocate_primary_keys(self, count, reserved=()):
+        """Returns a list of count new primary key values or None.
+        
+        This only works for a single, auto-incrementing integer column.  
+        On SQLite the values follow the highest stored (or reserved) key and, 
+        for an AUTOINCREMENT table, the highest key it ever handed out as 
+        kept in ``sqlite_sequence``.  On PostgreSQL they are fetched from the 
+        column's sequence, which is either the explicit ``Sequence`` of the 
+        column or the one ``pg_get_serial_sequence()`` finds for it.  In any 
+        other case None is returned and rows without a primary key are 
+        inserted one at a time.
+        """
+        from sqlalchemy import select, func, text, Integer, Sequence
+        table_keys = [k for k in self.medium.primary_key]
+        if len(table_keys) != 1:
+            return None
+        pk = table_keys[0]
+        if not pk.autoincrement or not isinstance(pk.type, Integer):
+            return None
+        dialect = self._dialect()
+        dialect_name = dialect and dialect.name
+        if dialect_name == 'sqlite':
+            c = self._execute(select([func.max(pk)]), {})
+            last = max([c.scalar() or 0] + list(reserved))
+            c = self._execute(text(
+                    "SELECT name FROM sqlite_master "
+                    "WHERE type = 'table' AND name = 'sqlite_sequence'", 
+                    bind=self.medium.bind), {})
+            if c.fetchall():
+                c = self._execute(text(
+                        "SELECT seq FROM sqlite_sequence WHERE name = :name", 
+                        bind=self.medium.bind), {'name': self.medium.name})
+                last = max([last] + [r[0] for r in c.fetchall()])
+            return range(last + 1, last + 1 + count)
+        elif dialect_name == 'postgresql' or dialect_name == 'postgres':
+            preparer = dialect.identifier_preparer
+            if isinstance(pk.default, Sequence):
+                seq_name = preparer.format_sequence(pk.default)
+            else:
+                c = self._execute(select([func.pg_get_serial_sequence(
+                                        preparer.format_table(self.medium), 
+                                        pk.name)]), {})
+                seq_name = c.scalar()
+                if seq_name is None:
+                    # not a serial column, don't guess :
+                    return None
+            stmt = select([func.nextval(seq_name)]).select_from(
+                                            func.generate_series(1, count))
+            return [r[0] for r in self._execute(stmt, {}).fetchall()]
+        return None
+
+    def save(self, row, column_vals):
+        """Constructs an insert statement with the given values and 
+        executes it either explicitly or implicitly
+        
+        If the database supports ``RETURNING`` then the whole inserted 
+        row, including server defaults, is returned by the insert statement.  
+        :meth:`save_many` only does so for the rows it passes on to this.
+        """
+        self._check_table()
+        stmt = self.medium.insert()
+        params = dict(list(column_vals))
+        dialect = self._dialect()
+        if (getattr(dialect, 'implicit_returning', False) and 
+                                            hasattr(stmt, 'returning')):
+            stmt = stmt.returning(*[c for c in self.medium.c])
+            inserted = self._execute(stmt, params).fetchone()
+            return self._loaded_row(
+                    [inserted[k] for k in self.medium.primary_key], 
+                    row=inserted)
+        c = self._execute(stmt, params)
         primary_key = c.inserted_primary_key
         if primary_key is None:
             raise NotImplementedError(
@@ -348,7 +1030,277 @@ class TableMedium(DBLoadableFixture.StorageMediumAdapter):
                 "expected primary_key %s, got %s (using table %s)" % (
                                 table_keys, inserted_keys, self.medium))
 
-        return LoadedTableRow(self.medium, primary_key, self.conn)
+        return self._loaded_row(primary_key)
+
+    def save_many(self, rows):
+        """Inserts a batch of (row, column_vals) pairs using executemany
+        
+        Consecutive rows that have the same columns and a complete primary key 
+        are sent in a single executemany call.  Rows lacking a primary key are 
+        given one from :meth:`allocate_primary_keys` when possible, 
+        otherwise they are inserted one at a time by :meth:`save`.  
+        Returns a :class:`LoadedTableRow` for each row, in order.
+        
+        The inserted rows are fetched all at once by a :class:`TableRowHydrator`, 
+        either right away if the fixture's ``hydration`` is ``'eager'`` or 
+        when a column of any of them is first read.
+        
+        .. note:: ``RETURNING`` is only used for rows inserted by :meth:`save`.  
+           It can't be combined with executemany, so server defaults of the 
+           other rows are read by the hydrator's SELECT instead.
+        
+        """
+        self._check_table()
+        stmt = self.medium.insert()
+        key_names = [k.key for k in self.medium.primary_key]
+        all_params = [dict(column_vals) for row, column_vals in rows]
+
+        def has_primary_key(params):
+            for name in key_names:
+                if params.get(name, None) is None:
+                    return False
+            return True
+
+        missing = [p for p in all_params if not has_primary_key(p)]
+        if missing:
+            declared = [p[key_names[0]] for p in all_params 
+                                            if has_primary_key(p)]
+            new_keys = self.allocate_primary_keys(len(missing), 
+                                                  reserved=declared)
+            if new_keys is not None:
+                for params, new_key in zip(missing, new_keys):
+                    params[key_names[0]] = new_key
+
+        stored = []
+        run = []
+        def insert_run():
+            if not run:
+                return
+            self._execute(stmt, run)
+            for params in run:
+                stored.append(self._loaded_row([params[n] for n in key_names]))
+            del run[:]
+
+        for (row, column_vals), params in zip(rows, all_params):
+            if not has_primary_key(params):
+                insert_run()
+                stored.append(self.save(row, params.items()))
+                continue
+            if run and sorted(run[0].keys()) != sorted(params.keys()):
+                insert_run()
+            run.append(params)
+        insert_run()
+        if self.hydration == 'eager' and self.hydrator is not None:
+            self.hydrator.hydrate()
+        return stored
+
+class SQLiteSnapshot(object):
+    """The rows of every table in a SQLite database, to put back later.
+    
+    :meth:`take` copies the rows of all tables and :meth:`restore` empties 
+    those tables and copies the rows back, along with the AUTOINCREMENT 
+    counters.  Tables created after the snapshot was taken are left alone.  
+    If ``template`` is the path of a file, the rows are copied into that 
+    SQLite database with ATTACH DATABASE, otherwise they are kept in memory.
+    
+    .. note:: The ``sqlite3`` module of Python 2 has no backup API, so the 
+       rows are copied with SQL.
+    
+    """
+    schema = 'fixture_snapshot'
+
+    def __init__(self, bind, template=None, data=None, session=None):
+        self.bind = bind
+        self.template = template
+        # the FixtureData object of the loaded datasets, if any :
+        self.data = data
+        self.session = session
+        # [(table name, column names, rows)] when kept in memory :
+        self.tables = None
+        self.table_names = None
+
+    def __repr__(self):
+        return "<%s at %s of %s tables in %s>" % (
+                self.__class__.__name__, hex(id(self)), 
+                self.table_names and len(self.table_names), 
+                self.template or 'memory')
+
+    def _connect(self):
+        if is_connection(self.bind):
+            # a connection of the fixture, which stays open :
+            return self.bind, False
+        return self.bind.connect(), True
+
+    def _list_tables(self, conn):
+        names = [r[0] for r in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table' "
+                    "AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()]
+        if conn.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                        "AND name='sqlite_sequence'").fetchall():
+            names.append('sqlite_sequence')
+        return names
+
+    def _attach(self, conn):
+        conn.execute("ATTACH DATABASE ? AS %s" % self.schema, (self.template,))
+
+    def _detach(self, conn):
+        conn.execute("DETACH DATABASE %s" % self.schema)
+
+    def take(self):
+        """Copy the rows of every table"""
+        conn, close = self._connect()
+        try:
+            self.table_names = self._list_tables(conn)
+            if self.template:
+                if os.path.exists(self.template):
+                    os.unlink(self.template)
+                self._attach(conn)
+                try:
+                    for name in self.table_names:
+                        conn.execute("CREATE TABLE %s.%s AS SELECT * FROM main.%s" % (
+                                    self.schema, quote(name), quote(name)))
+                finally:
+                    self._detach(conn)
+            else:
+                self.tables = []
+                for name in self.table_names:
+                    c = conn.execute("SELECT * FROM %s" % quote(name))
+                    self.tables.append((name, c.keys(), 
+                                        [tuple(r) for r in c.fetchall()]))
+        finally:
+            if close:
+                conn.close()
+
+    def restore(self):
+        """Put back the rows of every table and return the loaded data"""
+        conn, close = self._connect()
+        try:
+            if self.template:
+                self._attach(conn)
+            try:
+                trans = conn.begin()
+                try:
+                    for name in self.table_names:
+                        conn.execute("DELETE FROM main.%s" % quote(name))
+                    if self.template:
+                        for name in self.table_names:
+                            conn.execute(
+                                "INSERT INTO main.%s SELECT * FROM %s.%s" % (
+                                    quote(name), self.schema, quote(name)))
+                    else:
+                        for name, columns, rows in self.tables:
+                            if not rows:
+                                continue
+                            conn.execute("INSERT INTO main.%s (%s) VALUES (%s)" % (
+                                    quote(name), 
+                                    ", ".join([quote(c) for c in columns]), 
+                                    ", ".join(["?" for c in columns])), rows)
+                except:
+                    trans.rollback()
+                    raise
+                else:
+                    trans.commit()
+            finally:
+                if self.template:
+                    self._detach(conn)
+        finally:
+            if close:
+                conn.close()
+        if self.session is not None:
+            # objects in the session may have been changed since :
+            self.session.expire_all()
+        return self.data
+
+def is_connection(bind):
+    """True if this bind is a connection rather than an engine"""
+    from sqlalchemy.engine.base import Connection
+    return isinstance(bind, Connection)
+
+def quote(name):
+    """Quote a SQLite identifier"""
+    return '"%s"' % name.replace('"', '""')
+
+def bulk_delete_statements(table, key_columns, keys, chunk_size=900, 
+                                                        tuple_in=False):
+    """Yields DELETE statements that remove rows of table by primary key.
+    
+    key_columns are the primary key columns and keys is a list of primary 
+    key values, each a sequence with one value per column.  Each statement 
+    binds no more than chunk_size parameters.  A single column key is 
+    matched with ``IN``, a composite key with a tuple ``IN`` if tuple_in is 
+    True and with an ``OR`` of each key otherwise.
+    """
+    for where in primary_key_clauses(key_columns, keys, 
+                                chunk_size=chunk_size, tuple_in=tuple_in):
+        yield table.delete(where)
+
+def primary_key_clauses(key_columns, keys, chunk_size=900, tuple_in=False):
+    """Yields where clauses that match rows by primary key.
+    
+    See :func:`bulk_delete_statements`
+    """
+    from sqlalchemy import and_, or_
+    key_columns = [c for c in key_columns]
+    keys = [k for k in keys]
+    per_clause = max(1, chunk_size // len(key_columns))
+    for start in range(0, len(keys), per_clause):
+        chunk = keys[start:start + per_clause]
+        if len(key_columns) == 1:
+            yield key_columns[0].in_([k[0] for k in chunk])
+        elif tuple_in:
+            from sqlalchemy import tuple_
+            yield tuple_(*key_columns).in_(
+                                    [tuple_(*[v for v in k]) for k in chunk])
+        else:
+            yield or_(*[and_(*[c == v for c, v in zip(key_columns, k)]) 
+                                                            for k in chunk])
+
+def truncate_statements(table, dialect):
+    """Yields statements that remove all rows of table.
+    
+    On PostgreSQL this is a single ``TRUNCATE``.  Since that fails for 
+    tables referenced by a foreign key, even if the referencing rows are 
+    gone, only truncate tables that nothing else points to.  Everywhere 
+    else this is a ``DELETE`` without a where clause, which on SQLite is 
+    followed by resetting the ``sqlite_autoincrement`` counter if the table 
+    has one.  TRUNCATE is not used on MySQL since it commits the current 
+    transaction.
+    """
+    from sqlalchemy import text, bindparam
+    name = dialect and dialect.name
+    if name in ('postgresql', 'postgres'):
+        yield text("TRUNCATE TABLE %s" % (
+                            dialect.identifier_preparer.format_table(table)))
+    else:
+        yield table.delete()
+        if name == 'sqlite' and table.kwargs.get('sqlite_autoincrement'):
+            yield text("DELETE FROM sqlite_sequence WHERE name = :name", 
+                            bindparams=[bindparam('name', table.name)])
+
+def supports_tuple_in(dialect_name):
+    """True if the dialect can compare tuples like ``(a, b) IN ((1, 2))``"""
+    import sqlalchemy
+    return (hasattr(sqlalchemy, 'tuple_') and 
+            dialect_name in ('postgresql', 'postgres', 'mysql'))
+
+def can_bulk_delete(mapper):
+    """True if objects of this mapper can be deleted without the ORM.
+    
+    This is not the case with inheritance, if the mapped table is not a 
+    Table or if a relation cascades deletes or uses a secondary table.
+    """
+    from sqlalchemy.schema import Table
+    if mapper.inherits is not None or mapper.polymorphic_on is not None:
+        return False
+    if not isinstance(mapper.local_table, Table):
+        return False
+    for prop in mapper.iterate_properties:
+        if not hasattr(prop, 'direction'):
+            # not a relation
+            continue
+        if prop.secondary is not None or prop.cascade.delete:
+            return False
+    return True
 
 def is_assigned_mapper(obj):
     import sqlalchemy
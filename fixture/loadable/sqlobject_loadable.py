@@ -14,25 +14,227 @@ class SQLObjectMedium(DBLoadableFixture.StorageMediumAdapter):
     Adapter for storing data using `SQLObject`_ classes
     """
     def clear(self, obj):
-        """Delete this object from the DB"""
+        """Delete this object from the DB
+        
+        In ``bulk`` mode the object is fetched again in the unload 
+        transaction, since the load transaction was closed.
+        """
+        conn = self.transaction
+        if self.bulk and conn is not None and obj._connection is not conn:
+            obj = self.medium.get(obj.id, connection=conn)
         obj.destroySelf()
+
+    def clear_many(self, objs):
+        """Delete all of these objects from the DB with one query for every 
+        ``delete_chunk_size`` objects
         
-    def save(self, row, column_vals):
-        """Save this row to the DB"""
+        This falls back to destroying each object when the class has joins 
+        or dependent classes that ``destroySelf()`` needs to take care of.
+        """
+        from sqlobject import sqlbuilder
+        from sqlobject.joins import SORelatedJoin
+        if not objs:
+            return
+        klass = self.medium
+        needs_destroy = (klass._SO_depends() or 
+                    [j for j in klass.sqlmeta.joins 
+                                    if isinstance(j, SORelatedJoin)])
+        if needs_destroy:
+            return DBLoadableFixture.StorageMediumAdapter.clear_many(
+                                                                self, objs)
+        conn = self.transaction
+        if conn is None:
+            conn = objs[0]._connection
+        ids = [obj.id for obj in objs]
+        for start in range(0, len(ids), self.delete_chunk_size):
+            klass.deleteMany(
+                sqlbuilder.IN(getattr(klass.q, klass.sqlmeta.idName), 
+                              ids[start:start + self.delete_chunk_size]),
+                connection=conn)
+        for obj in objs:
+            obj.sqlmeta._obsolete = True
+            conn.cache.expire(obj.id, klass)
+        
+    # rows per INSERT statement, older SQLite can't take more than 500
+    insert_chunk_size = 500
+    # ids per DELETE statement, SQLite allows no more than 999 parameters
+    delete_chunk_size = 900
+    bulk = False
+
+    def _python_values(self, row, column_vals):
         from sqlobject.styles import getStyle
         so_style = getStyle(self.medium)
 
         if hasattr(row, 'connection'):
             raise ValueError(
                     "cannot name a key 'connection' in row %s" % row)
-        dbvals = dict([(so_style.dbColumnToPythonAttr(k), v) 
+        return dict([(so_style.dbColumnToPythonAttr(k), v) 
                                                     for k,v in column_vals])
+        
+    def save(self, row, column_vals):
+        """Save this row to the DB"""
+        dbvals = self._python_values(row, column_vals)
         dbvals['connection'] = self.transaction
         return self.medium(**dbvals)
+
+    def can_save_many(self):
+        """True in bulk mode, unless the class has a parent class.
+        
+        See :meth:`save_many`
+        """
+        return self.bulk and not self.medium.sqlmeta.parentClass
+
+    def save_many(self, rows):
+        """Save a list of (row, column_vals) pairs to the DB
+        
+        Unless the loader is in bulk mode each row is saved with :meth:`save`.  
+        In bulk mode rows are inserted with multi-row INSERT statements and 
+        the new objects are then selected all at once by id.  Ids that 
+        aren't given are allocated by :meth:`allocate_ids` beforehand.  
+        Rows that only plain columns and foreign keys can't describe, 
+        classes with a parent class and connections that ids can't be 
+        allocated for fall back to :meth:`save`.  
+        
+        .. note:: No RowCreatedSignal is sent for objects inserted in bulk.
+        
+        """
+        from sqlobject import sqlbuilder
+        klass = self.medium
+        default_save_many = DBLoadableFixture.StorageMediumAdapter.save_many
+        if not self.bulk or klass.sqlmeta.parentClass:
+            return default_save_many(self, rows)
+        conn = self.transaction
+        state = InsertState(conn)
+        idName = klass.sqlmeta.idName
+        inserts = []
+        for row, column_vals in rows:
+            values = self._insert_values(self._python_values(row, column_vals), 
+                                         state)
+            if values is None:
+                return default_save_many(self, rows)
+            inserts.append(values)
+        
+        missing = [values for values in inserts if 'id' not in values]
+        if missing:
+            ids = self.allocate_ids(len(missing), 
+                            reserved=[values['id'] for values in inserts 
+                                                    if 'id' in values])
+            if ids is None:
+                return default_save_many(self, rows)
+            for values, id in zip(missing, ids):
+                values['id'] = id
+        
+        # one statement for each chunk of rows that set the same columns :
+        groups = {}
+        for values in inserts:
+            groups.setdefault(tuple(sorted(values.keys())), []).append(values)
+        for names, group in groups.items():
+            template = [n == 'id' and idName or klass.sqlmeta.columns[n].dbName 
+                                                            for n in names]
+            for start in range(0, len(group), self.insert_chunk_size):
+                chunk = group[start:start + self.insert_chunk_size]
+                conn.query(conn.sqlrepr(sqlbuilder.Insert(
+                                klass.sqlmeta.table, 
+                                valueList=[[v[n] for n in names] for v in chunk], 
+                                template=template)))
+        
+        ids = [values['id'] for values in inserts]
+        objs = {}
+        for start in range(0, len(ids), self.insert_chunk_size):
+            chunk = ids[start:start + self.insert_chunk_size]
+            for obj in klass.select(sqlbuilder.IN(getattr(klass.q, 'id'), chunk), 
+                                    connection=conn):
+                objs[obj.id] = obj
+        return [objs[id] for id in ids]
+
+    def _insert_values(self, dbvals, state):
+        """Returns {column name: database value} to insert for these 
+        keyword arguments, or None if they can't be inserted directly.
+        """
+        from sqlobject.sqlbuilder import NoDefault
+        klass = self.medium
+        sqlmeta = klass.sqlmeta
+        foreign_names = dict([(c.foreignName, c) for c in sqlmeta.columnList 
+                                                    if c.foreignKey])
+        values = {}
+        for name, value in dbvals.items():
+            if name == 'id':
+                values['id'] = value
+                continue
+            if name in foreign_names:
+                # i.e. category=<Category 1> for categoryID
+                column = foreign_names[name]
+                name = column.name
+                if value is not None and not isinstance(value, (int, long)):
+                    value = value.id
+            if not name in sqlmeta._plainSetters:
+                # a join or a custom setter
+                return None
+            from_python = getattr(klass, '_SO_from_python_%s' % name, None)
+            if from_python:
+                value = from_python(value, state)
+            values[name] = value
+        for column in sqlmeta.columnList:
+            if column.name in values:
+                continue
+            default = column.default
+            if default is NoDefault:
+                if column.defaultSQL is None:
+                    raise TypeError(
+                            "%s() did not get expected keyword argument '%s'" % (
+                                                klass.__name__, column.name))
+                # leave it to the database
+                continue
+            from_python = getattr(klass, '_SO_from_python_%s' % column.name, None)
+            if from_python:
+                default = from_python(default, state)
+            values[column.name] = default
+        return values
+
+    def allocate_ids(self, count, reserved=()):
+        """Returns a list of count new integer ids or None.
+        
+        On SQLite the next values after the highest stored (or reserved) id 
+        are used, which is what SQLite would do itself, and on PostgreSQL the 
+        values are fetched from the id sequence.  For anything else None is 
+        returned.
+        """
+        klass = self.medium
+        sqlmeta = klass.sqlmeta
+        if getattr(sqlmeta, 'idType', int) not in (int, long):
+            return None
+        conn = self.transaction
+        dbName = getattr(conn, 'dbName', None)
+        if dbName is None:
+            # a Transaction :
+            dbName = conn._dbConnection.dbName
+        if dbName == 'sqlite':
+            last = conn.queryOne("SELECT MAX(%s) FROM %s" % (
+                                            sqlmeta.idName, sqlmeta.table))[0]
+            last = max([last or 0] + list(reserved))
+            return range(last + 1, last + 1 + count)
+        elif dbName == 'postgres':
+            seq_name = getattr(sqlmeta, 'idSequence', None) or \
+                            "%s_%s_seq" % (sqlmeta.table, sqlmeta.idName)
+            return [r[0] for r in conn.queryAll(
+                        "SELECT nextval(%s) FROM generate_series(1, %d)" % (
+                                        conn.sqlrepr(seq_name), count))]
+        return None
     
     def visit_loader(self, loader):
         """Visit the loader and store a reference to the transaction connection"""
         self.transaction = loader.transaction
+        self.bulk = getattr(loader, 'bulk', self.bulk)
+
+class InsertState(object):
+    """Stands in for the SQLObjectState that column validators are given, 
+    before there is an object to insert.
+    """
+    protocol = 'sql'
+
+    def __init__(self, connection):
+        self.soObject = self
+        self._connection = connection
 
 class SQLObjectFixture(DBLoadableFixture):
     """
@@ -70,14 +272,23 @@ class SQLObjectFixture(DBLoadableFixture):
         True if the connection can be closed, helpful for releasing connections.  
         If you are passing in a connection object this will be False by default.
     
+    ``bulk``
+        If True, the rows of each dataset are inserted with multi-row INSERT 
+        statements instead of instantiating each object.  Use ``batch_size`` 
+        to limit how many rows go into one batch.  
+        See :meth:`SQLObjectMedium.save_many`
+    
     """
+    bulk = False
             
     def __init__(self,  connection=None, use_transaction=True, 
-                        close_conn=False, **kw ):
+                        close_conn=False, bulk=None, **kw ):
         DBLoadableFixture.__init__(self, **kw)
         self.connection = connection
         self.close_conn = close_conn
         self.use_transaction = use_transaction
+        if bulk is not None:
+            self.bulk = bulk
     
     SQLObjectMedium = SQLObjectMedium
     Medium = SQLObjectMedium
@@ -94,9 +305,23 @@ class SQLObjectFixture(DBLoadableFixture):
             return self.connection
     
     def commit(self):
-        """Commit transaction"""
-        if self.use_transaction:
+        """Commit transaction
+        
+        In ``bulk`` mode the transaction is closed as well, otherwise it 
+        would roll back whatever is going on in its connection by then when 
+        it is garbage collected.  Objects stored in it are handed over to 
+        the connection so that they can still be changed.
+        """
+        if self.use_transaction and not self.bulk:
             DBLoadableFixture.commit(self)
+        elif self.use_transaction:
+            transaction = self.transaction
+            transaction.commit(close=True)
+            if self.loaded is not None:
+                for ds in self.loaded.registry.values():
+                    for obj in ds.meta._stored_objects:
+                        if getattr(obj, '_connection', None) is transaction:
+                            obj._connection = self.connection
     
     def then_finally(self, unloading=False):
         """Unconditionally close the transaction (if configured to do so) after loading data"""
@@ -108,4 +333,9 @@ class SQLObjectFixture(DBLoadableFixture):
         """Rollback the transaction"""
         if self.use_transaction:
             DBLoadableFixture.rollback(self)
+
+    def unload_dataset(self, dataset):
+        """Unload data stored for this dataset in the unload transaction"""
+        dataset.meta.storage_medium.visit_loader(self)
+        DBLoadableFixture.unload_dataset(self, dataset)
         
\ No newline at end of file
@@ -13,17 +13,48 @@ from fixture.util import _mklog
 stlog = _mklog('fixture.loadable.storm')
 
 class StormMedium(DBLoadableFixture.StorageMediumAdapter):
+    flush_every = 'row'
+    # bound parameters per DELETE statement, SQLite allows no more than 999
+    delete_chunk_size = 900
 
     def clear(self, obj):
         self.transaction.remove(obj)
 
-    def save(self, row, column_vals):
+    def clear_many(self, objs):
+        """Remove all objects with one DELETE statement for every 
+        ``delete_chunk_size`` objects.
+        
+        Classes with a composite primary key fall back to removing one object 
+        at a time.
+        """
+        from storm.info import get_cls_info, get_obj_info
+        from storm.store import Store
+        if not objs:
+            return
+        cls_info = get_cls_info(self.medium)
+        if len(cls_info.primary_key) != 1:
+            return DBLoadableFixture.StorageMediumAdapter.clear_many(
+                                                                self, objs)
+        store = Store.of(objs[0])
+        pk = cls_info.primary_key[0]
+        ids = [get_obj_info(obj).variables[pk].get() for obj in objs]
+        store.flush()
+        for start in range(0, len(ids), self.delete_chunk_size):
+            store.find(self.medium, 
+                       pk.is_in(ids[start:start + self.delete_chunk_size])
+                       ).remove()
+        for obj in objs:
+            store.invalidate(obj)
+
+    def __init__(self, *a, **kw):
+        DBLoadableFixture.StorageMediumAdapter.__init__(self, *a, **kw)
+        # set by StormFixture in 'level' mode, see LoadPlan.refers_to_itself :
+        self.refers_to_itself = None
+
+    def _primary_key(self, column_vals):
+        """Returns the primary key given in column_vals as a tuple or None"""
         from storm.info import get_cls_info
-        from storm.locals import ReferenceSet, Store
-
         cls_info = get_cls_info(self.medium)
-
-        column_vals = list(column_vals)
         pk = []
         for n, v in column_vals:
             propid = id(getattr(self.medium, n))
@@ -35,9 +66,11 @@ class StormMedium(DBLoadableFixture.StorageMediumAdapter):
                 [x[2] for x in pk], [x.name for x in cls_info.primary_key]))
 
         if pk:
-            obj = self.transaction.get(self.medium, tuple([x[1] for x in sorted(pk)]))
-        else:
-            obj = None
+            return tuple([x[1] for x in sorted(pk)])
+        return None
+
+    def _populate(self, obj, row, column_vals):
+        from storm.locals import ReferenceSet, Store
 
         if obj is None:
             obj = self.medium()
@@ -50,33 +83,141 @@ class StormMedium(DBLoadableFixture.StorageMediumAdapter):
                 getattr(obj, n).add(v)
             else:
                 setattr(obj, n, v)
+        return obj
+
+    def find_existing(self, keys):
+        """Returns a dict of {primary key tuple: object} for all stored 
+        objects having one of these primary keys, in one query.
+        """
+        from storm.info import get_cls_info, get_obj_info
+        from storm.expr import And, Or
+        if not keys:
+            return {}
+        key_columns = get_cls_info(self.medium).primary_key
+        if len(key_columns) == 1:
+            where = key_columns[0].is_in([k[0] for k in keys])
+        else:
+            where = Or(*[And(*[c == v for c, v in zip(key_columns, k)]) 
+                                                            for k in keys])
+        existing = {}
+        for obj in self.transaction.find(self.medium, where):
+            variables = get_obj_info(obj).variables
+            existing[tuple([variables[c].get() for c in key_columns])] = obj
+        return existing
+
+    def save(self, row, column_vals):
+        column_vals = list(column_vals)
+        pk = self._primary_key(column_vals)
+        if pk:
+            obj = self.transaction.get(self.medium, pk)
+        else:
+            obj = None
+
+        obj = self._populate(obj, row, column_vals)
 
         self.transaction.flush()
         stlog.info("%s %s", obj, [(n,getattr(obj,n)) for n in row.columns()])
 
         return obj
 
+    def can_save_many(self):
+        """True unless the loader flushes every row, see :meth:`save_many`"""
+        return self.flush_every != 'row'
+
+    def save_many(self, rows):
+        """Save a list of (row, column_vals) pairs.
+        
+        Unless the loader flushes every row, the objects that are already 
+        stored are looked up with one query and the others are added to the 
+        store without flushing it.  With ``flush_every='dataset'`` the store 
+        is flushed once the rows are saved, with ``'level'`` it is only 
+        flushed here if the dataset refers to its own rows, since those 
+        need the keys of the rows saved before them.
+        """
+        if self.flush_every == 'row':
+            return DBLoadableFixture.StorageMediumAdapter.save_many(self, rows)
+        rows = [(row, list(column_vals)) for row, column_vals in rows]
+        keys = [self._primary_key(column_vals) for row, column_vals in rows]
+        existing = self.find_existing([k for k in keys if k])
+        objs = []
+        for (row, column_vals), pk in zip(rows, keys):
+            obj = self._populate(existing.get(pk), row, column_vals)
+            if pk:
+                # a later row with the same key updates this object :
+                existing[pk] = obj
+            objs.append(obj)
+        if self.flush_every == 'dataset' or self.refers_to_itself:
+            self.transaction.flush()
+        return objs
+
     def visit_loader(self, loader):
         """Visit the loader and store a reference to the transaction connection"""
         self.transaction = loader.transaction
+        self.flush_every = getattr(loader, 'flush_every', self.flush_every)
 
 
     pass
 
 class StormFixture(DBLoadableFixture):
+    """A fixture that knows how to load DataSet objects into a `Storm`_ store.
+    
+    Keyword Arguments:
+    
+    store
+        the Store to add objects to
+    flush_every
+        when to flush the store while loading.  ``'row'`` (the default) 
+        flushes after each object, ``'dataset'`` after all rows of a dataset 
+        and ``'level'`` only when loading moves on to a dataset at another 
+        level of the :class:`LoadPlan <fixture.loadable.loadable.LoadPlan>`.  
+        Datasets at the same level never refer to each other so their keys 
+        are not needed until then.  See :meth:`StormMedium.save_many`
+    
+    See :class:`fixture.loadable.loadable.DBLoadableFixture` for other 
+    keyword arguments
+    """
     StormMedium = StormMedium
     Medium = StormMedium
+    flush_every = 'row'
+    flush_modes = ('row', 'dataset', 'level')
 
     def __init__(self,  store=None, use_transaction=True, 
-                        close_store=False, **kw ):
+                        close_store=False, flush_every=None, **kw ):
         DBLoadableFixture.__init__(self, **kw)
         self.store = store
         self.close_store = close_store
         self.use_transaction = use_transaction
+        if flush_every:
+            if flush_every not in self.flush_modes:
+                raise ValueError(
+                    "flush_every must be one of %s, not %r" % (
+                            ", ".join(self.flush_modes), flush_every))
+            self.flush_every = flush_every
+        self.unflushed_level = None
+
+    def begin(self, unloading=False):
+        DBLoadableFixture.begin(self, unloading=unloading)
+        self.unflushed_level = None
 
     def create_transaction(self):
         return self.store
 
+    def load_planned_dataset(self, ds, level, plan=None):
+        """load the rows of this dataset, flushing the store first if 
+        ``flush_every`` is ``'level'`` and datasets of another level were 
+        loaded without being flushed.
+        """
+        if self.flush_every == 'level':
+            if self.unflushed_level not in (None, level):
+                self.transaction.flush()
+            self.unflushed_level = level
+            if plan is None:
+                plan = self.LoadPlan([], default_refclass=self.dataclass)
+            plan.attach_storage_medium(self, ds)
+            ds.meta.storage_medium.refers_to_itself = \
+                                                plan.refers_to_itself(ds)
+        DBLoadableFixture.load_planned_dataset(self, ds, level, plan=plan)
+
 
 
     pass
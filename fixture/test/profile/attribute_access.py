@@ -0,0 +1,116 @@
+"""Times reading attributes of DataSet objects and their rows.
+
+Run it from the root of the source tree with::
+
+    python fixture/test/profile/attribute_access.py [OTHER_TREE]
+
+Each line is the time of one attribute access, in nanoseconds.  If the
+root of another source tree is given, i.e. a checkout of an older
+revision, the same accesses are timed against its fixture package as
+well, in a separate interpreter, and shown in the first column::
+
+    git archive <revision> fixture | (mkdir /tmp/old && tar -x -C /tmp/old)
+    python fixture/test/profile/attribute_access.py /tmp/old
+
+"""
+
+import sys, os
+import subprocess
+import timeit
+
+here = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                    '..', '..', '..')
+
+def cases():
+    """Returns a list of (label, access) pairs and a function to clean up"""
+    from fixture import DataSet, ColumnarDataSet, InMemoryFixture
+    from fixture.dataset import dataset_registry
+
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+            category_id = CategoryData.cars.ref('id')
+
+    class VisitData(ColumnarDataSet):
+        def data(self):
+            for i in range(1000):
+                yield ('visit_%s' % i, dict(page='/%s' % i))
+
+    fixture = InMemoryFixture()
+    data = fixture.data(ProductData)
+    data.setup()
+    products = data.ProductData
+    truck = products.truck
+    visits = VisitData()
+    visit = visits.visit_500
+    def done():
+        data.teardown()
+        dataset_registry.clear()
+    return [
+        ("dataset row, i.e. products.truck",
+            lambda: products.truck),
+        ("dataset item, i.e. products['truck']",
+            lambda: products['truck']),
+        ("dataset meta, i.e. products.meta",
+            lambda: products.meta),
+        ("superset dataset, i.e. data.ProductData",
+            lambda: data.ProductData),
+        ("declared column, i.e. truck.name",
+            lambda: truck.name),
+        ("stored column, i.e. truck.id",
+            lambda: truck.id),
+        ("stored object, i.e. truck.stored_object()",
+            lambda: truck.stored_object()),
+        ("resolved ref, i.e. truck.category_id",
+            lambda: truck.category_id),
+        ("columnar row, i.e. visits.visit_500",
+            lambda: visits.visit_500),
+        ("columnar column, i.e. visit.page",
+            lambda: visit.page),
+    ], done
+
+def timings(number):
+    """Returns a list of (label, nanoseconds per access) pairs"""
+    accesses, done = cases()
+    try:
+        result = []
+        for label, access in accesses:
+            # the lambda itself takes some of the time :
+            seconds = min(timeit.repeat(access, number=number, repeat=3))
+            result.append((label, seconds / number * 1e9))
+        return result
+    finally:
+        done()
+
+def timings_in(tree, number):
+    """Returns the timings of the fixture package in another source tree"""
+    p = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__),
+             '--raw', tree, str(number)], stdout=subprocess.PIPE)
+    out = p.communicate()[0]
+    if p.returncode:
+        raise SystemExit("could not time the fixture package in %s" % tree)
+    return [float(line.split('\t')[0]) for line in out.splitlines()]
+
+def main(argv, number=200000):
+    if argv[:1] == ['--raw']:
+        # a child of timings_in() :
+        sys.path.insert(0, argv[1])
+        for label, ns in timings(int(argv[2])):
+            print "%s\t%s" % (ns, label)
+        return
+    sys.path.insert(0, here)
+    if argv:
+        others = timings_in(os.path.abspath(argv[0]), number)
+        for (label, ns), other in zip(timings(number), others):
+            print "%6.0f -> %6.0f ns  %s" % (other, ns, label)
+    else:
+        for label, ns in timings(number):
+            print "%6.0f ns  %s" % (ns, label)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
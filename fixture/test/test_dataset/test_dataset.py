@@ -1,8 +1,9 @@
 
 from nose.tools import with_setup, eq_, raises
-from fixture import DataSet
+from fixture import DataSet, ColumnarDataSet, StreamingDataSet
 from fixture.dataset import (
-    Ref, DataType, DataRow, SuperSet, MergedSuperSet, is_rowlike)
+    Ref, DataType, DataRow, SuperSet, MergedSuperSet, is_rowlike, 
+    row_references)
 from fixture.test import attr
 
 class Books(DataSet):
@@ -113,6 +114,138 @@ class TestDataSet(DataSetTest):
         else:
             raise ValueError("unexpected row %s, count %s" % (items, count))
 
+class TestColumnarDataSet(TestDataSet):
+    def setUp(self):
+        class Books(ColumnarDataSet):
+            def data(self):
+                return (
+                    ('lolita', dict(title='lolita')),
+                    ('pi', dict(title='life of pi')),
+                )
+        self.dataset = Books()
+    
+    @attr(unit=True)
+    def test_rows_are_kept_in_columns(self):
+        eq_(self.dataset.meta.columns, {'title': ['lolita', 'life of pi']})
+        eq_(self.dataset.meta.key_index, {'lolita': 0, 'pi': 1})
+        eq_(self.dataset.lolita.columns(), ('title',))
+        assert 'pi' in self.dataset
+        assert 'moby_dick' not in self.dataset
+        eq_(self.dataset.get('moby_dick'), None)
+    
+    @attr(unit=True)
+    def test_values_are_set_in_columns(self):
+        self.dataset.pi.title = 'Life of Pi'
+        eq_(self.dataset.pi.title, 'Life of Pi')
+        eq_(self.dataset.meta.columns['title'], ['lolita', 'Life of Pi'])
+    
+    @attr(unit=True)
+    def test_references(self):
+        class Titles(ColumnarDataSet):
+            def data(self):
+                return (
+                    ('lolita', dict(
+                        author=Authors.nabokov, 
+                        author_name=Authors.nabokov.ref('name'), 
+                        title='lolita')),
+                    ('pi', dict(
+                        author=Authors.martel, 
+                        author_name=Authors.martel.ref('name'), 
+                        title='life of pi')),
+                )
+        titles = Titles()
+        eq_(titles.meta.references, [Authors])
+        eq_(row_references(titles.meta.row_view), 
+            (('author', 'row'), ('author_name', 'ref')))
+        eq_(titles.pi.author, Authors.martel)
+    
+    @attr(unit=True)
+    def test_defaults_of_row_class(self):
+        class BookRow(DataRow):
+            format = 'paperback'
+        class Editions(ColumnarDataSet):
+            class Meta:
+                row = BookRow
+            def data(self):
+                return (
+                    ('lolita', dict(title='lolita')),
+                    ('pi', dict(title='life of pi', format='hardcover')),
+                )
+        editions = Editions()
+        eq_(editions.meta.columns['format'], ['paperback', 'hardcover'])
+        eq_(editions.lolita.format, 'paperback')
+        eq_(editions.pi.format, 'hardcover')
+    
+    @attr(unit=True)
+    @raises(ValueError)
+    def test_rows_must_have_the_same_columns(self):
+        class Titles(ColumnarDataSet):
+            def data(self):
+                return (
+                    ('lolita', dict(title='lolita')),
+                    ('pi', dict(title='life of pi', pages=319)),
+                )
+        Titles()
+
+class TestStreamingDataSet(object):
+    def setUp(self):
+        reads = self.reads = []
+        class Visits(StreamingDataSet):
+            def data(self):
+                reads.append(1)
+                for i in range(1, 4):
+                    yield ('visit_%s' % i, dict(page='/page/%s' % i))
+        self.dataset = Visits()
+    
+    @attr(unit=True)
+    def test_rows_are_read_on_each_iteration(self):
+        eq_(self.reads, [])
+        eq_([(k, row.page) for k, row in self.dataset], 
+            [('visit_1', '/page/1'), ('visit_2', '/page/2'), 
+             ('visit_3', '/page/3')])
+        eq_([k for k, row in self.dataset], ['visit_1', 'visit_2', 'visit_3'])
+        eq_(self.reads, [1, 1])
+        eq_(self.dataset.meta.keys, [])
+        assert 'visit_1' not in self.dataset
+        eq_(self.dataset.get('visit_1'), None)
+        eq_(self.dataset.meta.row_view.columns(), ('page',))
+    
+    @attr(unit=True)
+    def test_references_must_be_declared(self):
+        class Pages(StreamingDataSet):
+            def data(self):
+                yield ('lolita', dict(author=Authors.nabokov.ref('name')))
+        try:
+            list(Pages())
+        except ValueError, e:
+            eq_(str(e), "column 'author' of Pages refers to Authors, "
+                        "which must be declared in Meta.references")
+        else:
+            raise AssertionError("expected ValueError")
+        class Pages(StreamingDataSet):
+            class Meta:
+                references = [Authors]
+            def data(self):
+                yield ('lolita', dict(author=Authors.nabokov.ref('name')))
+        pages = Pages()
+        eq_([k for k, row in pages], ['lolita'])
+        eq_(row_references(pages.meta.row_view), (('author', 'ref'),))
+    
+    @attr(unit=True)
+    @raises(ValueError)
+    def test_rows_must_have_the_same_columns(self):
+        class Pages(StreamingDataSet):
+            def data(self):
+                yield ('lolita', dict(title='lolita'))
+                yield ('pi', dict(title='life of pi', pages=319))
+        list(Pages())
+    
+    @attr(unit=True)
+    def test_row_ref(self):
+        ref = type(self.dataset).row_ref('visit_2')
+        eq_(ref.dataset_class, type(self.dataset))
+        eq_(ref.key, 'visit_2')
+
 class TestDataRow(object):
     @attr(unit=True)
     def test_datarow_is_rowlike(self):
@@ -121,6 +254,126 @@ class TestDataRow(object):
         row = DataRow(StubDataSet)
         assert is_rowlike(row), "expected %s to be rowlike" % row
 
+    @attr(unit=True)
+    def test_columns_are_found_once(self):
+        class Books(DataSet):
+            class lolita:
+                title = 'lolita'
+                author = 'nabokov'
+        row = Books().lolita
+        eq_(row.columns(), ('author', 'title'))
+        # known without dir() :
+        eq_(row.__dict__['_columns'], ('author', 'title'))
+        # and the row class looked at by data() :
+        eq_(Books.lolita.__dict__['_columns'], ('author', 'ref', 'title'))
+
+    @attr(unit=True)
+    def test_columns_of_inherited_rows(self):
+        eq_(EventData().submit.columns(), ('offer', 'session', 'time', 'type'))
+
+    @attr(unit=True)
+    def test_columns_of_custom_row_class(self):
+        class BookRow(DataRow):
+            _reserved_attr = DataRow._reserved_attr + ('describe',)
+            format = 'paperback'
+            def describe(self):
+                return "%s (%s)" % (self.title, self.format)
+        class Books(DataSet):
+            class Meta:
+                row = BookRow
+            class lolita:
+                title = 'lolita'
+        row = Books().lolita
+        eq_(row.columns(), ('format', 'title'))
+        eq_(row(Books()).describe(), 'lolita (paperback)')
+
+    def test_references_are_planned(self):
+        class Authors(DataSet):
+            class nabokov:
+                name = 'Vladimir Nabokov'
+        class Books(DataSet):
+            class lolita:
+                title = 'lolita'
+                tags = ('novel', 'russian')
+                author = Authors.nabokov
+                author_name = Authors.nabokov.ref('name')
+                authors = [Authors.nabokov]
+        row = Books().lolita
+        eq_(row._references, (('author', 'row'), 
+                              ('author_name', 'ref'), 
+                              ('authors', 'rows')))
+        eq_(row_references(row), row._references)
+
+    @attr(unit=True)
+    def test_stored_object_is_kept(self):
+        class Stored(object):
+            def __init__(self, id):
+                self.id = id
+        class Books(DataSet):
+            class lolita:
+                title = 'lolita'
+        books = Books()
+        row = books.lolita(books)
+        books.meta._stored_objects.store('lolita', Stored(1))
+        eq_(row.id, 1)
+        books.meta._stored_objects.store('lolita', Stored(2))
+        eq_(row.id, 1)
+        eq_(row.stored_object().id, 1)
+        # as when a loader sets the row :
+        books._setdata('lolita', row)
+        eq_(row.id, 2)
+
+    @attr(unit=True)
+    def test_rows_have_slots(self):
+        row = DataRow(Books)
+        assert not hasattr(row, '__dict__')
+        class Events(ColumnarDataSet):
+            def data(self):
+                return (('click', dict(type='click')),)
+        event = Events().click
+        assert not hasattr(event, '__dict__')
+        eq_(event.type, 'click')
+
+class TestDataSetData(object):
+    @attr(unit=True)
+    def test_rows_are_found_once(self):
+        class Authors(DataSet):
+            class nabokov:
+                name = 'Vladimir Nabokov'
+        class Books(DataSet):
+            class lolita:
+                title = 'lolita'
+                author = Authors.nabokov
+        books = Books()
+        eq_(books.meta.references, [Authors])
+        Books.lolita.year = 1955
+        again = Books()
+        eq_(again.meta.references, [Authors])
+        eq_(again.lolita.title, 'lolita')
+        # a new class is made for each instance...
+        assert again.lolita is not books.lolita
+        # ...but the row class was not looked at again :
+        assert not hasattr(again.lolita, 'year')
+        eq_(again.lolita._columns, ('author', 'title'))
+        eq_(again.lolita._references, (('author', 'row'),))
+
+    @attr(unit=True)
+    def test_forget_data(self):
+        class Books(DataSet):
+            class lolita:
+                title = 'lolita'
+        class MoreBooks(Books):
+            class pnin:
+                title = 'pnin'
+        Books()
+        MoreBooks()
+        Books.lolita.year = 1955
+        Books.forget_data()
+        eq_(Books().lolita.year, 1955)
+        eq_(Books().lolita._columns, ('title', 'year'))
+        eq_(MoreBooks().lolita.year, 1955)
+        eq_(MoreBooks().meta.keys, ['lolita', 'pnin'])
+
 class TestDataTypeDrivenDataSet(TestDataSet):
     def setUp(self):
         class Books(DataSet):
@@ -0,0 +1,170 @@
+
+from nose.tools import eq_, raises
+from nose.exc import SkipTest
+from fixture import DataSet
+from fixture.dataset.factory import *
+from fixture.dataset.factory import PythonRandom, NumPyRandom, random_source
+from fixture.test import attr, env_supports
+
+class CategoryData(DataSet):
+    class cars:
+        id = 1
+        name = 'cars'
+    class free_stuff:
+        id = 2
+        name = 'get free stuff'
+
+class ProductData(FactoryDataSet):
+    class Meta:
+        rows = 50
+        generators = dict(
+            id=Sequence(),
+            name=Template('product %(id)s'),
+            price=Uniform(1.0, 100.0),
+            quantity=Integers(0, 10),
+            weight=Normal(10.0, 2.0),
+            color=Choice(['red', 'blue'], weights=[3, 1]),
+            category=Pick(CategoryData),
+            category_id=Pick(CategoryData, 'id'))
+
+class FactoryDataSetTest(object):
+    numpy = None
+
+    def setUp(self):
+        self.Meta = ProductData.Meta
+        self.Meta.numpy = self.numpy
+
+    def tearDown(self):
+        self.Meta.numpy = True
+
+    @attr(unit=1)
+    def test_rows(self):
+        products = ProductData()
+        eq_(len(products.meta.keys), 50)
+        eq_(products.meta.keys[:2], ['row_1', 'row_2'])
+        eq_(products.meta.column_names, (
+            'category', 'category_id', 'color', 'id', 'name', 'price', 
+            'quantity', 'weight'))
+        eq_(products.row_3.id, 3)
+        eq_(products.row_3.name, 'product 3')
+        eq_(products.meta.columns['id'], range(1, 51))
+        for row in products.meta.columns['quantity']:
+            assert type(row) is int and 0 <= row <= 10, row
+        for row in products.meta.columns['price']:
+            assert type(row) is float and 1.0 <= row <= 100.0, row
+        eq_(set(products.meta.columns['color']), set(['red', 'blue']))
+        assert products.meta.columns['color'].count('red') > 25
+
+    @attr(unit=1)
+    def test_same_rows_for_same_seed(self):
+        columns = ProductData().meta.columns
+        eq_(columns['price'], ProductData().meta.columns['price'])
+        self.Meta.seed = 1
+        try:
+            assert columns['price'] != ProductData().meta.columns['price']
+        finally:
+            self.Meta.seed = 0
+
+    @attr(unit=1)
+    def test_references(self):
+        products = ProductData()
+        eq_(products.meta.references, [CategoryData])
+        eq_(products.meta.row_view._references, 
+            (('category', 'row'), ('category_id', 'ref')))
+        eq_(set(products.meta.columns['category']), 
+            set([CategoryData.cars, CategoryData.free_stuff]))
+        eq_(set([(v.ref.dataset_class, v.ref.key, v.attr_name) 
+                    for v in products.meta.columns['category_id']]), 
+            set([(CategoryData, 'cars', 'id'), 
+                 (CategoryData, 'free_stuff', 'id')]))
+
+class TestPythonFactoryDataSet(FactoryDataSetTest):
+    numpy = False
+
+    @attr(unit=1)
+    def test_random_source(self):
+        assert isinstance(random_source(use_numpy=False), PythonRandom)
+
+class TestNumPyFactoryDataSet(FactoryDataSetTest):
+    numpy = True
+
+    def setUp(self):
+        if not env_supports.numpy:
+            raise SkipTest
+        FactoryDataSetTest.setUp(self)
+
+    @attr(unit=1)
+    def test_random_source(self):
+        assert isinstance(random_source(), NumPyRandom)
+
+class TestFactoryDataSet(object):
+
+    @attr(unit=1)
+    def test_defaults_and_key_format(self):
+        class EventData(FactoryDataSet):
+            class Meta:
+                rows = 3
+                key_format = 'event_%03d'
+                generators = dict(id=Sequence(10, 10))
+                class row:
+                    venue = 'hall'
+        events = EventData()
+        eq_(events.meta.keys, ['event_001', 'event_002', 'event_003'])
+        eq_(events.event_002.id, 20)
+        eq_(events.meta.columns['venue'], ['hall', 'hall', 'hall'])
+        eq_(events.event_003.venue, 'hall')
+
+    @attr(unit=1)
+    def test_template_row_number(self):
+        class EventData(FactoryDataSet):
+            class Meta:
+                rows = 2
+                generators = dict(name=Template('Event %(n)s'))
+        eq_(EventData().meta.columns['name'], ['Event 1', 'Event 2'])
+
+    @attr(unit=1)
+    @raises(ValueError)
+    def test_rows_are_required(self):
+        class EventData(FactoryDataSet):
+            class Meta:
+                generators = dict(id=Sequence())
+        EventData()
+
+    @attr(unit=1)
+    @raises(ValueError)
+    def test_generators_make_every_row(self):
+        class Short(Generator):
+            def generate(self, count, random, columns):
+                return [1]
+        class EventData(FactoryDataSet):
+            class Meta:
+                rows = 2
+                generators = dict(id=Short())
+        EventData()
+
+    @attr(unit=1)
+    @raises(ValueError)
+    def test_keys_must_be_unique(self):
+        class EventData(FactoryDataSet):
+            class Meta:
+                rows = 2
+                key_format = 'event%.0s'
+                generators = dict(id=Sequence())
+        EventData()
+
+    @attr(unit=1)
+    @raises(ValueError)
+    def test_weights_must_match_values(self):
+        Choice(['a', 'b'], weights=[1])
+
+    @attr(unit=1)
+    @raises(ValueError)
+    def test_pick_needs_row_classes(self):
+        class NamedData(DataSet):
+            def data(self):
+                return (('cars', dict(id=1)),)
+        class EventData(FactoryDataSet):
+            class Meta:
+                rows = 2
+                generators = dict(category=Pick(NamedData))
+        EventData()
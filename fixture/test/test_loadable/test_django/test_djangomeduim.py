@@ -70,4 +70,32 @@ def test_is_field_required():
     for item in required_matrix.items():
         fld, result = item
         check_field_required.description = "%s required? %s" % item
-        yield check_field_required, TestMod._meta.get_field(fld), result
\ No newline at end of file
+        yield check_field_required, TestMod._meta.get_field(fld), result
+def test_model_schema_is_cached():
+    from fixture.loadable.django_loadable import model_schema
+    schema = model_schema(models.Reviewer)
+    assert model_schema(models.Reviewer) is schema
+    assert schema.m2m_targets == {'reviewed': models.Book}
+    validator = schema.validator(('name', 'reviewed'))
+    assert schema.validator(('name', 'reviewed')) is validator
+
+def test_model_schema_is_invalidated():
+    from fixture.loadable.django_loadable import model_schema
+    schema = model_schema(models.Reviewer)
+    # preparing any model class may add relations to the others :
+    class Critic(django_models.Model):
+        name = django_models.CharField(max_length=10)
+        favorite = django_models.ForeignKey(models.Reviewer)
+    assert model_schema(models.Reviewer) is not schema
+
+@raises(ValueError)
+def test_unknown_column_in_validator():
+    from fixture.loadable.django_loadable import model_schema
+    model_schema(models.Reviewer).validator(('name', 'invalid'))
+
+def test_single_m2m_value_is_listed():
+    from fixture.loadable.django_loadable import model_schema
+    book = models.Book(title='Dune')
+    validator = model_schema(models.Reviewer).validator(('name', 'reviewed'))
+    assert validator.check([('name', 'ben'), ('reviewed', book)]) == \
+                            [('name', 'ben'), ('reviewed', [book])]
@@ -1,5 +1,6 @@
 
 from fixture import DjangoFixture
+from fixture.loadable.django_loadable import database_vendor
 from fixture import DataSet, style
 
 from fixture.examples.django_example.app import models
@@ -46,4 +47,97 @@ def test_dataset_with_meta():
     finally:
         data.teardown()
     assert_empty(models)
-    
\ No newline at end of file
+    
+bulk_fixture = DjangoFixture(bulk=True)
+
+def count_queries(callable):
+    from django.conf import settings
+    from django.db import connection, reset_queries
+    debug = settings.DEBUG
+    settings.DEBUG = True
+    reset_queries()
+    try:
+        callable()
+        return len(connection.queries)
+    finally:
+        settings.DEBUG = debug
+    
+def test_bulk_m2m():
+    assert_empty(models)
+    data = bulk_fixture.data(AuthorData, BookData, ReviewerData)
+    try:
+        data.setup()
+        ben = models.Reviewer.objects.all()[0]
+        assert ben.reviewed.count() == 2
+        dune = models.Book.objects.get(title='Dune')
+        assert ben in dune.reviewers.all()
+        frank = models.Author.objects.get(first_name='Frank')
+        assert frank.books.count() == 1
+        assert dune in frank.books.all()
+        assert data.BookData.python.author_id == data.AuthorData.guido.id
+    finally:
+        data.teardown()
+    assert_empty(models)
+
+def test_bulk_uses_fewer_queries():
+    assert_empty(models)
+    queries = []
+    for fixture in (dj_fixture, bulk_fixture):
+        data = fixture.data(AuthorData, BookData, ReviewerData)
+        try:
+            queries.append(count_queries(data.setup))
+        finally:
+            data.teardown()
+        assert_empty(models)
+    one_at_a_time, bulk = queries
+    assert bulk < one_at_a_time, (
+        "expected fewer than %s queries, got %s" % (one_at_a_time, bulk))
+
+def test_bulk_teardown_is_chunked():
+    class ManyAuthorData(DataSet):
+        class Meta:
+            django_model = 'app.Author'
+        def data(self):
+            return [('author_%s' % i, dict(first_name='Author', 
+                                           last_name=str(i))) 
+                    for i in range(5)]
+    class ChunkedMedium(DjangoFixture.Medium):
+        delete_chunk_size = 2
+    fixture = DjangoFixture(bulk=True, medium=ChunkedMedium)
+    assert_empty(models)
+    data = fixture.data(ManyAuthorData)
+    data.setup()
+    deletes = []
+    def teardown():
+        from django.db import connection
+        data.teardown()
+        deletes.extend([q['sql'] for q in connection.queries 
+                                    if q['sql'].startswith('DELETE')])
+    try:
+        count_queries(teardown)
+    finally:
+        assert_empty(models)
+    assert len(deletes) == 3, deletes
+
+def test_bulk_keys_follow_sqlite_sequence():
+    from django.db import connection
+    if 'sqlite' not in database_vendor(connection):
+        return
+    cursor = connection.cursor()
+    # any AUTOINCREMENT table makes SQLite keep sqlite_sequence :
+    cursor.execute("CREATE TABLE fixture_counted "
+                   "(id integer PRIMARY KEY AUTOINCREMENT)")
+    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, 10)", 
+                   [models.Author._meta.db_table])
+    assert_empty(models)
+    data = bulk_fixture.data(AuthorData)
+    try:
+        data.setup()
+        ids = [a.id for a in models.Author.objects.all()]
+        assert sorted(ids) == [11, 12], ids
+    finally:
+        data.teardown()
+        cursor.execute("DROP TABLE fixture_counted")
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = %s", 
+                       [models.Author._meta.db_table])
+    assert_empty(models)
@@ -193,3 +193,59 @@ class TestListOfRelationships(unittest.TestCase):
         eq_(list(self.Author.all()), [])
         eq_(list(self.Book.all()), [])
             
+
+class TestBatchedPuts(unittest.TestCase):
+            
+    def setUp(self):
+        from google.appengine.ext import db
+        
+        class Person(db.Model):
+            name = db.StringProperty()
+            parent_person = db.SelfReferenceProperty()
+        self.Person = Person
+        
+        class PersonData(DataSet):
+            class adam:
+                name = 'adam'
+            class eve:
+                name = 'eve'
+            class seth:
+                name = 'seth'
+            class tom:
+                name = 'tom'
+        PersonData.seth.parent_person = PersonData.adam
+        PersonData.tom.parent_person = PersonData.eve
+        self.PersonData = PersonData
+        
+        self.fixture = GoogleDatastoreFixture(
+                            env={'PersonData': self.Person}, batch_size=10)
+        self.calls = []
+        self.put, self.delete = db.put, db.delete
+        def put(models):
+            self.calls.append(('put', len(models)))
+            return self.put(models)
+        def delete(models):
+            self.calls.append(('delete', len(models)))
+            return self.delete(models)
+        db.put, db.delete = put, delete
+    
+    def tearDown(self):
+        from google.appengine.ext import db
+        db.put, db.delete = self.put, self.delete
+        clear_datastore()
+    
+    @attr(functional=1)
+    def test_setup_then_teardown(self):
+        data = self.fixture.data(self.PersonData)
+        data.setup()
+        
+        people = dict([(p.name, p) for p in self.Person.all()])
+        eq_(people['seth'].parent_person.name, 'adam')
+        eq_(people['tom'].parent_person.name, 'eve')
+        
+        data.teardown()
+        eq_(list(self.Person.all()), [])
+        
+        # seth refers to adam, who had to be put before him, and 
+        # tom to eve who was put along with adam :
+        eq_(self.calls, [('put', 2), ('put', 2), ('delete', 4)])
@@ -0,0 +1,287 @@
+
+from nose.tools import eq_, raises
+from fixture import (
+    InMemoryFixture, NamedDataStyle, CamelAndUndersStyle, DataSet, 
+    ColumnarDataSet, StreamingDataSet, FactoryDataSet)
+from fixture.dataset import MergedSuperSet
+from fixture.dataset.factory import Template, Pick
+from fixture.loadable.inmemory_loadable import InMemoryStore, InMemoryTable
+from fixture.test.test_loadable import *
+from fixture.test import attr
+
+class Category(object):
+    pass
+
+class Product(object):
+    pass
+
+class Offer(object):
+    pass
+
+class InMemoryFixtureTest:
+    fixture = InMemoryFixture(
+                        style=( NamedDataStyle() + CamelAndUndersStyle()),
+                        env=globals(), dataclass=MergedSuperSet )
+    
+    def setUp(self):
+        self.store = InMemoryStore()
+        self.fixture.store = self.store
+
+    def table(self, storable):
+        return self.store.table(storable)
+
+class InMemoryCategoryTest(InMemoryFixtureTest):
+    def assert_data_loaded(self, dataset):
+        """assert that the dataset was loaded."""
+        eq_(self.table(Category).get(dataset.gray_stuff.id).name, 
+                            dataset.gray_stuff.name)
+        eq_(self.table(Category).get(dataset.yellow_stuff.id).name, 
+                            dataset.yellow_stuff.name)
+    
+    def assert_data_torndown(self):
+        """assert that the dataset was torn down."""
+        eq_(len(self.table(Category)), 0)
+         
+class TestInMemoryCategory(
+        HavingCategoryData, InMemoryCategoryTest, LoadableTest):
+    pass 
+class TestInMemoryCategoryAsDataType(
+        HavingCategoryAsDataType, InMemoryCategoryTest, LoadableTest):
+    pass
+
+class TestInMemoryPartialLoad(
+        InMemoryFixtureTest, LoaderPartialRecoveryTest):        
+    def assert_partial_load_aborted(self):
+        eq_(len(self.table(Category)), 0)
+        
+class InMemoryFixtureCascadeTest(InMemoryFixtureTest):
+    def assert_data_loaded(self, dataset):
+        """assert that the dataset was loaded."""
+        eq_(self.table(Offer).get(dataset.free_truck.id).name, 
+                            dataset.free_truck.name)
+        eq_(self.table(Product).get(dataset.truck.id).name, 
+                            dataset.truck.name)
+        eq_(self.table(Category).get(dataset.cars.id).name, 
+                            dataset.cars.name)
+        eq_(self.table(Category).get(dataset.free_stuff.id).name, 
+                            dataset.free_stuff.name)
+    
+    def assert_data_torndown(self):
+        """assert that the dataset was torn down."""
+        eq_(len(self.table(Category)), 0)
+        eq_(len(self.table(Offer)), 0)
+        eq_(len(self.table(Product)), 0)
+
+class TestInMemoryFixtureCascade(
+        HavingOfferProductData, InMemoryFixtureCascadeTest, LoadableTest):
+    pass
+class TestInMemoryFixtureCascadeAsType(
+        HavingOfferProductAsDataType, InMemoryFixtureCascadeTest, 
+        LoadableTest):
+    pass
+class TestInMemoryFixtureCascadeAsRef(
+        HavingReferencedOfferProduct, InMemoryFixtureCascadeTest, 
+        LoadableTest):
+    pass
+class TestInMemoryFixtureCascadeAsRefInherit(
+        HavingRefInheritedOfferProduct, InMemoryFixtureCascadeTest, 
+        LoadableTest):
+    pass
+
+class TestInMemoryWithoutEnv(object):
+    class CategoryData(DataSet):
+        class Meta:
+            indexes = ('name',)
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+    
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+        class spaceship:
+            name = 'spaceship'
+    ProductData.truck.category_id = CategoryData.cars.ref('id')
+    ProductData.spaceship.category_id = CategoryData.cars.ref('id')
+
+    @attr(unit=1)
+    def test_records(self):
+        fixture = InMemoryFixture()
+        data = fixture.data(self.ProductData)
+        data.setup()
+        categories = fixture.store.table('Category')
+        products = fixture.store.table('Product')
+        try:
+            eq_([c.name for c in categories], ['cars', 'get free stuff'])
+            eq_(categories.indexes.keys(), ['name'])
+            eq_(categories.find(name='cars'), [categories.get(1)])
+            eq_([p.name for p in products.find(category_id=1)], 
+                ['spaceship', 'truck'])
+            eq_(data.ProductData.truck.category_id, 1)
+        finally:
+            data.teardown()
+        eq_(len(categories), 0)
+        eq_(len(products), 0)
+        eq_(categories.indexes, {'name': {}})
+
+    @attr(unit=1)
+    def test_indexed_columns_can_be_changed(self):
+        fixture = InMemoryFixture()
+        data = fixture.data(self.CategoryData)
+        data.setup()
+        categories = fixture.store.table('Category')
+        categories.get(1).name = 'trucks'
+        data.teardown()
+        eq_(len(categories), 0)
+        eq_(categories.indexes, {'name': {}})
+
+    @attr(unit=1)
+    def test_columnar_rows(self):
+        CategoryData = self.CategoryData
+        class ProductData(ColumnarDataSet):
+            def data(self):
+                for i in range(1, 4):
+                    yield ('product_%s' % i, dict(
+                                name='product %s' % i, 
+                                category_id=CategoryData.free_stuff.ref('id')))
+        fixture = InMemoryFixture(batch_size=2)
+        data = fixture.data(ProductData)
+        data.setup()
+        products = fixture.store.table('Product')
+        try:
+            eq_([(p.name, p.category_id) for p in products], 
+                [('product 1', 2), ('product 2', 2), ('product 3', 2)])
+            eq_(data.ProductData.product_3.id, 3)
+            eq_(data.ProductData.product_3.category_id, 2)
+        finally:
+            data.teardown()
+        eq_(len(products), 0)
+
+    @attr(unit=1)
+    def test_streamed_rows(self):
+        CategoryData = self.CategoryData
+        class ProductData(StreamingDataSet):
+            class Meta:
+                references = [CategoryData]
+                chunk_size = 2
+            def data(self):
+                for i in range(1, 6):
+                    yield ('product_%s' % i, dict(
+                                name='product %s' % i, 
+                                category_id=CategoryData.cars.ref('id')))
+        class OfferData(DataSet):
+            class half_off:
+                product_id = ProductData.row_ref('product_4')('id')
+        fixture = InMemoryFixture()
+        data = fixture.data(OfferData)
+        data.setup()
+        products = fixture.store.table('Product')
+        try:
+            eq_([(p.id, p.name, p.category_id) for p in products], 
+                [(i, 'product %s' % i, 1) for i in range(1, 6)])
+            eq_(data.OfferData.half_off.product_id, 4)
+            eq_(data.ProductData.product_2.id, 2)
+            eq_(data.ProductData.product_2.name, 'product 2')
+            eq_(len(data.ProductData.meta._stored_objects), 5)
+        finally:
+            data.teardown()
+        eq_(len(products), 0)
+
+    @attr(unit=1)
+    def test_factory_rows(self):
+        CategoryData = self.CategoryData
+        class ProductData(FactoryDataSet):
+            class Meta:
+                rows = 10
+                numpy = False
+                generators = dict(
+                    name=Template('product %(n)s'),
+                    category=Pick(CategoryData, 'name'),
+                    category_id=Pick(CategoryData, 'id', weights=[1, 0]))
+        fixture = InMemoryFixture(batch_size=4)
+        data = fixture.data(ProductData)
+        data.setup()
+        products = fixture.store.table('Product')
+        try:
+            eq_([(p.id, p.name, p.category_id) for p in products], 
+                [(i, 'product %s' % i, 1) for i in range(1, 11)])
+            eq_(set([p.category for p in products]), 
+                set(['cars', 'get free stuff']))
+            eq_(data.ProductData.row_7.category_id, 1)
+        finally:
+            data.teardown()
+        eq_(len(products), 0)
+
+    @attr(unit=1)
+    def test_truncate(self):
+        fixture = InMemoryFixture(teardown='truncate')
+        data = fixture.data(self.ProductData)
+        data.setup()
+        data.teardown()
+        data = fixture.data(self.ProductData)
+        data.setup()
+        try:
+            # ids start over :
+            eq_(data.CategoryData.cars.id, 1)
+        finally:
+            data.teardown()
+
+class TestInMemoryTable(object):
+    def setUp(self):
+        self.table = InMemoryTable('Thing', indexes=['color'])
+        class Thing(object):
+            def __init__(self, **kw):
+                self.__dict__.update(kw)
+        self.Thing = Thing
+
+    @attr(unit=1)
+    def test_ids_count_up_from_the_highest(self):
+        eq_(self.table.insert(self.Thing(color='red')), 1)
+        eq_(self.table.insert(self.Thing(id=10, color='red')), 10)
+        eq_(self.table.insert(self.Thing(color='blue')), 11)
+
+    @raises(ValueError)
+    @attr(unit=1)
+    def test_duplicate_id(self):
+        self.table.insert(self.Thing(id=1))
+        self.table.insert(self.Thing(id=1))
+
+    @attr(unit=1)
+    def test_find(self):
+        red = self.Thing(color='red', size=1)
+        big_red = self.Thing(color='red', size=2)
+        blue = self.Thing(color='blue', size=2)
+        for thing in (red, big_red, blue):
+            self.table.insert(thing)
+        eq_(self.table.find(color='red'), [red, big_red])
+        eq_(self.table.find(color='red', size=2), [big_red])
+        eq_(self.table.find(size=2), [big_red, blue])
+        eq_(self.table.find(color='green'), [])
+        self.table.delete(red)
+        eq_(self.table.find(color='red'), [big_red])
+        self.table.add_index('size')
+        eq_(self.table.find(size=2), [big_red, blue])
+
+    @attr(unit=1)
+    def test_delete_changed_object(self):
+        red = self.Thing(color='red')
+        self.table.insert(red)
+        red.color = 'blue'
+        self.table.delete(red)
+        eq_(len(self.table), 0)
+        eq_(self.table.indexes, {'color': {}})
+
+    @attr(unit=1)
+    def test_delete_many(self):
+        things = [self.Thing(color=c) for c in ('red', 'red', 'blue')]
+        for thing in things:
+            self.table.insert(thing)
+        self.table.delete_many(things[:2])
+        eq_(list(self.table), [things[2]])
+        eq_(self.table.find(color='red'), [])
+        self.table.delete_many(things[2:])
+        eq_(len(self.table), 0)
+        eq_(self.table.indexes, {'color': {}})
+        # ids keep counting, unlike after clear() :
+        eq_(self.table.insert(self.Thing(color='red')), 4)
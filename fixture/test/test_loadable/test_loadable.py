@@ -3,11 +3,12 @@ import nose
 from nose.tools import raises, eq_
 from nose.exc import SkipTest
 import unittest
-from fixture import DataSet, NamedDataStyle
+from fixture import DataSet, StreamingDataSet, NamedDataStyle
 from fixture.loadable import (
     LoadableFixture, EnvLoadableFixture, DBLoadableFixture)
 from fixture.test import attr, env_supports, PrudentTestResult
 from fixture import TempIO
+from fixture.exc import LoadError
 
 def exec_if_supported(code, globals={}, locals={}):
     # seems that for using from __future__ exec needs to think it's compiling a 
@@ -431,4 +432,197 @@ class TestDBLoadableRowReferences(object):
             ldr.loaded[PersonData].meta._stored_objects.get_object('bob')
         jenny_db_obj = \
             ldr.loaded[PersonData].meta._stored_objects.get_object('jenny')
-        eq_(jenny_db_obj.friend, bob_db_obj)
\ No newline at end of file
+        eq_(jenny_db_obj.friend, bob_db_obj)
+class MockBatchStorageMedium(MockStorageMedium):
+    batches = []
+    def save_many(self, rows):
+        self.batches.append([row._key for row, column_vals in rows])
+        return [self.save(row, column_vals) for row, column_vals in rows]
+    def visit_loader(self, loader):
+        self.batch_size = loader.batch_size
+
+class TestBatchedLoading(object):
+    def setUp(self):
+        MockBatchStorageMedium.batches = []
+
+    @attr(unit=True)
+    def test_rows_are_saved_in_chunks(self):
+        class Person(object):
+            def save(self): 
+                pass
+        class PersonData(DataSet):
+            class adam:
+                name = "Adam"
+            class bob:
+                name = "Bob"
+            class cindy:
+                name = "Cindy"
+        
+        ldr = StubLoadableFixture(
+            style=NamedDataStyle(), medium=MockBatchStorageMedium, 
+            env=locals(), batch_size=2)
+        ldr.begin()
+        ldr.load_dataset(PersonData())
+        
+        eq_(MockBatchStorageMedium.batches, [['adam', 'bob'], ['cindy']])
+        cindy_db_obj = \
+            ldr.loaded[PersonData].meta._stored_objects.get_object('cindy')
+        eq_(cindy_db_obj.name, "Cindy")
+
+    @attr(unit=True)
+    def test_self_references_flush_the_chunk(self):
+        class Person(object):
+            def save(self): 
+                pass
+        class PersonData(DataSet):
+            class bob:
+                name = "Bob B. Chillingsworth"
+                friend = None
+            class jenny:
+                name = "Jenny Ginetti"
+            jenny.friend = bob
+        
+        ldr = StubLoadableFixture(
+            style=NamedDataStyle(), medium=MockBatchStorageMedium, 
+            env=locals(), batch_size=10)
+        ldr.begin()
+        ldr.load_dataset(PersonData())
+        
+        eq_(MockBatchStorageMedium.batches, [['bob'], ['jenny']])
+        bob_db_obj = \
+            ldr.loaded[PersonData].meta._stored_objects.get_object('bob')
+        jenny_db_obj = \
+            ldr.loaded[PersonData].meta._stored_objects.get_object('jenny')
+        eq_(jenny_db_obj.friend, bob_db_obj)
+
+    @attr(unit=True)
+    def test_references_to_saved_rows_keep_the_chunk(self):
+        class Person(object):
+            def save(self): 
+                pass
+        class PersonData(DataSet):
+            class adam:
+                name = "Adam"
+            class eve:
+                name = "Eve"
+            class seth:
+                name = "Seth"
+            class tom:
+                name = "Tom"
+            seth.parent = adam
+        PersonData.tom.parent = PersonData.eve.ref('name')
+        
+        ldr = StubLoadableFixture(
+            style=NamedDataStyle(), medium=MockBatchStorageMedium, 
+            env=locals(), batch_size=10)
+        ldr.begin()
+        ldr.load_dataset(PersonData())
+        
+        # eve was saved along with adam so tom doesn't need to wait :
+        eq_(MockBatchStorageMedium.batches, [['adam', 'eve'], ['seth', 'tom']])
+        stored = ldr.loaded[PersonData].meta._stored_objects
+        eq_(stored.get_object('seth').parent, stored.get_object('adam'))
+        eq_(stored.get_object('tom').parent, "Eve")
+
+    @attr(unit=True)
+    def test_streamed_rows_are_saved_in_chunks(self):
+        class Person(object):
+            def save(self): 
+                pass
+        class PersonMedium(MockBatchStorageMedium):
+            def primary_key(self, obj):
+                return [obj.name]
+        class PersonData(StreamingDataSet):
+            class Meta:
+                chunk_size = 2
+                primary_key = ['name']
+            def data(self):
+                for name in ('Adam', 'Bob', 'Cindy'):
+                    yield (name.lower(), dict(name=name))
+        
+        ldr = StubLoadableFixture(
+            style=NamedDataStyle(), medium=PersonMedium, env=locals())
+        ldr.begin()
+        ldr.load_dataset(PersonData())
+        
+        eq_(MockBatchStorageMedium.batches, [['adam', 'bob'], ['cindy']])
+        stored = ldr.loaded[PersonData].meta._stored_objects
+        eq_(stored.primary_keys, 
+            {'adam': ('Adam',), 'bob': ('Bob',), 'cindy': ('Cindy',)})
+        eq_(stored.get_object('cindy').name, "Cindy")
+
+    @attr(unit=True)
+    def test_rows_are_saved_one_by_one_without_batch_size(self):
+        class Person(object):
+            def save(self): 
+                pass
+        class PersonData(DataSet):
+            class adam:
+                name = "Adam"
+            class bob:
+                name = "Bob"
+        
+        ldr = StubLoadableFixture(
+            style=NamedDataStyle(), medium=MockBatchStorageMedium, 
+            env=locals())
+        ldr.begin()
+        ldr.load_dataset(PersonData())
+        
+        eq_(MockBatchStorageMedium.batches, [])
+        eq_(ldr.loaded[PersonData].meta._stored_objects.get_object('bob').name, 
+            "Bob")
+
+    @attr(unit=True)
+    def test_rows_are_saved_one_by_one_without_save_many(self):
+        saved = []
+        class Person(object):
+            def save(self):
+                if self.name == "Bob":
+                    raise ValueError("cannot save Bob")
+                saved.append(self.name)
+        class PersonData(DataSet):
+            class adam:
+                name = "Adam"
+            class bob:
+                name = "Bob"
+            class cindy:
+                name = "Cindy"
+
+        assert not MockStorageMedium(Person, PersonData()).can_save_many()
+        ldr = StubLoadableFixture(
+            style=NamedDataStyle(), medium=MockStorageMedium,
+            env=locals(), batch_size=10)
+        ldr.begin()
+        try:
+            ldr.load_dataset(PersonData())
+        except LoadError, e:
+            assert "with 'bob' of" in str(e), str(e)
+        else:
+            assert False, "expected LoadError"
+        # adam was saved before bob was read :
+        eq_(saved, ["Adam"])
+
+class TestBulkUnloading(object):
+    @attr(unit=True)
+    def test_stored_objects_are_cleared_with_clear_many(self):
+        cleared = []
+        class Person(object):
+            def save(self): 
+                pass
+        class PersonData(DataSet):
+            class bob:
+                name = "Bob"
+            class stacy:
+                name = "Stacy"
+        class ClearManyMedium(MockStorageMedium):
+            def clear(self, obj):
+                raise AssertionError("clear() should not be called")
+            def clear_many(self, objs):
+                cleared.append([obj.name for obj in objs])
+        
+        ldr = StubLoadableFixture(
+            style=NamedDataStyle(), medium=ClearManyMedium, env=locals())
+        data = ldr.data(PersonData)
+        data.setup()
+        data.teardown()
+        eq_(cleared, [["Bob", "Stacy"]])
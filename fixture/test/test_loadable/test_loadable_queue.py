@@ -2,8 +2,9 @@
 import sys
 import unittest
 from fixture.util import start_debug, stop_debug
-from fixture import DataSet
+from fixture import DataSet, StreamingDataSet, InMemoryFixture
 from fixture.loadable import EnvLoadableFixture
+from fixture.exc import CircularReferenceError
 import datetime
 
 class TestComplexLoadQueue(unittest.TestCase):
@@ -382,4 +383,173 @@ class TestComplexLoadQueue(unittest.TestCase):
         ds('OffersData').was_cleared_before(ds('ProductsData'))
         ds('ProductsData').was_cleared_before(ds('ClientsData'))
         ds('CampaignsData').was_cleared_before(ds('OffersData'))
-        
\ No newline at end of file
+        
+class TestLoadPlan(unittest.TestCase):
+    
+    def make_fixture(self, saved, attached=None, **kw):
+        if attached is None:
+            attached = []
+        class RecordingMedium(EnvLoadableFixture.StorageMediumAdapter):
+            def clear(self, obj): pass
+            def save(self, row, column_vals):
+                saved.append(self.dataset.__class__.__name__)
+                return row
+        class RecordingFixture(EnvLoadableFixture):
+            def attach_storage_medium(self, ds): 
+                attached.append(ds.__class__.__name__)
+                ds.meta.storage_medium = RecordingMedium(None, ds)
+            def rollback(self): pass
+            def commit(self): pass
+        return RecordingFixture(medium=RecordingMedium, **kw)
+    
+    def test_diamond_is_loaded_once_in_order(self):
+        class BottomData(DataSet):
+            class one:
+                id = 1
+        class LeftData(DataSet):
+            class one:
+                bottom = BottomData.one.ref('id')
+        class RightData(DataSet):
+            class one:
+                bottom = BottomData.one.ref('id')
+        class TopData(DataSet):
+            class one:
+                left = LeftData.one.ref('id')
+                right = RightData.one.ref('id')
+        
+        saved = []
+        fixture = self.make_fixture(saved)
+        plan = fixture.plan([TopData()])
+        self.assertEqual(
+            [(type(ds).__name__, level) for ds, level in plan],
+            [('BottomData', 3), ('LeftData', 2), ('RightData', 2), 
+             ('TopData', 1)])
+        
+        data = fixture.data(TopData, LeftData)
+        data.setup()
+        try:
+            self.assertEqual(saved, 
+                        ['BottomData', 'LeftData', 'RightData', 'TopData'])
+            self.assertEqual(
+                [type(ds).__name__ for ds in fixture.loaded.to_unload()],
+                ['TopData', 'LeftData', 'RightData', 'BottomData'])
+        finally:
+            data.teardown()
+    
+    def test_plans_are_cached_between_loads(self):
+        class BottomData(DataSet):
+            class one:
+                id = 1
+        class TopData(DataSet):
+            class one:
+                bottom = BottomData.one.ref('id')
+        
+        saved, attached = [], []
+        fixture = self.make_fixture(saved, attached)
+        for i in range(3):
+            data = fixture.data(TopData)
+            data.setup()
+            data.teardown()
+        self.assertEqual(saved, ['BottomData', 'TopData'] * 3)
+        self.assertEqual(attached, ['BottomData', 'TopData'])
+        self.assertEqual(fixture.plans.keys(), [(TopData,)])
+        plan = fixture.plans[(TopData,)]
+        self.assertEqual(plan.columns, {
+                    (BottomData, 'one'): ('id',), 
+                    (TopData, 'one'): ('bottom',)})
+        # no instances are kept after teardown :
+        self.assertEqual(plan.instances, {})
+    
+    def test_streamed_rows_do_not_grow_the_plan(self):
+        class PageData(DataSet):
+            class home:
+                path = '/'
+        class VisitData(StreamingDataSet):
+            class Meta:
+                references = [PageData]
+                chunk_size = 10
+            def data(self):
+                for i in range(visits[0]):
+                    yield ('visit_%s' % i, dict(
+                                    page_id=PageData.home.ref('id')))
+        
+        fixture = InMemoryFixture()
+        sizes = []
+        visits = [0]
+        for count in (20, 50):
+            visits[0] = count
+            data = fixture.data(VisitData)
+            data.setup()
+            data.teardown()
+            sizes.append(len(fixture.plans[(VisitData,)].columns))
+        self.assertEqual(sizes, [1, 1])
+    
+    def test_self_references_are_found_once(self):
+        class PersonData(DataSet):
+            class bob:
+                name = 'Bob'
+            class jenny:
+                name = 'Jenny'
+            jenny.friend = bob
+        class VisitData(StreamingDataSet):
+            def data(self):
+                raise AssertionError("streamed rows were read")
+        
+        plan = self.make_fixture([]).plan([PersonData(), VisitData()])
+        for ds, level in plan:
+            plan.refers_to_itself(ds)
+        self.assertEqual(plan.self_references, 
+                         {PersonData: True, VisitData: True})
+    
+    def test_plans_are_not_cached(self):
+        class OnlyData(DataSet):
+            class one:
+                id = 1
+        saved, attached = [], []
+        fixture = self.make_fixture(saved, attached, cache_plans=False)
+        for i in range(2):
+            data = fixture.data(OnlyData)
+            data.setup()
+            data.teardown()
+        self.assertEqual(attached, ['OnlyData', 'OnlyData'])
+        self.assertEqual(fixture.plans, {})
+    
+    def test_long_chains_do_not_recurse(self):
+        prev = None
+        chain = []
+        for i in range(sys.getrecursionlimit() * 2):
+            Meta = type('Meta', (), {'references': prev and [prev] or []})
+            prev = type('Chain%sData' % i, (DataSet,), {
+                            'Meta': Meta, 'row': type('row', (), {'id': i})})
+            chain.append(prev)
+        # keep construction of the shared instances non-recursive too :
+        for ds_class in chain:
+            ds_class.shared_instance()
+        plan = self.make_fixture([]).plan([chain[-1]()])
+        self.assertEqual(len(plan), len(chain))
+        self.assertEqual(
+            [type(ds) for ds, level in plan], chain)
+        self.assertEqual([level for ds, level in plan][0], len(chain))
+    
+    def test_circular_references_are_reported(self):
+        class AData(DataSet):
+            class Meta:
+                references = []
+            class one:
+                id = 1
+        class BData(DataSet):
+            class Meta:
+                references = [AData]
+            class one:
+                id = 1
+        AData.Meta.references = [BData]
+        
+        saved = []
+        fixture = self.make_fixture(saved)
+        try:
+            fixture.data(AData).setup()
+        except CircularReferenceError, e:
+            self.assert_("AData -> BData -> AData" in str(e), str(e))
+        else:
+            self.fail("expected CircularReferenceError")
+        self.assertEqual(saved, [])
@@ -1,12 +1,15 @@
 
+import os
 import unittest
 from nose.tools import eq_, raises
 from nose.exc import SkipTest
-from fixture import SQLAlchemyFixture
+from fixture import SQLAlchemyFixture, TempIO
 from fixture.dataset import MergedSuperSet
 from fixture import (
-    SQLAlchemyFixture, NamedDataStyle, CamelAndUndersStyle, TrimmedNameStyle)
-from fixture.exc import UninitializedError
+    SQLAlchemyFixture, NamedDataStyle, CamelAndUndersStyle, TrimmedNameStyle, 
+    ColumnarDataSet, StreamingDataSet, FactoryDataSet)
+from fixture.dataset.factory import Template, Pick
+from fixture.exc import UninitializedError, LoadError
 from fixture.test import conf, env_supports, attr
 from fixture.test.test_loadable import *
 from fixture.examples.db.sqlalchemy_examples import *
@@ -24,6 +27,39 @@ def setup():
 def teardown():
     pass
 
+class StatementCountingTest(object):
+    """Creates the example tables and mappers on an engine that keeps each 
+    statement it executes in self.statements"""
+    engine_options = {}
+
+    def setUp(self):
+        from sqlalchemy.interfaces import ConnectionProxy
+        statements = self.statements = []
+        class StatementCounter(ConnectionProxy):
+            def execute(self, conn, execute, clauseelement, *a, **kw):
+                statements.append(str(clauseelement).strip())
+                return execute(clauseelement, *a, **kw)
+        self.engine = create_engine(conf.LITE_DSN, proxy=StatementCounter(), 
+                                    **self.engine_options)
+        metadata.bind = self.engine
+        metadata.create_all()
+        clear_mappers()
+        setup_mappers()
+
+    def tearDown(self):
+        metadata.drop_all()
+        self.engine.dispose()
+        clear_mappers()
+
+    def inserts(self):
+        return [s for s in self.statements if s.startswith('INSERT')]
+
+    def rows(self, table, conn=None):
+        if conn is None:
+            conn = self.engine
+        return [tuple(r) for r in 
+                    conn.execute(table.select().order_by(table.c.id))]
+
 @raises(UninitializedError)
 def test_cannot_teardown_unloaded_fixture():
     class CategoryData(DataSet):
@@ -465,6 +501,939 @@ class TestTableObjects(unittest.TestCase):
         self.session.clear()
         eq_(self.session.execute(categories.select()).fetchall(), [])
 
+class TestBatchedTableObjects(unittest.TestCase):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+        class tvs:
+            id = 50
+            name = 'tvs'
+
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+        class spaceship:
+            name = 'spaceship'
+    # declared after the fact so that the refs point to the inner classes :
+    ProductData.truck.category_id = CategoryData.cars.ref('id')
+    ProductData.spaceship.category_id = CategoryData.tvs.ref('id')
+
+    def setUp(self):
+        self.engine = create_engine(conf.LITE_DSN)
+        metadata.bind = self.engine
+        metadata.create_all()
+        self.fixture = SQLAlchemyFixture(
+            env={'CategoryData': categories, 'ProductData': products},
+            engine=metadata.bind,
+            batch_size=2
+        )
+
+    def tearDown(self):
+        metadata.drop_all()
+        metadata.bind.dispose()
+
+    @attr(functional=1)
+    def test_setup_then_teardown(self):
+        data = self.fixture.data(self.ProductData)
+        data.setup()
+        try:
+            cats = self.engine.execute(
+                        categories.select().order_by(categories.c.id)).fetchall()
+            eq_([(c.id, c.name) for c in cats], 
+                [(1, 'cars'), (2, 'get free stuff'), (50, 'tvs')])
+            eq_(data.CategoryData.cars.id, 1)
+            eq_(data.CategoryData.free_stuff.name, 'get free stuff')
+
+            prods = self.engine.execute(
+                        products.select().order_by(products.c.name)).fetchall()
+            eq_([(p.name, p.category_id) for p in prods], 
+                [('spaceship', 50), ('truck', 1)])
+            eq_(data.ProductData.truck.category_id, 1)
+        finally:
+            data.teardown()
+        eq_(self.engine.execute(categories.select()).fetchall(), [])
+        eq_(self.engine.execute(products.select()).fetchall(), [])
+
+    @attr(functional=1)
+    def test_columnar_rows(self):
+        CategoryData = self.CategoryData
+        class ProductData(ColumnarDataSet):
+            def data(self):
+                for i in range(5):
+                    yield ('product_%s' % i, dict(
+                                name='product %s' % i, 
+                                category_id=CategoryData.tvs.ref('id')))
+        data = self.fixture.data(ProductData)
+        data.setup()
+        try:
+            prods = self.engine.execute(
+                        products.select().order_by(products.c.id)).fetchall()
+            eq_([(p.name, p.category_id) for p in prods], 
+                [('product %s' % i, 50) for i in range(5)])
+            eq_(data.ProductData.product_4.id, prods[-1].id)
+        finally:
+            data.teardown()
+        eq_(self.engine.execute(products.select()).fetchall(), [])
+
+    @attr(functional=1)
+    def test_streamed_rows(self):
+        CategoryData = self.CategoryData
+        class ProductData(StreamingDataSet):
+            class Meta:
+                references = [CategoryData]
+                chunk_size = 3
+            def data(self):
+                for i in range(7):
+                    yield ('product_%s' % i, dict(
+                                name='product %s' % i, 
+                                category_id=CategoryData.tvs.ref('id')))
+        self.fixture.batch_size = None
+        data = self.fixture.data(ProductData)
+        data.setup()
+        try:
+            prods = self.engine.execute(
+                        products.select().order_by(products.c.id)).fetchall()
+            eq_([(p.name, p.category_id) for p in prods], 
+                [('product %s' % i, 50) for i in range(7)])
+            eq_(data.ProductData.product_6.id, prods[-1].id)
+            eq_(data.ProductData.product_6.name, 'product 6')
+        finally:
+            data.teardown()
+        eq_(self.engine.execute(products.select()).fetchall(), [])
+
+    @attr(functional=1)
+    def test_factory_rows(self):
+        CategoryData = self.CategoryData
+        class ProductData(FactoryDataSet):
+            class Meta:
+                rows = 20
+                generators = dict(
+                    name=Template('product %(n)s'),
+                    category_id=Pick(CategoryData, 'id'))
+        data = self.fixture.data(ProductData)
+        data.setup()
+        try:
+            prods = self.engine.execute(
+                        products.select().order_by(products.c.id)).fetchall()
+            eq_([p.name for p in prods], 
+                ['product %s' % i for i in range(1, 21)])
+            eq_(set([p.category_id for p in prods]), set([1, 2, 50]))
+            eq_(data.ProductData.row_20.id, prods[-1].id)
+            eq_(data.ProductData.row_20.category_id, prods[-1].category_id)
+        finally:
+            data.teardown()
+        eq_(self.engine.execute(products.select()).fetchall(), [])
+
+    @attr(unit=1)
+    def test_batches_need_a_batch_size(self):
+        medium = TableMedium(categories, self.CategoryData())
+        medium.visit_loader(SQLAlchemyFixture(engine=self.engine))
+        assert not medium.can_save_many()
+        medium.visit_loader(self.fixture)
+        assert medium.can_save_many()
+
+    @attr(functional=1)
+    def test_autoincrement_keys_are_not_reused(self):
+        meta = MetaData(bind=self.engine)
+        tags = Table("fixture_sqlalchemy_counted_tag", meta,
+            Column("id", Integer, primary_key=True),
+            Column("name", String(20)),
+            sqlite_autoincrement=True)
+        meta.create_all()
+        try:
+            self.engine.execute(tags.insert(), [{'name': 'old'}] * 3)
+            self.engine.execute(tags.delete())
+            class TagData(DataSet):
+                class red:
+                    name = 'red'
+                class blue:
+                    name = 'blue'
+            fixture = SQLAlchemyFixture(env={'TagData': tags}, 
+                                        engine=self.engine, batch_size=10)
+            data = fixture.data(TagData)
+            data.setup()
+            try:
+                eq_(sorted([t.id for t in self.engine.execute(tags.select())]), 
+                    [4, 5])
+            finally:
+                data.teardown()
+        finally:
+            meta.drop_all()
+
+class TestParallelTableObjects(unittest.TestCase):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+
+    class AuthorData(DataSet):
+        class frank_herbert:
+            first_name = 'Frank'
+            last_name = 'Herbert'
+
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+
+    class BookData(DataSet):
+        class dune:
+            title = 'Dune'
+    # declared after the fact so that the refs point to the inner classes :
+    ProductData.truck.category_id = CategoryData.cars.ref('id')
+    BookData.dune.author_id = AuthorData.frank_herbert.ref('id')
+
+    def setUp(self):
+        # each worker needs its own connection to the same database :
+        self.tmp = TempIO()
+        self.engine = create_engine('sqlite:///%s' % self.tmp.join('tmp.db'))
+        metadata.bind = self.engine
+        metadata.create_all()
+        self.fixture = SQLAlchemyFixture(
+            env={'CategoryData': categories, 'ProductData': products, 
+                 'AuthorData': authors, 'BookData': books},
+            engine=self.engine,
+            workers=2
+        )
+
+    def tearDown(self):
+        metadata.drop_all()
+        self.engine.dispose()
+        del self.tmp
+
+    def count_rows(self):
+        return [len(self.engine.execute(t.select()).fetchall()) 
+                            for t in (categories, products, authors, books)]
+
+    @attr(functional=1)
+    def test_setup_then_teardown(self):
+        data = self.fixture.data(self.ProductData, self.BookData)
+        data.setup()
+        try:
+            eq_(self.count_rows(), [2, 1, 1, 1])
+            prods = self.engine.execute(products.select()).fetchall()
+            eq_([(p.name, p.category_id) for p in prods], 
+                [('truck', data.CategoryData.cars.id)])
+            books_ = self.engine.execute(books.select()).fetchall()
+            eq_([(b.title, b.author_id) for b in books_], 
+                [('Dune', data.AuthorData.frank_herbert.id)])
+        finally:
+            data.teardown()
+        eq_(self.count_rows(), [0, 0, 0, 0])
+
+    @attr(functional=1)
+    def test_failed_level_unloads_everything(self):
+        class BrokenBookData(DataSet):
+            class Meta:
+                storable = books
+            class dune:
+                id = 1
+                title = 'Dune'
+            class dune_messiah:
+                # duplicate primary key :
+                id = 1
+                title = 'Dune Messiah'
+        BrokenBookData.dune.author_id = \
+                                self.AuthorData.frank_herbert.ref('id')
+        data = self.fixture.data(self.ProductData, BrokenBookData)
+        try:
+            data.setup()
+        except Exception, e:
+            pass
+        else:
+            self.fail("expected an error from loading BrokenBookData")
+        eq_(self.count_rows(), [0, 0, 0, 0])
+
+    @attr(functional=1)
+    def test_failed_unload_is_raised(self):
+        class BrokenBookData(DataSet):
+            class Meta:
+                storable = books
+            class dune:
+                id = 1
+                title = 'Dune'
+            class dune_messiah:
+                # duplicate primary key :
+                id = 1
+                title = 'Dune Messiah'
+        BrokenBookData.dune.author_id = \
+                                self.AuthorData.frank_herbert.ref('id')
+        unload = self.fixture.unload
+        def broken_unload():
+            raise RuntimeError("cannot unload")
+        self.fixture.unload = broken_unload
+        data = self.fixture.data(self.ProductData, BrokenBookData)
+        try:
+            data.setup()
+        except RuntimeError, e:
+            eq_(str(e), "cannot unload")
+        else:
+            self.fail("expected the error from unloading")
+        unload()
+
+class TestTransactionalTeardown(StatementCountingTest, unittest.TestCase):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+            category = CategoryData.cars
+
+    # pysqlite only gets out of the way of SAVEPOINTs like this :
+    engine_options = {'connect_args': {'isolation_level': None}}
+
+    def setUp(self):
+        StatementCountingTest.setUp(self)
+        self.fixture = SQLAlchemyFixture(
+            env={'CategoryData': Category, 'ProductData': Product},
+            engine=self.engine,
+            transactional=True
+        )
+
+    def tearDown(self):
+        self.fixture.dispose()
+        StatementCountingTest.tearDown(self)
+
+    def count_rows(self):
+        return [len(self.rows(t, conn=self.fixture.connection)) 
+                                        for t in (categories, products)]
+
+    @attr(functional=1)
+    def test_teardown_rolls_back_to_savepoint(self):
+        for i in range(2):
+            data = self.fixture.data(self.ProductData)
+            data.setup()
+            eq_(self.count_rows(), [2, 1])
+            eq_(data.ProductData.truck.category_id, data.CategoryData.cars.id)
+            # objects stored by the test are rolled back :
+            self.fixture.connection.execute(
+                            categories.insert(), {'name': 'from the test'})
+            data.teardown()
+            # ...but the data stays loaded for the next test :
+            eq_(self.count_rows(), [2, 1])
+        self.fixture.discard_kept_load()
+        eq_(self.count_rows(), [0, 0])
+
+    @attr(functional=1)
+    def test_data_is_loaded_once(self):
+        counts = []
+        for i in range(2):
+            del self.statements[:]
+            data = self.fixture.data(self.ProductData)
+            data.setup()
+            try:
+                counts.append(len(self.inserts()))
+                eq_(data.ProductData.truck.category.name, 'cars')
+                eq_(data.CategoryData.free_stuff.name, 'get free stuff')
+            finally:
+                data.teardown()
+        eq_(counts, [3, 0])
+        # other datasets replace the data :
+        data = self.fixture.data(self.CategoryData)
+        data.setup()
+        try:
+            eq_(self.count_rows(), [2, 0])
+        finally:
+            data.teardown()
+
+    @attr(functional=1)
+    def test_failed_reuse_discards_the_kept_load(self):
+        data = self.fixture.data(self.ProductData)
+        data.setup()
+        data.teardown()
+        # the truck can't be found again :
+        self.fixture.connection.execute(products.delete())
+        data = self.fixture.data(self.ProductData)
+        try:
+            data.setup()
+        except LoadError:
+            pass
+        else:
+            self.fail("expected a LoadError")
+        eq_(self.fixture.kept_load, None)
+        data = self.fixture.data(self.ProductData)
+        data.setup()
+        try:
+            eq_(self.count_rows(), [2, 1])
+        finally:
+            data.teardown()
+
+    @attr(functional=1)
+    def test_nothing_is_deleted(self):
+        data = self.fixture.data(self.CategoryData)
+        data.setup()
+        def clear_many(objs):
+            raise AssertionError("clear_many() should not be called")
+        data.CategoryData.meta.storage_medium.clear_many = clear_many
+        data.teardown()
+        eq_(self.count_rows(), [2, 0])
+        self.fixture.discard_kept_load()
+        eq_(self.count_rows(), [0, 0])
+
+    @raises(ValueError)
+    @attr(unit=1)
+    def test_cannot_use_workers(self):
+        SQLAlchemyFixture(engine=self.engine, transactional=True, workers=2)
+
+class TestBulkDelete(unittest.TestCase):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+            category = CategoryData.cars
+        class spaceship:
+            name = 'spaceship'
+            category = CategoryData.free_stuff
+
+    def setUp(self):
+        self.engine = create_engine(conf.LITE_DSN)
+        metadata.bind = self.engine
+        metadata.create_all()
+        self.composite_meta = MetaData(bind=self.engine)
+        self.tags = Table("fixture_sqlalchemy_tag", self.composite_meta,
+            Column("owner", String(20), primary_key=True),
+            Column("name", String(20), primary_key=True))
+        self.composite_meta.create_all()
+        clear_mappers()
+        setup_mappers()
+
+    def tearDown(self):
+        self.composite_meta.drop_all()
+        metadata.drop_all()
+        self.engine.dispose()
+        clear_mappers()
+
+    def forbid_clear(self, data, *datasets):
+        def clear(obj):
+            raise AssertionError("%s was deleted one by one" % obj)
+        for ds in datasets:
+            getattr(data, ds).meta.storage_medium.clear = clear
+
+    @attr(functional=1)
+    def test_mapped_objects(self):
+        fixture = SQLAlchemyFixture(
+            env={'CategoryData': Category, 'ProductData': Product},
+            engine=self.engine)
+        data = fixture.data(self.ProductData)
+        data.setup()
+        self.forbid_clear(data, 'CategoryData', 'ProductData')
+        data.teardown()
+        eq_(self.engine.execute(categories.select()).fetchall(), [])
+        eq_(self.engine.execute(products.select()).fetchall(), [])
+        eq_(list(fixture.session), [])
+
+    @attr(functional=1)
+    def test_composite_keys_in_chunks(self):
+        class TagData(DataSet):
+            class red:
+                owner = 'kumar'
+                name = 'red'
+            class blue:
+                owner = 'kumar'
+                name = 'blue'
+            class blue_too:
+                owner = 'harold'
+                name = 'blue'
+        fixture = SQLAlchemyFixture(env={'TagData': self.tags}, 
+                                    engine=self.engine)
+        data = fixture.data(TagData)
+        data.setup()
+        eq_(len(self.engine.execute(self.tags.select()).fetchall()), 3)
+        self.forbid_clear(data, 'TagData')
+        # two keys per statement :
+        data.TagData.meta.storage_medium.delete_chunk_size = 4
+        data.teardown()
+        eq_(self.engine.execute(self.tags.select()).fetchall(), [])
+
+    @attr(unit=1)
+    def test_statements(self):
+        stmts = [str(stmt) for stmt in bulk_delete_statements(
+                    categories, [categories.c.id], [[1], [2], [3]], 
+                    chunk_size=2)]
+        eq_(len(stmts), 2)
+        assert " IN " in stmts[0], stmts[0]
+        
+        keys = [('kumar', 'red'), ('kumar', 'blue')]
+        stmts = [str(stmt) for stmt in bulk_delete_statements(
+                    self.tags, self.tags.primary_key, keys)]
+        eq_(len(stmts), 1)
+        assert " OR " in stmts[0], stmts[0]
+        
+        from sqlalchemy.dialects import postgresql
+        stmts = [str(stmt.compile(dialect=postgresql.dialect())) 
+                    for stmt in bulk_delete_statements(
+                        self.tags, self.tags.primary_key, keys, tuple_in=True)]
+        assert ") IN ((" in stmts[0], stmts[0]
+
+class TestTruncateTeardown(unittest.TestCase):
+    class CategoryData(DataSet):
+        class Meta:
+            teardown = 'truncate'
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+            category = CategoryData.cars
+
+    def setUp(self):
+        self.engine = create_engine(conf.LITE_DSN)
+        metadata.bind = self.engine
+        metadata.create_all()
+        clear_mappers()
+        setup_mappers()
+
+    def tearDown(self):
+        metadata.drop_all()
+        self.engine.dispose()
+        clear_mappers()
+
+    def rows(self, table):
+        return self.engine.execute(table.select()).fetchall()
+
+    @attr(functional=1)
+    def test_dataset_meta(self):
+        fixture = SQLAlchemyFixture(
+            env={'CategoryData': categories, 'ProductData': products},
+            engine=self.engine)
+        class ProductData(DataSet):
+            class truck:
+                name = 'truck'
+                category_id = self.CategoryData.cars.ref('id')
+        data = fixture.data(ProductData)
+        data.setup()
+        # not part of the dataset but wiped all the same :
+        self.engine.execute(categories.insert(), {'name': 'tvs'})
+        eq_(len(self.rows(categories)), 3)
+        def clear_many(objs):
+            raise AssertionError("clear_many() should not be called")
+        data.CategoryData.meta.storage_medium.clear_many = clear_many
+        data.teardown()
+        eq_(self.rows(categories), [])
+        eq_(self.rows(products), [])
+
+    @attr(functional=1)
+    def test_fixture_setting(self):
+        fixture = SQLAlchemyFixture(
+            env={'CategoryData': Category, 'ProductData': Product},
+            engine=self.engine, teardown='truncate')
+        data = fixture.data(self.ProductData)
+        data.setup()
+        self.engine.execute(products.insert(), {'name': 'spaceship'})
+        data.teardown()
+        eq_(self.rows(categories), [])
+        eq_(self.rows(products), [])
+        eq_(list(fixture.session), [])
+
+    @attr(functional=1)
+    def test_autoincrement_is_reset(self):
+        meta = MetaData(bind=self.engine)
+        tags = Table("fixture_sqlalchemy_counted_tag", meta,
+            Column("id", Integer, primary_key=True),
+            Column("name", String(20)),
+            sqlite_autoincrement=True)
+        meta.create_all()
+        try:
+            class TagData(DataSet):
+                class Meta:
+                    teardown = 'truncate'
+                class red:
+                    name = 'red'
+            fixture = SQLAlchemyFixture(env={'TagData': tags}, 
+                                        engine=self.engine)
+            data = fixture.data(TagData)
+            data.setup()
+            eq_([(t.id, t.name) for t in self.rows(tags)], [(1, 'red')])
+            data.teardown()
+            # AUTOINCREMENT never reuses an id unless it was reset :
+            self.engine.execute(tags.insert(), {'name': 'blue'})
+            eq_([(t.id, t.name) for t in self.rows(tags)], [(1, 'blue')])
+        finally:
+            meta.drop_all()
+
+    @raises(ValueError)
+    @attr(unit=1)
+    def test_unknown_strategy(self):
+        SQLAlchemyFixture(engine=self.engine, teardown='drop')
+
+class TestRowHydration(unittest.TestCase):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+        class tvs:
+            name = 'tvs'
+
+    def setUp(self):
+        from sqlalchemy.interfaces import ConnectionProxy
+        selects = self.selects = []
+        class SelectCounter(ConnectionProxy):
+            def execute(self, conn, execute, clauseelement, *a, **kw):
+                if str(clauseelement).strip().startswith('SELECT'):
+                    selects.append(clauseelement)
+                return execute(clauseelement, *a, **kw)
+        self.engine = create_engine(conf.LITE_DSN, proxy=SelectCounter())
+        metadata.bind = self.engine
+        metadata.create_all()
+
+    def tearDown(self):
+        metadata.drop_all()
+        self.engine.dispose()
+
+    def load(self, **kw):
+        fixture = SQLAlchemyFixture(env={'CategoryData': categories}, 
+                                    engine=self.engine, batch_size=10, **kw)
+        data = fixture.data(self.CategoryData)
+        data.setup()
+        return data
+
+    @attr(functional=1)
+    def test_lazy(self):
+        data = self.load()
+        try:
+            # ignoring the SELECT that allocates primary keys :
+            del self.selects[:]
+            # id is not declared so it comes from the loaded row :
+            eq_(data.CategoryData.tvs.id, 3)
+            eq_(len(self.selects), 1)
+            eq_(data.CategoryData.cars.id, 1)
+            eq_(data.CategoryData.free_stuff.id, 2)
+            eq_(len(self.selects), 1)
+        finally:
+            data.teardown()
+
+    @attr(functional=1)
+    def test_eager(self):
+        data = self.load(hydration='eager')
+        try:
+            # the ones that allocate primary keys and one to fetch the rows :
+            fetched = [s for s in self.selects if ' IN (' in str(s)]
+            eq_(len(fetched), 1)
+            selected = len(self.selects)
+            eq_(sorted([data.CategoryData.cars.id, 
+                        data.CategoryData.free_stuff.id, 
+                        data.CategoryData.tvs.id]), [1, 2, 3])
+            eq_(len(self.selects), selected)
+        finally:
+            data.teardown()
+
+    @attr(functional=1)
+    def test_composite_keys_in_chunks(self):
+        from fixture.loadable.sqlalchemy_loadable import (
+                                        TableRowHydrator, LoadedTableRow)
+        meta = MetaData(bind=self.engine)
+        pairs = Table("fixture_sqlalchemy_hydrated_pair", meta,
+            Column("a", Integer, primary_key=True),
+            Column("b", Integer, primary_key=True),
+            Column("name", String(20)))
+        meta.create_all()
+        try:
+            self.engine.execute(pairs.insert(), 
+                [{'a': i, 'b': i * 2, 'name': 'pair %s' % i} 
+                                                    for i in range(5)])
+            del self.selects[:]
+            hydrator = TableRowHydrator(pairs, None)
+            hydrator.chunk_size = 4
+            loaded = []
+            for i in range(5):
+                row = LoadedTableRow(pairs, [i, i * 2], None, 
+                                     hydrator=hydrator)
+                hydrator.add(row)
+                loaded.append(row)
+            eq_([r.name for r in loaded], ['pair %s' % i for i in range(5)])
+            # 2 keys of 2 columns per SELECT :
+            eq_(len(self.selects), 3)
+        finally:
+            meta.drop_all()
+
+    @raises(ValueError)
+    @attr(unit=1)
+    def test_unknown_hydration(self):
+        SQLAlchemyFixture(engine=self.engine, hydration='never')
+
+class TestSnapshots(unittest.TestCase):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+            category = CategoryData.cars
+
+    def setUp(self):
+        self.engine = create_engine(conf.LITE_DSN)
+        metadata.bind = self.engine
+        metadata.create_all()
+        self.fixture = SQLAlchemyFixture(
+            env={'CategoryData': categories, 'ProductData': products},
+            engine=self.engine)
+
+    def tearDown(self):
+        # snapshot data stays loaded until the fixture is disposed :
+        self.fixture.dispose()
+        metadata.drop_all()
+        self.engine.dispose()
+
+    def rows(self, table):
+        return [tuple(r) for r in 
+                    self.engine.execute(table.select().order_by(table.c.id))]
+
+    def check_restore(self, snapshot):
+        loaded = self.rows(categories), self.rows(products)
+        eq_([r[1] for r in loaded[0]], ['cars', 'get free stuff'])
+        self.engine.execute(categories.update(), {'name': 'changed'})
+        self.engine.execute(products.delete())
+        self.engine.execute(categories.insert(), {'name': 'tvs'})
+        data = snapshot.restore()
+        eq_((self.rows(categories), self.rows(products)), loaded)
+        eq_(data.ProductData.truck.name, 'truck')
+
+    @attr(functional=1)
+    def test_restore(self):
+        self.check_restore(
+                self.fixture.snapshot(self.CategoryData, self.ProductData))
+
+    @attr(functional=1)
+    def test_restore_from_template(self):
+        tmp = TempIO()
+        template = tmp.join('snapshot.db')
+        snapshot = self.fixture.snapshot(self.CategoryData, self.ProductData, 
+                                         template=template)
+        assert os.path.exists(template)
+        self.check_restore(snapshot)
+
+    @attr(functional=1)
+    def test_snapshots_are_kept_by_content(self):
+        snapshot = self.fixture.snapshot(self.CategoryData)
+        assert self.fixture.snapshot(self.CategoryData) is snapshot
+        eq_(len(self.rows(categories)), 2)
+        class CategoryData(DataSet):
+            class cars:
+                name = 'cars'
+            class free_stuff:
+                name = 'get free stuff'
+        # same name, same rows :
+        CategoryData.__module__ = self.CategoryData.__module__
+        assert self.fixture.snapshot(CategoryData) is not snapshot
+        eq_(self.fixture.content_hash([CategoryData]), 
+            self.fixture.content_hash([self.CategoryData]))
+        class CategoryData(DataSet):
+            class cars:
+                name = 'sports cars'
+        CategoryData.__module__ = self.CategoryData.__module__
+        assert (self.fixture.content_hash([CategoryData]) != 
+                self.fixture.content_hash([self.CategoryData]))
+
+    @raises(ValueError)
+    @attr(unit=1)
+    def test_only_sqlite(self):
+        class dialect:
+            name = 'postgres'
+        class engine:
+            pass
+        engine.dialect = dialect
+        SQLAlchemyFixture(engine=engine).snapshot(self.CategoryData)
+
+class TestCachedLoads(StatementCountingTest, unittest.TestCase):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+            category_id = CategoryData.cars.ref('id')
+
+    def tearDown(self):
+        from fixture.dataset import dataset_registry
+        # the data of the last load stays loaded :
+        dataset_registry.clear()
+        self.engine.execute("DROP TABLE IF EXISTS fixture_load_marker")
+        StatementCountingTest.tearDown(self)
+
+    def load(self, *datasets, **env):
+        # a new fixture, as in the next test run :
+        from fixture.dataset import dataset_registry
+        dataset_registry.clear()
+        Session.remove()
+        if not env:
+            env = {'CategoryData': categories, 'ProductData': products}
+        fixture = SQLAlchemyFixture(env=env, engine=self.engine, 
+                                    cache_loads=True)
+        data = fixture.data(*datasets)
+        data.setup()
+        return data
+
+    def product_inserts(self):
+        return [i for i in self.inserts() if products.name in i]
+
+    @attr(functional=1)
+    def test_unchanged_datasets_are_reused(self):
+        self.load(self.ProductData)
+        loaded = self.rows(categories), self.rows(products)
+        del self.statements[:]
+        data = self.load(self.ProductData)
+        eq_(self.inserts(), [])
+        eq_((self.rows(categories), self.rows(products)), loaded)
+        eq_(data.ProductData.truck.category_id, data.CategoryData.cars.id)
+        eq_(data.CategoryData.free_stuff.name, 'get free stuff')
+
+    @attr(functional=1)
+    def test_mapped_classes_are_reused(self):
+        env = {'CategoryData': Category, 'ProductData': Product}
+        class ProductData(DataSet):
+            class truck:
+                name = 'truck'
+                category = self.CategoryData.cars
+        self.load(ProductData, **env)
+        del self.statements[:]
+        data = self.load(ProductData, **env)
+        eq_(self.inserts(), [])
+        eq_(data.ProductData.truck.category.name, 'cars')
+        eq_(len(self.rows(products)), 1)
+
+    @attr(functional=1)
+    def test_changed_datasets_are_loaded_again(self):
+        self.load(self.ProductData)
+        class ProductData(DataSet):
+            class truck:
+                name = 'monster truck'
+                category_id = self.CategoryData.cars.ref('id')
+        ProductData.__module__ = self.ProductData.__module__
+        categories_loaded = self.rows(categories)
+        del self.statements[:]
+        self.load(ProductData)
+        eq_(len(self.product_inserts()), 1)
+        eq_(len(self.inserts()), 2) # and the new marker
+        eq_(self.rows(categories), categories_loaded)
+        eq_([r[1] for r in self.rows(products)], ['monster truck'])
+
+    @attr(functional=1)
+    def test_changes_are_passed_on_to_what_references_them(self):
+        self.load(self.ProductData)
+        class CategoryData(DataSet):
+            class cars:
+                name = 'fast cars'
+        CategoryData.__module__ = self.CategoryData.__module__
+        class ProductData(DataSet):
+            class truck:
+                name = 'truck'
+                category_id = CategoryData.cars.ref('id')
+        ProductData.__module__ = self.ProductData.__module__
+        data = self.load(ProductData)
+        eq_([r[1] for r in self.rows(categories)], ['fast cars'])
+        eq_(len(self.rows(products)), 1)
+        eq_(data.ProductData.truck.category_id, data.CategoryData.cars.id)
+
+    @attr(functional=1)
+    def test_teardown_keeps_loads(self):
+        fixture = SQLAlchemyFixture(
+                    env={'CategoryData': categories, 'ProductData': products}, 
+                    engine=self.engine, cache_loads=True)
+        data = fixture.data(self.ProductData)
+        data.setup()
+        loaded = self.rows(categories), self.rows(products)
+        data.teardown()
+        eq_(self.engine.execute(
+                    "SELECT COUNT(*) FROM fixture_load_marker").scalar(), 2)
+        del self.statements[:]
+        data = fixture.data(self.ProductData)
+        data.setup()
+        try:
+            eq_(self.inserts(), [])
+            eq_((self.rows(categories), self.rows(products)), loaded)
+            eq_(data.ProductData.truck.category_id, data.CategoryData.cars.id)
+        finally:
+            data.teardown()
+        eq_((self.rows(categories), self.rows(products)), loaded)
+
+    @raises(ValueError)
+    @attr(unit=1)
+    def test_not_in_transactional_mode(self):
+        SQLAlchemyFixture(engine=self.engine, cache_loads=True, 
+                          transactional=True)
+
+class TestReplayedLoads(StatementCountingTest, unittest.TestCase):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+            category_id = CategoryData.cars.ref('id')
+        class spaceship:
+            name = 'spaceship'
+            category_id = CategoryData.free_stuff.ref('id')
+
+    @attr(functional=1)
+    def test_replay(self):
+        fixture = SQLAlchemyFixture(
+            env={'CategoryData': categories, 'ProductData': products},
+            engine=self.engine, replay=True, batch_size=10)
+        data = fixture.data(self.ProductData)
+        data.setup()
+        loaded = self.rows(categories), self.rows(products)
+        data.teardown()
+        eq_(len(fixture.load_scripts), 1)
+        del self.statements[:]
+        data = fixture.data(self.ProductData)
+        data.setup()
+        try:
+            # executed by the DB-API connection itself :
+            eq_(self.statements, [])
+            eq_((self.rows(categories), self.rows(products)), loaded)
+            eq_(data.ProductData.spaceship.category_id, 
+                data.CategoryData.free_stuff.id)
+            eq_(data.CategoryData.cars.name, 'cars')
+        finally:
+            data.teardown()
+        eq_(self.rows(categories), [])
+        eq_(self.rows(products), [])
+
+    @attr(functional=1)
+    def test_mapped_classes_are_not_replayed(self):
+        fixture = SQLAlchemyFixture(
+            env={'CategoryData': Category, 'ProductData': products},
+            engine=self.engine, replay=True)
+        data = fixture.data(self.ProductData)
+        data.setup()
+        data.teardown()
+        eq_(fixture.load_scripts, {})
+        data = fixture.data(self.ProductData)
+        data.setup()
+        try:
+            eq_(len(self.rows(products)), 2)
+        finally:
+            data.teardown()
+
+    @raises(ValueError)
+    @attr(unit=1)
+    def test_not_in_cache_loads_mode(self):
+        SQLAlchemyFixture(engine=self.engine, replay=True, cache_loads=True)
+
 class TestTableObjectsExplicitConn(object):
     class CategoryData(DataSet):
         class cars:
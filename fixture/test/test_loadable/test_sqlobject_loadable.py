@@ -138,4 +138,124 @@ class TestSQLObjectFixtureCascadeAsRefInheritWithHeavyDB(
         HavingRefInheritedOfferProduct, SQLObjectFixtureCascadeTestWithHeavyDB, 
         LoadableTest):
     pass
-            
\ No newline at end of file
+            
+class SQLObjectBulkTest(SQLObjectFixtureCascadeTest):
+    fixture = SQLObjectFixture(
+                        style=( NamedDataStyle() + CamelAndUndersStyle()),
+                        dsn=conf.LITE_DSN, env=globals(), 
+                        use_transaction=True, bulk=True,
+                        dataclass=MergedSuperSet )
+
+class TestSQLObjectBulkCascade(
+        HavingOfferProductData, SQLObjectBulkTest, LoadableTest):
+    pass
+class TestSQLObjectBulkCascadeAsType(
+        HavingOfferProductAsDataType, SQLObjectBulkTest, LoadableTest):
+    pass
+class TestSQLObjectBulkCascadeAsRef(
+        HavingReferencedOfferProduct, SQLObjectBulkTest, LoadableTest):
+    pass
+
+class TestSQLObjectBulkInsert(SQLObjectFixtureTest):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+        class tvs:
+            id = 50
+            name = 'tvs'
+
+    def test_one_insert_per_dataset(self):
+        # without a transaction so that all queries go through self.conn :
+        fixture = SQLObjectFixture(env={'CategoryData': Category}, 
+                                   connection=self.conn, bulk=True, 
+                                   use_transaction=False)
+        queries = []
+        query = self.conn.query
+        def counting_query(sql):
+            queries.append(sql)
+            return query(sql)
+        self.conn.query = counting_query
+        try:
+            data = fixture.data(self.CategoryData)
+            data.setup()
+        finally:
+            del self.conn.query
+        try:
+            inserts = [q for q in queries if q.startswith('INSERT')]
+            eq_(len(inserts), 1)
+            # new ids come after the ones given :
+            eq_(sorted([(c.id, c.name) for c in Category.select()]), 
+                [(50, 'tvs'), (51, 'cars'), (52, 'get free stuff')])
+            eq_(data.CategoryData.tvs.id, 50)
+            eq_(data.CategoryData.free_stuff.id, 52)
+        finally:
+            data.teardown()
+        eq_(Category.select().count(), 0)
+
+    def test_load_transaction_is_closed(self):
+        fixture = SQLObjectFixture(env={'CategoryData': Category}, 
+                                   connection=self.conn, bulk=True, 
+                                   use_transaction=True)
+        data = fixture.data(self.CategoryData)
+        data.setup()
+        try:
+            # an open transaction would roll back whatever is going on in 
+            # the connection when it is garbage collected :
+            assert fixture.transaction._obsolete
+        finally:
+            data.teardown()
+        eq_(Category.select().count(), 0)
+
+    def test_load_transaction_is_kept_without_bulk(self):
+        fixture = SQLObjectFixture(env={'CategoryData': Category}, 
+                                   connection=self.conn, use_transaction=True)
+        data = fixture.data(self.CategoryData)
+        data.setup()
+        try:
+            transaction = fixture.transaction
+            assert not transaction._obsolete
+            obj = data.CategoryData.meta._stored_objects.get_object('tvs')
+            assert obj._connection is transaction
+        finally:
+            data.teardown()
+        eq_(Category.select().count(), 0)
+
+    def test_loaded_objects_can_be_changed(self):
+        fixture = SQLObjectFixture(env={'CategoryData': Category}, 
+                                   connection=self.conn, bulk=True, 
+                                   use_transaction=True)
+        data = fixture.data(self.CategoryData)
+        data.setup()
+        try:
+            tvs = Category.get(data.CategoryData.tvs.id)
+            obj = data.CategoryData.meta._stored_objects.get_object('tvs')
+            obj.name = 'televisions'
+            tvs.sync()
+            eq_(tvs.name, 'televisions')
+        finally:
+            data.teardown()
+        eq_(Category.select().count(), 0)
+
+    def test_teardown_deletes_in_chunks(self):
+        class ChunkedMedium(SQLObjectFixture.Medium):
+            delete_chunk_size = 2
+        fixture = SQLObjectFixture(env={'CategoryData': Category}, 
+                                   connection=self.conn, bulk=True, 
+                                   medium=ChunkedMedium, 
+                                   use_transaction=False)
+        data = fixture.data(self.CategoryData)
+        data.setup()
+        queries = []
+        query = self.conn.query
+        def counting_query(sql):
+            queries.append(sql)
+            return query(sql)
+        self.conn.query = counting_query
+        try:
+            data.teardown()
+        finally:
+            del self.conn.query
+        eq_(len([q for q in queries if q.startswith('DELETE')]), 2)
+        eq_(Category.select().count(), 0)
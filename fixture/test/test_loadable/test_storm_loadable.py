@@ -149,3 +149,136 @@ class TestStormFixtureCascadeAsRefInheritWithHeavyDB(
         LoadableTest):
     pass
             
+
+class StormDeferredFlushTest(StormFixtureCascadeTest):
+    flush_every = 'dataset'
+
+    def setUp(self, dsn=conf.LITE_DSN):
+        self.fixture = StormFixture(
+                        style=( NamedDataStyle() + CamelAndUndersStyle()),
+                        env=globals(), use_transaction=True, 
+                        dataclass=MergedSuperSet, 
+                        flush_every=self.flush_every)
+        StormFixtureCascadeTest.setUp(self, dsn=dsn)
+
+class TestStormFixtureFlushedPerDataset(
+        HavingOfferProductData, StormDeferredFlushTest, LoadableTest):
+    pass
+class TestStormFixtureFlushedPerDatasetAsRef(
+        HavingReferencedOfferProduct, StormDeferredFlushTest, LoadableTest):
+    pass
+class TestStormFixtureFlushedPerLevel(
+        HavingOfferProductData, StormDeferredFlushTest, LoadableTest):
+    flush_every = 'level'
+class TestStormFixtureFlushedPerLevelAsRef(
+        HavingReferencedOfferProduct, StormDeferredFlushTest, LoadableTest):
+    flush_every = 'level'
+
+class TestStormDeferredFlush(StormFixtureTest):
+    class CategoryData(DataSet):
+        class cars:
+            name = 'cars'
+        class free_stuff:
+            name = 'get free stuff'
+    
+    class ProductData(DataSet):
+        class truck:
+            name = 'truck'
+        class spaceship:
+            name = 'spaceship'
+    # generated keys are only known once the categories are flushed :
+    ProductData.truck.category_id = CategoryData.cars.ref('id')
+    ProductData.spaceship.category_id = CategoryData.free_stuff.ref('id')
+
+    def load(self, flush_every):
+        fixture = StormFixture(env={'CategoryData': Category, 
+                                    'ProductData': Product}, 
+                               store=self.store, flush_every=flush_every)
+        flushes = []
+        flush = self.store.flush
+        def counting_flush():
+            flushes.append(1)
+            return flush()
+        self.store.flush = counting_flush
+        try:
+            data = fixture.data(self.ProductData)
+            data.setup()
+        finally:
+            del self.store.flush
+        # not counting the flush of the commit :
+        return data, len(flushes) - 1
+
+    def assert_categorized(self, data):
+        for product, category in [(data.ProductData.truck, 'cars'), 
+                            (data.ProductData.spaceship, 'get free stuff')]:
+            eq_(self.store.get(Product, product.id).category.name, category)
+
+    def test_flush_every_row(self):
+        data, flushes = self.load('row')
+        try:
+            self.assert_categorized(data)
+            eq_(flushes, 4)
+        finally:
+            data.teardown()
+
+    def test_flush_every_dataset(self):
+        data, flushes = self.load('dataset')
+        try:
+            self.assert_categorized(data)
+            eq_(flushes, 2)
+        finally:
+            data.teardown()
+
+    def test_flush_every_level(self):
+        data, flushes = self.load('level')
+        try:
+            self.assert_categorized(data)
+            eq_(flushes, 1)
+        finally:
+            data.teardown()
+
+    def test_level_mode_asks_the_plan_about_self_references(self):
+        fixture = StormFixture(env={'CategoryData': Category, 
+                                    'ProductData': Product}, 
+                               store=self.store, flush_every='level')
+        data = fixture.data(self.ProductData)
+        data.setup()
+        try:
+            self.assert_categorized(data)
+            plan = fixture.plans[(self.ProductData,)]
+            eq_(plan.self_references, 
+                {self.CategoryData: False, self.ProductData: False})
+        finally:
+            data.teardown()
+
+    def test_teardown_deletes_in_chunks(self):
+        from storm.tracer import install_tracer, remove_tracer
+        class ChunkedMedium(StormFixture.Medium):
+            delete_chunk_size = 1
+        fixture = StormFixture(env={'CategoryData': Category}, 
+                               store=self.store, medium=ChunkedMedium)
+        data = fixture.data(self.CategoryData)
+        data.setup()
+        deletes = []
+        class DeleteTracer(object):
+            def connection_raw_execute(self, connection, raw_cursor, 
+                                       statement, params):
+                if statement.startswith('DELETE'):
+                    deletes.append(statement)
+        tracer = DeleteTracer()
+        install_tracer(tracer)
+        try:
+            data.teardown()
+        finally:
+            remove_tracer(tracer)
+        eq_(len(deletes), 2)
+        eq_(self.store.find(Category).count(), 0)
+
+    def test_primary_keys_are_probed_at_once(self):
+        self.store.add(Category()).name = 'trucks'
+        self.store.flush()
+        existing = self.store.find(Category).one()
+        medium = StormFixture.Medium(Category, None)
+        medium.transaction = self.store
+        found = medium.find_existing([(existing.id,), (existing.id + 1,)])
+        eq_(found, {(existing.id,): existing})